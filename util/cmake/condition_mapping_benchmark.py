@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+#############################################################################
+##
+## Copyright (C) 2018 The Qt Company Ltd.
+## Contact: https://www.qt.io/licensing/
+##
+## This file is part of the plugins of the Qt Toolkit.
+##
+## $QT_BEGIN_LICENSE:GPL-EXCEPT$
+## Commercial License Usage
+## Licensees holding valid commercial Qt licenses may use this file in
+## accordance with the commercial license agreement provided with the
+## Software or, alternatively, in accordance with the terms contained in
+## a written agreement between you and The Qt Company. For licensing terms
+## and conditions see https://www.qt.io/terms-conditions. For further
+## information use the contact form at https://www.qt.io/contact-us.
+##
+## GNU General Public License Usage
+## Alternatively, this file may be used under the terms of the GNU
+## General Public License version 3 as published by the Free Software
+## Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+## included in the packaging of this file. Please review the following
+## information to ensure the GNU General Public License requirements will
+## be met: https://www.gnu.org/licenses/gpl-3.0.html.
+##
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+"""
+This utility script measures the speed of map_condition() on all scope
+conditions found in the given project files.
+
+To execute: python3 condition_mapping_benchmark.py <path> [<path> ...]
+where <path> is a .pro / .pri file or a directory which is searched
+recursively for such files.
+
+"""
+
+import contextlib
+import io
+import sys
+from argparse import ArgumentParser
+from timeit import default_timer
+from typing import Any, List
+
+from pro2cmake import map_condition
+from qmake_fast_parser import QmakeFastParser
+from qmake_parser import readProFile
+from qmake_parser_benchmark import find_project_files
+
+
+def _parse_commandline():
+    parser = ArgumentParser(description="Benchmark the mapping of qmake conditions.")
+    parser.add_argument(
+        "--repeat", dest="repeat", type=int, default=10, help="How often to map every condition."
+    )
+    parser.add_argument(
+        "paths", metavar="<path>", type=str, nargs="+", help="Project files or directories."
+    )
+    return parser.parse_args()
+
+
+def collect_conditions(statements: Any, conditions: List[str]) -> None:
+    for statement in statements or []:
+        if not isinstance(statement, dict):
+            continue
+        condition = statement.get("condition")
+        if condition:
+            conditions.append(condition)
+        collect_conditions(statement.get("statements"), conditions)
+        collect_conditions(statement.get("else_statements"), conditions)
+
+
+def main() -> int:
+    args = _parse_commandline()
+    parser = QmakeFastParser()
+    conditions: List[str] = []
+    for file in find_project_files(args.paths):
+        # Parse errors are printed by the parser, silence them.
+        with contextlib.redirect_stdout(io.StringIO()):
+            try:
+                parse_result = parser.parseContents(readProFile(file)).asDict()
+            except Exception:
+                continue
+        collect_conditions(parse_result.get("statements"), conditions)
+
+    print(f"Found {len(conditions)} conditions, {len(set(conditions))} distinct ones.")
+
+    map_condition.cache_clear()
+    start = default_timer()
+    for condition in conditions:
+        map_condition.__wrapped__(condition)
+    print(f"  uncached: {default_timer() - start:.3f}s")
+
+    start = default_timer()
+    for _ in range(args.repeat):
+        for condition in conditions:
+            map_condition(condition)
+    print(f"  memoized: {(default_timer() - start) / args.repeat:.3f}s per run")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
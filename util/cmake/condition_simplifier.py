@@ -28,83 +28,98 @@
 #############################################################################
 
 
+import builtins
+import collections
+import concurrent.futures
+import keyword
 import re
-from sympy import simplify_logic, And, Or, Not, SympifyError  # type: ignore
-from condition_simplifier_cache import simplify_condition_memoize
-
-
-def _iterate_expr_tree(expr, op, matches):
-    assert expr.func == op
-    keepers = ()
-    for arg in expr.args:
-        if arg in matches:
-            matches = tuple(x for x in matches if x != arg)
-        elif arg == op:
-            (matches, extra_keepers) = _iterate_expr_tree(arg, op, matches)
-            keepers = (*keepers, *extra_keepers)
-        else:
-            keepers = (*keepers, arg)
-    return matches, keepers
-
-
-def _simplify_expressions(expr, op, matches, replacement):
-    for arg in expr.args:
-        expr = expr.subs(arg, _simplify_expressions(arg, op, matches, replacement))
-
-    if expr.func == op:
-        (to_match, keepers) = tuple(_iterate_expr_tree(expr, op, matches))
-        if len(to_match) == 0:
-            # build expression with keepers and replacement:
-            if keepers:
-                start = replacement
-                current_expr = None
-                last_expr = keepers[-1]
-                for repl_arg in keepers[:-1]:
-                    current_expr = op(start, repl_arg)
-                    start = current_expr
-                top_expr = op(start, last_expr)
-            else:
-                top_expr = replacement
-
-            expr = expr.subs(expr, top_expr)
-
-    return expr
-
-
-def _simplify_flavors_in_condition(base: str, flavors, expr):
-    """ Simplify conditions based on the knowledge of which flavors
-        belong to which OS. """
-    base_expr = simplify_logic(base)
-    false_expr = simplify_logic("false")
-    for flavor in flavors:
-        flavor_expr = simplify_logic(flavor)
-        expr = _simplify_expressions(expr, And, (base_expr, flavor_expr), flavor_expr)
-        expr = _simplify_expressions(expr, Or, (base_expr, flavor_expr), base_expr)
-        expr = _simplify_expressions(expr, And, (Not(base_expr), flavor_expr), false_expr)
-    return expr
-
-
-def _simplify_os_families(expr, family_members, other_family_members):
-    for family in family_members:
-        for other in other_family_members:
-            if other in family_members:
-                continue  # skip those in the sub-family
-
-            f_expr = simplify_logic(family)
-            o_expr = simplify_logic(other)
-
-            expr = _simplify_expressions(expr, And, (f_expr, Not(o_expr)), f_expr)
-            expr = _simplify_expressions(expr, And, (Not(f_expr), o_expr), o_expr)
-            expr = _simplify_expressions(expr, And, (f_expr, o_expr), simplify_logic("false"))
-    return expr
-
-
-def _recursive_simplify(expr):
-    """ Simplify the expression as much as possible based on
-        domain knowledge. """
-    input_expr = expr
-
-    # Simplify even further, based on domain knowledge:
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+
+from sympy import simplify_logic, preorder_traversal, And, Or, Not, Symbol, SympifyError  # type: ignore
+from sympy import true, false  # type: ignore
+from condition_simplifier_cache import set_condition_cache_variant, simplify_condition_memoize
+
+# How many conditions were simplified by _simplify_trivial_condition(), and
+# how many needed sympy. Conditions found in the cache are not counted.
+simplify_condition_counters: "collections.Counter[str]" = collections.Counter()
+
+# Symbols that _recursive_simplify() has domain knowledge about.
+_os_symbols = {
+    "WIN32",
+    "WINRT",
+    "UNIX",
+    "APPLE",
+    "APPLE_OSX",
+    "APPLE_UIKIT",
+    "APPLE_IOS",
+    "APPLE_TVOS",
+    "APPLE_WATCHOS",
+    "BSD",
+    "FREEBSD",
+    "OPENBSD",
+    "NETBSD",
+    "LINUX",
+    "ANDROID",
+    "ANDROID_EMBEDDED",
+    "HAIKU",
+    "INTEGRITY",
+    "VXWORKS",
+    "QNX",
+    "WASM",
+}
+_symbol_pattern = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+# Maximum number of steps spent on simplifying a single condition, where a
+# step is visiting one node of the expression tree, or evaluating one row of
+# a truth table. None means no limit. With a budget, conditions with many
+# symbols are also simplified part by part, instead of as a whole.
+condition_simplifier_step_budget: Optional[int] = None
+# simplify_logic() only minimizes expressions with at most this many symbols.
+max_symbols_for_minimization = 8
+_remaining_simplification_steps: Optional[int] = None
+
+
+# Number of processes used by simplify_conditions().
+condition_simplification_jobs = 1
+
+
+def set_condition_simplification_jobs(value: int):
+    global condition_simplification_jobs
+    condition_simplification_jobs = value
+
+
+class SimplificationBudgetExceeded(Exception):
+    pass
+
+
+def set_condition_simplifier_step_budget(value: Optional[int]):
+    global condition_simplifier_step_budget
+    condition_simplifier_step_budget = value
+    # Results depend on the budget, so don't mix them up in the cache.
+    set_condition_cache_variant(f"budget-{value}" if value is not None else "")
+
+
+def _spend_simplification_steps(count: int) -> None:
+    global _remaining_simplification_steps
+    if _remaining_simplification_steps is None:
+        return
+    _remaining_simplification_steps -= count
+    if _remaining_simplification_steps < 0:
+        raise SimplificationBudgetExceeded()
+
+
+@lru_cache(maxsize=None)
+def _build_os_family_rewrites():
+    """ Precomputes the rewrites based on the knowledge about which OSes
+        and OS families exclude or imply each other. Built on first use,
+        so that processes which only hit the condition cache never pay
+        for it.
+
+        Returns a mapping of single expressions to their replacements, and
+        a list of (op, matches, replacement) rules. A rule replaces all of
+        the matches by the replacement, if they are all arguments of the
+        same op expression. """
     # windowses = ('WIN32', 'WINRT')
     apples = ("APPLE_OSX", "APPLE_UIKIT", "APPLE_IOS", "APPLE_TVOS", "APPLE_WATCHOS")
     bsds = ("FREEBSD", "OPENBSD", "NETBSD")
@@ -123,34 +138,101 @@ def _recursive_simplify(expr):
         "WASM",
     )
 
-    unix_expr = simplify_logic("UNIX")
-    win_expr = simplify_logic("WIN32")
-    false_expr = simplify_logic("false")
-    true_expr = simplify_logic("true")
+    unix_expr = Symbol("UNIX")
+    win_expr = Symbol("WIN32")
+    false_expr = false
+    true_expr = true
+
+    # NOT UNIX -> WIN32, NOT WIN32 -> UNIX
+    substitutions = {Not(unix_expr): win_expr, Not(win_expr): unix_expr}
+
+    rules = [
+        # UNIX [OR foo ]OR WIN32 -> ON [OR foo]
+        (Or, (unix_expr, win_expr), true_expr),
+        # UNIX  [AND foo ]AND WIN32 -> OFF [AND foo]
+        (And, (unix_expr, win_expr), false_expr),
+    ]
+
+    # Simplify conditions based on the knowledge of which flavors
+    # belong to which OS:
+    for base, flavors in (
+        ("WIN32", ("WINRT",)),
+        ("APPLE", apples),
+        ("BSD", bsds),
+        ("UNIX", unixes),
+        ("ANDROID", ("ANDROID_EMBEDDED",)),
+    ):
+        base_expr = Symbol(base)
+        for flavor in flavors:
+            flavor_expr = Symbol(flavor)
+            rules.append((And, (base_expr, flavor_expr), flavor_expr))
+            rules.append((Or, (base_expr, flavor_expr), base_expr))
+            rules.append((And, (Not(base_expr), flavor_expr), false_expr))
 
-    expr = expr.subs(Not(unix_expr), win_expr)  # NOT UNIX -> WIN32
-    expr = expr.subs(Not(win_expr), unix_expr)  # NOT WIN32 -> UNIX
+    # Simplify families of OSes against other families:
+    families = [("WIN32", "WINRT"), androids, ("BSD", *bsds)]
+    families += [(family,) for family in ("HAIKU", "QNX", "INTEGRITY", "LINUX", "VXWORKS")]
+    for family_members in families:
+        for family in family_members:
+            for other in unixes:
+                if other in family_members:
+                    continue  # skip those in the sub-family
+
+                f_expr = Symbol(family)
+                o_expr = Symbol(other)
+
+                rules.append((And, (f_expr, Not(o_expr)), f_expr))
+                rules.append((And, (Not(f_expr), o_expr), o_expr))
+                rules.append((And, (f_expr, o_expr), false_expr))
+
+    return substitutions, rules
+
+
+def _apply_os_family_rule(expr, op, matches, replacement):
+    """ Applies a single rule to the expression, bottom-up. """
+    _spend_simplification_steps(1)
+    if expr.args:
+        args = tuple(_apply_os_family_rule(arg, op, matches, replacement) for arg in expr.args)
+        if args != expr.args:
+            expr = expr.func(*args)
+    if expr.func == op and all(match in expr.args for match in matches):
+        keepers = (arg for arg in expr.args if arg not in matches)
+        expr = op(replacement, *keepers)
+    return expr
 
-    # UNIX [OR foo ]OR WIN32 -> ON [OR foo]
-    expr = _simplify_expressions(expr, Or, (unix_expr, win_expr), true_expr)
-    # UNIX  [AND foo ]AND WIN32 -> OFF [AND foo]
-    expr = _simplify_expressions(expr, And, (unix_expr, win_expr), false_expr)
 
-    expr = _simplify_flavors_in_condition("WIN32", ("WINRT",), expr)
-    expr = _simplify_flavors_in_condition("APPLE", apples, expr)
-    expr = _simplify_flavors_in_condition("BSD", bsds, expr)
-    expr = _simplify_flavors_in_condition("UNIX", unixes, expr)
-    expr = _simplify_flavors_in_condition("ANDROID", ("ANDROID_EMBEDDED",), expr)
+def _simplify_with_domain_knowledge(expr):
+    """ Applies the OS family rewrites to the expression.
+
+        Each rule is applied to the whole expression before the next one,
+        as the order of the rules matters: e.g. UNIX is only dropped from
+        UNIX AND APPLE after rules that rewrite other terms to UNIX ran, and
+        the following simplify_logic() can use it to simplify the rest.
+        Rules whose matches are not all part of the expression are skipped,
+        which are almost all of them. """
+    _spend_simplification_steps(1)
+    os_family_substitutions, os_family_rules = _build_os_family_rewrites()
+    expr = expr.xreplace(os_family_substitutions)
+
+    subexpressions = set(preorder_traversal(expr))
+    for op, matches, replacement in os_family_rules:
+        if all(match in subexpressions for match in matches):
+            rewritten_expr = _apply_os_family_rule(expr, op, matches, replacement)
+            if rewritten_expr != expr:
+                expr = rewritten_expr
+                subexpressions = set(preorder_traversal(expr))
+    return expr
 
-    # Simplify families of OSes against other families:
-    expr = _simplify_os_families(expr, ("WIN32", "WINRT"), unixes)
-    expr = _simplify_os_families(expr, androids, unixes)
-    expr = _simplify_os_families(expr, ("BSD", *bsds), unixes)
 
-    for family in ("HAIKU", "QNX", "INTEGRITY", "LINUX", "VXWORKS"):
-        expr = _simplify_os_families(expr, (family,), unixes)
+def _recursive_simplify(expr):
+    """ Simplify the expression as much as possible based on
+        domain knowledge. """
+    input_expr = expr
+
+    expr = _simplify_with_domain_knowledge(expr)
 
     # Now simplify further:
+    _spend_simplification_steps(2 ** min(len(expr.free_symbols), max_symbols_for_minimization))
     expr = simplify_logic(expr)
 
     while expr != input_expr:
@@ -160,6 +242,95 @@ def _recursive_simplify(expr):
     return expr
 
 
+def _minimize_by_parts(expr):
+    """ Cheaper alternative to simplify_logic() for expressions with many
+        symbols, which simplify_logic() would leave alone. Recurses into
+        AND / OR expressions until the arguments are small enough to be
+        minimized on their own. """
+    symbol_count = len(expr.free_symbols)
+    if symbol_count <= max_symbols_for_minimization:
+        _spend_simplification_steps(2 ** symbol_count)
+        return simplify_logic(expr)
+    if isinstance(expr, (And, Or)):
+        return expr.func(*(_minimize_by_parts(arg) for arg in expr.args))
+    return expr
+
+
+def _simplify_within_budget(expr):
+    global _remaining_simplification_steps
+    if condition_simplifier_step_budget is None:
+        return _recursive_simplify(expr)
+
+    _remaining_simplification_steps = condition_simplifier_step_budget
+    try:
+        if len(expr.free_symbols) <= max_symbols_for_minimization:
+            return _recursive_simplify(expr)
+        # A single pass of the domain knowledge rewrites instead of
+        # repeating them until nothing changes anymore.
+        return _minimize_by_parts(_simplify_with_domain_knowledge(expr))
+    finally:
+        _remaining_simplification_steps = None
+
+
+@lru_cache(maxsize=None)
+def _get_reserved_names() -> Set[str]:
+    # Names that sympy does not parse as plain symbols.
+    namespace: dict = {}
+    exec("from sympy import *", namespace)
+    return set(namespace) | set(dir(builtins)) | set(keyword.kwlist)
+
+
+def _simplify_trivial_condition(condition: str) -> Optional[str]:
+    """ Simplifies a single atom, or a flat AND / OR chain of distinct atoms
+        without sympy. Atoms can be negated.
+
+        Takes and returns conditions in sympy syntax, the result is the same
+        as printing the result of _recursive_simplify(). Returns None for any
+        condition which needs the full simplification. """
+    literals: List[Tuple[str, bool]] = []
+    operator = None
+    expect_literal = True
+    negated = False
+    for token in condition.split():
+        if expect_literal:
+            if token == "~":
+                negated = not negated
+                continue
+            if not _symbol_pattern.fullmatch(token):
+                return None
+            literals.append((token, negated))
+            negated = False
+            expect_literal = False
+        elif token in ("&", "|") and operator in (None, token):
+            operator = token
+            expect_literal = True
+        else:
+            return None
+    if expect_literal:
+        return None
+
+    if len(literals) == 1 and literals[0][0] in ("true", "false"):
+        name, negated = literals[0]
+        return str((name == "true") != negated)
+
+    # NOT UNIX -> WIN32, NOT WIN32 -> UNIX
+    os_negations = {"UNIX": "WIN32", "WIN32": "UNIX"}
+    literals = [
+        (os_negations[name], False) if negated and name in os_negations else (name, negated)
+        for name, negated in literals
+    ]
+
+    names = [name for name, _ in literals]
+    if len(set(names)) != len(names) or len(_os_symbols.intersection(names)) > 1:
+        return None
+    if not _get_reserved_names().isdisjoint(names):
+        return None
+
+    # sympy prints symbols before negations, each sorted by name.
+    literals.sort(key=lambda literal: (literal[1], literal[0]))
+    return f" {operator} ".join(f"~{name}" if negated else name for name, negated in literals)
+
+
 @simplify_condition_memoize
 def simplify_condition(condition: str) -> str:
     input_condition = condition.strip()
@@ -211,9 +382,15 @@ def simplify_condition(condition: str) -> str:
         condition = re.sub(comparison, comparison_symbol_name, condition)
 
     try:
-        # Generate and simplify condition using sympy:
-        condition_expr = simplify_logic(condition)
-        condition = str(_recursive_simplify(condition_expr))
+        simplified_condition = _simplify_trivial_condition(condition)
+        if simplified_condition is not None:
+            simplify_condition_counters["fast_path"] += 1
+            condition = simplified_condition
+        else:
+            # Generate and simplify condition using sympy:
+            simplify_condition_counters["sympy"] += 1
+            condition_expr = simplify_logic(condition)
+            condition = str(_simplify_within_budget(condition_expr))
 
         # Restore the target conditions.
         for symbol_name in target_symbol_mapping:
@@ -233,5 +410,48 @@ def simplify_condition(condition: str) -> str:
     except (SympifyError, TypeError, AttributeError):
         # sympy did not like our input, so leave this condition alone:
         condition = input_condition
+    except SimplificationBudgetExceeded:
+        simplify_condition_counters["budget_exceeded"] += 1
+        condition = input_condition
 
     return condition or "ON"
+
+
+def _simplify_condition_in_worker(condition: str) -> Tuple[str, Dict[str, int]]:
+    simplify_condition_counters.clear()
+    simplified_condition = simplify_condition.__wrapped__(condition)
+    return simplified_condition, dict(simplify_condition_counters)
+
+
+def simplify_conditions(conditions: List[str]) -> Dict[str, str]:
+    """ Simplifies a list of conditions, returning a mapping from each of
+        them to its simplified form.
+
+        With more than one job, the distinct conditions missing from the
+        cache are simplified in parallel by a pool of processes. The
+        results are added to the cache by the calling process. """
+    results: Dict[str, str] = {}
+    missing_conditions: List[str] = []
+    for condition in dict.fromkeys(conditions):
+        simplified_condition = simplify_condition.lookup(condition)
+        if simplified_condition is None:
+            missing_conditions.append(condition)
+        else:
+            results[condition] = simplified_condition
+
+    if condition_simplification_jobs <= 1 or len(missing_conditions) <= 1:
+        for condition in missing_conditions:
+            results[condition] = simplify_condition(condition)
+        return results
+
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=min(condition_simplification_jobs, len(missing_conditions)),
+        initializer=set_condition_simplifier_step_budget,
+        initargs=(condition_simplifier_step_budget,),
+    ) as pool:
+        worker_results = pool.map(_simplify_condition_in_worker, missing_conditions)
+        for condition, (simplified_condition, counters) in zip(missing_conditions, worker_results):
+            simplify_condition_counters.update(counters)
+            simplify_condition.store(condition, simplified_condition)
+            results[condition] = simplified_condition
+    return results
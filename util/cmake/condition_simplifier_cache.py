@@ -28,23 +28,41 @@
 #############################################################################
 
 
-import atexit
+import contextlib
 import hashlib
 import json
 import os
+import shutil
 import sys
+import tempfile
 import time
 
-from typing import Any, Callable, Dict
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 
 condition_simplifier_cache_enabled = True
 
+condition_cache_schema_version = "1"
+# Number of segment files the cached conditions are spread over.
+condition_cache_shard_count = 16
+# Segments with more records than this are compacted once at least half of
+# their records are superseded by later ones.
+condition_cache_compaction_threshold = 256
+
 
 def set_condition_simplified_cache_enabled(value: bool):
     global condition_simplifier_cache_enabled
     condition_simplifier_cache_enabled = value
 
 
+# Distinguishes cache entries of differently configured simplifiers.
+condition_cache_variant = ""
+
+
+def set_condition_cache_variant(value: str):
+    global condition_cache_variant
+    condition_cache_variant = value
+
+
 def get_current_file_path() -> str:
     try:
         this_file = __file__
@@ -54,11 +72,9 @@ def get_current_file_path() -> str:
     return this_file
 
 
-def get_cache_location() -> str:
-    this_file = get_current_file_path()
-    dir_path = os.path.dirname(this_file)
-    cache_path = os.path.join(dir_path, ".pro2cmake_cache", "cache.json")
-    return cache_path
+def get_cache_root() -> str:
+    dir_path = os.path.dirname(get_current_file_path())
+    return os.path.join(dir_path, ".pro2cmake_cache", "conditions")
 
 
 def get_file_checksum(file_path: str) -> str:
@@ -78,106 +94,204 @@ def get_condition_simplifier_checksum() -> str:
     return get_file_checksum(condition_simplifier_path)
 
 
-def init_cache_dict():
-    return {
-        "checksum": get_condition_simplifier_checksum(),
-        "schema_version": "1",
-        "cache": {"conditions": {}},
-    }
-
-
-def merge_dicts_recursive(a: Dict[str, Any], other: Dict[str, Any]) -> Dict[str, Any]:
-    """Merges values of "other" into "a", mutates a."""
-    for key in other:
-        if key in a:
-            if isinstance(a[key], dict) and isinstance(other[key], dict):
-                merge_dicts_recursive(a[key], other[key])
-            elif a[key] == other[key]:
-                pass
-        else:
-            a[key] = other[key]
-    return a
+def get_cache_version() -> str:
+    """ Entries are only valid for the condition simplifier and schema that wrote them. """
+    return f"{condition_cache_schema_version}-{get_condition_simplifier_checksum()}"
 
 
-def open_file_safe(file_path: str, mode: str = "r+"):
+def import_portalocker():
     # Use portalocker package for file locking if available,
     # otherwise print a message to install the package.
     try:
         import portalocker  # type: ignore
-
-        file_open_func = portalocker.Lock
-        file_open_args = [file_path]
-        file_open_kwargs = {"mode": mode, "flags": portalocker.LOCK_EX}
-        file_handle = file_open_func(*file_open_args, **file_open_kwargs)
-        return file_handle
     except ImportError:
         print(
             "The conversion script is missing a required package: portalocker. Please run "
             "python -m pip install -r requirements.txt to install the missing dependency."
         )
         exit(1)
+    return portalocker
 
 
-def simplify_condition_memoize(f: Callable[[str], str]):
-    cache_path = get_cache_location()
-    cache_file_content: Dict[str, Any] = {}
+@contextlib.contextmanager
+def try_lock_file(file_path: str) -> Iterator[bool]:
+    """ Takes an exclusive lock on the given file, without waiting for it.
+
+    Yields whether the lock was acquired. """
+    portalocker = import_portalocker()
+    try:
+        lock = portalocker.Lock(
+            file_path, mode="a", flags=portalocker.LOCK_EX | portalocker.LOCK_NB, timeout=0
+        )
+        lock.acquire(fail_when_locked=True)
+    except portalocker.exceptions.LockException:
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        lock.release()
+
+
+@contextlib.contextmanager
+def shared_lock_file(file_path: str) -> Iterator[None]:
+    """ Takes a shared lock on the given file, waiting while someone else
+    holds an exclusive lock on it. """
+    portalocker = import_portalocker()
+    lock = portalocker.Lock(file_path, mode="a", flags=portalocker.LOCK_SH)
+    lock.acquire()
+    try:
+        yield
+    finally:
+        lock.release()
 
-    if os.path.exists(cache_path):
+
+class ShardedConditionCache:
+    """ Append-only store for simplified conditions.
+
+    Conditions are spread over hash-sharded segment files. Every new entry
+    is appended to its segment as a single JSON line, so concurrent
+    processes neither rewrite nor lock each other's data. When reading,
+    torn records are skipped and the last record of a condition wins.
+
+    Segments with many superseded records are compacted by whichever process
+    gets the compaction lock exclusively. Appending takes the same lock
+    shared, so that no record is appended to a segment which is about to
+    be replaced by its compacted version. """
+
+    def __init__(self, cache_dir: str, shard_count: int = condition_cache_shard_count) -> None:
+        self.cache_dir = cache_dir
+        self.shard_count = shard_count
+
+    def get_shard(self, condition: str) -> int:
+        digest = hashlib.md5(condition.encode("utf-8")).hexdigest()
+        return int(digest[:8], 16) % self.shard_count
+
+    def get_segment_path(self, shard: int) -> str:
+        return os.path.join(self.cache_dir, f"{shard:02x}.jsonl")
+
+    def get_compaction_lock_path(self) -> str:
+        return os.path.join(self.cache_dir, "compact.lock")
+
+    def read_segment(self, shard: int) -> Tuple[Dict[str, str], int]:
+        """ Returns the entries of a segment, and the number of records it holds. """
+        entries: Dict[str, str] = {}
+        record_count = 0
+        try:
+            with open(self.get_segment_path(shard), "r", encoding="utf-8") as segment_file:
+                for line in segment_file:
+                    try:
+                        condition, simplified_condition = json.loads(line)
+                    except (ValueError, TypeError):
+                        continue
+                    entries[condition] = simplified_condition
+                    record_count += 1
+        except IOError:
+            pass
+        return entries, record_count
+
+    def load(self) -> Dict[str, str]:
+        entries: Dict[str, str] = {}
+        shards_to_compact = []
+        for shard in range(self.shard_count):
+            segment_entries, record_count = self.read_segment(shard)
+            entries.update(segment_entries)
+            superseded_record_count = record_count - len(segment_entries)
+            if (
+                record_count > condition_cache_compaction_threshold
+                and superseded_record_count >= len(segment_entries)
+            ):
+                shards_to_compact.append(shard)
+        if shards_to_compact:
+            self.compact(shards_to_compact)
+        return entries
+
+    def _append_records(self, shard: int, records: List[Tuple[str, str]]) -> None:
+        data = "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
         try:
-            with open_file_safe(cache_path, mode="r") as cache_file:
-                cache_file_content = json.load(cache_file)
-        except (IOError, ValueError):
-            print(f"Invalid pro2cmake cache file found at: {cache_path}. Removing it.")
-            os.remove(cache_path)
-
-    if not cache_file_content:
-        cache_file_content = init_cache_dict()
-
-    current_checksum = get_condition_simplifier_checksum()
-    if cache_file_content["checksum"] != current_checksum:
-        cache_file_content = init_cache_dict()
-
-    def update_cache_file():
-        if not os.path.exists(cache_path):
-            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
-            # Create the file if it doesn't exist, but don't override
-            # it.
-            with open(cache_path, "a"):
-                pass
-
-        updated_cache = cache_file_content
-
-        with open_file_safe(cache_path, "r+") as cache_file_write_handle:
-            # Read any existing cache content, and truncate the file.
-            cache_file_existing_content = cache_file_write_handle.read()
-            cache_file_write_handle.seek(0)
-            cache_file_write_handle.truncate()
-
-            # Merge the new cache into the old cache if it exists.
-            if cache_file_existing_content:
-                possible_cache = json.loads(cache_file_existing_content)
-                if (
-                    "checksum" in possible_cache
-                    and "schema_version" in possible_cache
-                    and possible_cache["checksum"] == cache_file_content["checksum"]
-                    and possible_cache["schema_version"] == cache_file_content["schema_version"]
-                ):
-                    updated_cache = merge_dicts_recursive(dict(possible_cache), updated_cache)
-
-            json.dump(updated_cache, cache_file_write_handle, indent=4)
-
-            # Flush any buffered writes.
-            cache_file_write_handle.flush()
-            os.fsync(cache_file_write_handle.fileno())
-
-    atexit.register(update_cache_file)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with shared_lock_file(self.get_compaction_lock_path()):
+                # A single write() to a file opened with O_APPEND is not interleaved
+                # with the writes of other processes.
+                fd = os.open(self.get_segment_path(shard), os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+                try:
+                    os.write(fd, data)
+                finally:
+                    os.close(fd)
+        except OSError as e:
+            print(f"Could not write condition cache entry: {e}")
+
+    def append(self, condition: str, simplified_condition: str) -> None:
+        self._append_records(self.get_shard(condition), [(condition, simplified_condition)])
+
+    def append_many(self, entries: Dict[str, str]) -> None:
+        records_by_shard: Dict[int, List[Tuple[str, str]]] = {}
+        for condition, simplified_condition in entries.items():
+            shard = self.get_shard(condition)
+            records_by_shard.setdefault(shard, []).append((condition, simplified_condition))
+        for shard, records in records_by_shard.items():
+            self._append_records(shard, records)
+
+    def compact(self, shards: Optional[List[int]] = None) -> None:
+        """ Rewrites segments so that they hold a single record per condition. """
+        if shards is None:
+            shards = list(range(self.shard_count))
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with try_lock_file(self.get_compaction_lock_path()) as locked:
+                if not locked:
+                    return
+                for shard in shards:
+                    entries, _ = self.read_segment(shard)
+                    fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+                    with os.fdopen(fd, "w", encoding="utf-8") as temp_file:
+                        for record in entries.items():
+                            temp_file.write(json.dumps(record) + "\n")
+                    os.replace(temp_path, self.get_segment_path(shard))
+        except OSError as e:
+            print(f"Could not compact condition cache: {e}")
+
+
+def _remove_stale_cache_dirs(cache_root: str, current_version: str) -> None:
+    # Entries written by other condition simplifier versions can never be hit again.
+    for entry in os.listdir(cache_root):
+        if entry != current_version:
+            shutil.rmtree(os.path.join(cache_root, entry), ignore_errors=True)
 
-    def helper(condition: str) -> str:
-        if (
-            condition not in cache_file_content["cache"]["conditions"]
-            or not condition_simplifier_cache_enabled
-        ):
-            cache_file_content["cache"]["conditions"][condition] = f(condition)
-        return cache_file_content["cache"]["conditions"][condition]
 
+def simplify_condition_memoize(f: Callable[[str], str]):
+    cache_root = get_cache_root()
+    current_version = get_cache_version()
+    cache = ShardedConditionCache(os.path.join(cache_root, current_version))
+
+    if os.path.isdir(cache_root):
+        _remove_stale_cache_dirs(cache_root, current_version)
+    conditions = cache.load()
+
+    def get_key(condition: str) -> str:
+        return f"{condition_cache_variant}\0{condition}" if condition_cache_variant else condition
+
+    def lookup(condition: str) -> Optional[str]:
+        """ Returns the cached simplified condition, or None. """
+        if not condition_simplifier_cache_enabled:
+            return None
+        return conditions.get(get_key(condition))
+
+    def store(condition: str, simplified_condition: str) -> None:
+        """ Adds a condition simplified without going through helper(). """
+        key = get_key(condition)
+        if conditions.get(key) != simplified_condition:
+            conditions[key] = simplified_condition
+            cache.append(key, simplified_condition)
+
+    def helper(condition: str) -> str:
+        simplified_condition = lookup(condition)
+        if simplified_condition is None:
+            simplified_condition = f(condition)
+            store(condition, simplified_condition)
+        return simplified_condition
+
+    helper.lookup = lookup  # type: ignore
+    helper.store = store  # type: ignore
+    helper.__wrapped__ = f  # type: ignore
     return helper
@@ -27,22 +27,57 @@
 ##
 #############################################################################
 
+import io
 import json_parser
+import os
 import posixpath
 import re
-import sys
-from typing import Optional, Set
+from argparse import ArgumentParser
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Tuple
 from textwrap import dedent
 
+from generated_file_writer import format_generated_file_counters, write_generated_file
+
 from helper import (
     map_qt_library,
     featureName,
     map_platform,
     find_3rd_party_library_mapping,
     generate_find_package_info,
+    add_library_map_change_callback,
 )
 
 knownTests = set()  # type: Set[str]
+# Changes whenever a test is added to knownTests, see addKnownTest().
+knownTestsGeneration = 0
+
+# Tests that are not converted.
+skip_tests = {
+    "c11",
+    "c99",
+    "gc_binaries",
+    "posix-iconv",
+    "sun-iconv",
+    "precomile_header",
+    "reduce_exports",
+    "separate_debug_info",  # FIXME: see if cmake can do this
+    "gc_binaries",
+    "libinput_axis_api",
+    "wayland-scanner",
+    "xlib",
+}
+
+# Test types that define a TEST_<name> variable, see parseTest().
+known_test_types = {"compile", "libclang", "x86Simd"}
+
+# Whether mapped conditions are passed through the condition simplifier.
+simplify_mapped_conditions = False
+
+not_equal_regex = re.compile(r"(.+)\s*!=\s*('.+')")
+empty_sdk_regex = re.compile(r"input\.sdk\s*==\s*''")
+condition_reference_regex = re.compile(r"([a-zA-Z0-9_]+)\.([a-zA-Z0-9_+-]+)")
+whitespace_regex = re.compile(r"\s+")
 
 
 class LibraryMapping:
@@ -52,6 +87,13 @@ class LibraryMapping:
         self.appendFoundSuffix = appendFoundSuffix
 
 
+def addKnownTest(test: str) -> None:
+    global knownTestsGeneration
+    if test not in knownTests:
+        knownTests.add(test)
+        knownTestsGeneration += 1
+
+
 def map_tests(test: str) -> Optional[str]:
     testmap = {
         "c99": "c_std_99 IN_LIST CMAKE_C_COMPILE_FEATURES",
@@ -162,6 +204,45 @@ def processFiles(ctx, data):
     return ctx
 
 
+class FeatureIndex:
+    """ Index of the libraries used in the conditions of the features of
+    one or more configure.json files, built once, so that parseLib() does
+    not have to scan all features for every library. """
+
+    library_reference_regex = re.compile(r"\blibs\.([a-zA-Z0-9_+-]+)")
+
+    def __init__(self, features: Optional[Dict[str, Any]] = None) -> None:
+        # Maps library names to the features using them in their condition,
+        # in the order in which the features were added.
+        self.library_users: Dict[str, List[Dict[str, Any]]] = {}
+        if features:
+            self.add_features(features)
+
+    def add_features(self, features: Dict[str, Any]) -> None:
+        for feature_data in features.values():
+            for lib in self._library_names(feature_data.get("condition")):
+                users = self.library_users.setdefault(lib, [])
+                if not users or users[-1] is not feature_data:
+                    users.append(feature_data)
+
+    @classmethod
+    def _library_names(cls, condition: Any) -> List[str]:
+        if isinstance(condition, list):
+            condition = " ".join(condition)
+        if not isinstance(condition, str):
+            return []
+        return cls.library_reference_regex.findall(condition)
+
+    def library_emit_if(self, lib: str) -> Optional[str]:
+        """ Returns the emitIf of the first feature that uses lib in its
+        condition and is only emitted for a certain config. """
+        for feature_data in self.library_users.get(lib, []):
+            emit_if = feature_data.get("emitIf", "")
+            if "config." in emit_if:
+                return emit_if
+        return None
+
+
 def parseLib(ctx, lib, data, cm_fh, cmake_find_packages_set):
     newlib = find_3rd_party_library_mapping(lib)
     if not newlib:
@@ -186,16 +267,7 @@ def parseLib(ctx, lib, data, cm_fh, cmake_find_packages_set):
 
     # Only look through features if a custom emit_if wasn't provided.
     if not emit_if:
-        for feature in data["features"]:
-            feature_data = data["features"][feature]
-            if (
-                "condition" in feature_data
-                and f"libs.{lib}" in feature_data["condition"]
-                and "emitIf" in feature_data
-                and "config." in feature_data["emitIf"]
-            ):
-                emit_if = feature_data["emitIf"]
-                break
+        emit_if = ctx["feature_index"].library_emit_if(lib)
 
     if emit_if:
         emit_if = map_condition(emit_if)
@@ -243,10 +315,30 @@ def map_condition(condition):
             return "OFF"
     assert isinstance(condition, str)
 
+    # Mappings cached before more tests became known are not used anymore.
+    mapped_condition, unknown_conditions = _map_condition(condition, knownTestsGeneration)
+    for unknown_condition in unknown_conditions:
+        print(f'    XXXX Unknown condition "{unknown_condition}"')
+
+    if simplify_mapped_conditions and mapped_condition and not unknown_conditions:
+        # Imported here, so that sympy and the condition cache are only
+        # loaded when asked for.
+        from condition_simplifier import simplify_condition
+
+        mapped_condition = simplify_condition(mapped_condition)
+    return mapped_condition
+
+
+@lru_cache(maxsize=None)
+def _map_condition(condition: str, known_tests_generation: int) -> Tuple[str, Tuple[str, ...]]:
+    """ Maps a configure.json condition to CMake syntax.
+
+    Returns the mapped condition and the references that could not be
+    mapped. Features repeat the same conditions a lot, so this is cached. """
     mapped_features = {"gbm": "gbm_FOUND", "system-xcb": "ON"}
 
     # Turn foo != "bar" into (NOT foo STREQUAL 'bar')
-    condition = re.sub(r"(.+)\s*!=\s*('.+')", "(! \\1 == \\2)", condition)
+    condition = not_equal_regex.sub("(! \\1 == \\2)", condition)
 
     condition = condition.replace("!", "NOT ")
     condition = condition.replace("&&", " AND ")
@@ -254,12 +346,12 @@ def map_condition(condition):
     condition = condition.replace("==", " STREQUAL ")
 
     # explicitly handle input.sdk == '':
-    condition = re.sub(r"input\.sdk\s*==\s*''", "NOT INPUT_SDK", condition)
+    condition = empty_sdk_regex.sub("NOT INPUT_SDK", condition)
 
     last_pos = 0
     mapped_condition = ""
-    has_failed = False
-    for match in re.finditer(r"([a-zA-Z0-9_]+)\.([a-zA-Z0-9_+-]+)", condition):
+    unknown_conditions = []
+    for match in condition_reference_regex.finditer(condition):
         substitution = None
         # appendFoundSuffix = True
         if match.group(1) == "libs":
@@ -320,8 +412,7 @@ def map_condition(condition):
                 substitution = "(TEST_architecture_arch STREQUAL mips)"
 
         if substitution is None:
-            print(f'    XXXX Unknown condition "{match.group(0)}"')
-            has_failed = True
+            unknown_conditions.append(match.group(0))
         else:
             mapped_condition += condition[last_pos : match.start(1)] + substitution
             last_pos = match.end(2)
@@ -333,16 +424,19 @@ def map_condition(condition):
     mapped_condition = mapped_condition.replace(")", " ) ")
 
     # Prettify:
-    condition = re.sub("\\s+", " ", mapped_condition)
+    condition = whitespace_regex.sub(" ", mapped_condition)
     condition = condition.strip()
 
     # Special case for WrapLibClang in qttools
     condition = condition.replace("TEST_libclang.has_clangcpp", "TEST_libclang")
 
-    if has_failed:
+    if unknown_conditions:
         condition += " OR FIXME"
 
-    return condition
+    return condition, tuple(unknown_conditions)
+
+
+add_library_map_change_callback(_map_condition.cache_clear)
 
 
 def parseInput(ctx, sinput, data, cm_fh):
@@ -505,27 +599,12 @@ def parseInput(ctx, sinput, data, cm_fh):
 #            }
 #        },
 def parseTest(ctx, test, data, cm_fh):
-    skip_tests = {
-        "c11",
-        "c99",
-        "gc_binaries",
-        "posix-iconv",
-        "sun-iconv",
-        "precomile_header",
-        "reduce_exports",
-        "separate_debug_info",  # FIXME: see if cmake can do this
-        "gc_binaries",
-        "libinput_axis_api",
-        "wayland-scanner",
-        "xlib",
-    }
-
     if test in skip_tests:
         print(f"    **** Skipping features {test}: masked.")
         return
 
     if data["type"] == "compile":
-        knownTests.add(test)
+        addKnownTest(test)
 
         details = data["test"]
 
@@ -646,7 +725,7 @@ endif()
         cm_fh.write(")\n\n")
 
     elif data["type"] == "libclang":
-        knownTests.add(test)
+        addKnownTest(test)
 
         cm_fh.write(f"# {test}\n")
         lib_clang_lib = find_3rd_party_library_mapping("libclang")
@@ -663,7 +742,7 @@ endif()
         cm_fh.write("\n")
 
     elif data["type"] == "x86Simd":
-        knownTests.add(test)
+        addKnownTest(test)
 
         label = data["label"]
 
@@ -1055,6 +1134,15 @@ def processLibraries(ctx, data, cm_fh):
         parseLib(ctx, lib, data, cm_fh, cmake_find_packages_set)
 
 
+def registerKnownTests(data):
+    """ Adds the tests of a configure.json file to knownTests ahead of
+    processing, so that references from other files to them resolve
+    independently of the processing order. """
+    for test, details in data.get("tests", {}).items():
+        if test not in skip_tests and details["type"] in known_test_types:
+            addKnownTest(test)
+
+
 def processSubconfigs(path, ctx, data):
     assert ctx is not None
     if "subconfigs" in data:
@@ -1065,13 +1153,22 @@ def processSubconfigs(path, ctx, data):
             processJson(subconfDir, subconfCtx, subconfData)
 
 
-def processJson(path, ctx, data):
+def processJson(
+    path,
+    ctx,
+    data,
+    process_subconfigs: bool = True,
+    feature_index: Optional[FeatureIndex] = None,
+):
     ctx["module"] = data.get("module", "global")
     ctx["test_dir"] = data.get("testDir", "")
 
     ctx = processFiles(ctx, data)
+    if feature_index is None:
+        feature_index = FeatureIndex(data.get("features", {}))
+    ctx["feature_index"] = feature_index
 
-    with open(posixpath.join(path, "configure.cmake"), "w") as cm_fh:
+    with io.StringIO() as cm_fh:
         cm_fh.write("\n\n#### Inputs\n\n")
 
         processInputs(ctx, data, cm_fh)
@@ -1096,21 +1193,76 @@ def processJson(path, ctx, data):
             cm_fh.write('qt_extra_definition("QT_VERSION_MINOR" ${PROJECT_VERSION_MINOR} PUBLIC)\n')
             cm_fh.write('qt_extra_definition("QT_VERSION_PATCH" ${PROJECT_VERSION_PATCH} PUBLIC)\n')
 
+        write_generated_file(posixpath.join(path, "configure.cmake"), cm_fh.getvalue())
+
     # do this late:
-    processSubconfigs(path, ctx, data)
+    if process_subconfigs:
+        processSubconfigs(path, ctx, data)
+
+
+def findConfigureJsonDirs(root: str) -> List[str]:
+    """ Returns the directories below root that contain a configure.json
+    file, each directory before its subdirectories. """
+    dirs = []
+    for dir_path, dir_names, file_names in os.walk(root):
+        # mkspecs/features/data/configure.json holds the common options of
+        # qmake's configure system, it does not describe a module.
+        dir_names[:] = sorted(d for d in dir_names if d != "mkspecs" and not d.startswith("."))
+        if "configure.json" in file_names:
+            dirs.append(dir_path)
+    return dirs
+
+
+def processTree(root: str):
+    """ Converts all configure.json files below root in one run. All of them
+    are read first, so that tests are known to all files, and the features
+    of all files are indexed once. They share one context like subconfigs
+    do. """
+    configs: Dict[str, Any] = {d: readJsonFromDir(d) for d in findConfigureJsonDirs(root)}
+    feature_index = FeatureIndex()
+    for data in configs.values():
+        registerKnownTests(data)
+        feature_index.add_features(data.get("features", {}))
+
+    ctx: Dict[str, Any] = {}
+    for path, data in configs.items():
+        print(f"Processing: {path}.")
+        # The subconfigs are in the list of files as well.
+        processJson(path, ctx, data, process_subconfigs=False, feature_index=feature_index)
 
 
 def main():
-    if len(sys.argv) != 2:
-        print("This scripts needs one directory to process!")
-        quit(1)
-
-    directory = sys.argv[1]
+    parser = ArgumentParser(description="Generate configure.cmake files from configure.json files.")
+    parser.add_argument(
+        "--tree",
+        dest="tree",
+        action="store_true",
+        help="Convert all configure.json files found below the given directory, instead of "
+        "the one in it and its subconfigs.",
+    )
+    parser.add_argument(
+        "--simplify-conditions",
+        dest="simplify_conditions",
+        action="store_true",
+        help="Simplify the generated conditions with the condition simplifier of pro2cmake.py.",
+    )
+    parser.add_argument("directory", metavar="<directory>", type=str)
+    args = parser.parse_args()
+
+    global simplify_mapped_conditions
+    simplify_mapped_conditions = args.simplify_conditions
+
+    directory = args.directory
+
+    if args.tree:
+        processTree(directory)
+    else:
+        print(f"Processing: {directory}.")
 
-    print(f"Processing: {directory}.")
+        data = readJsonFromDir(directory)
+        processJson(directory, {}, data)
 
-    data = readJsonFromDir(directory)
-    processJson(directory, {}, data)
+    print(format_generated_file_counters())
 
 
 if __name__ == "__main__":
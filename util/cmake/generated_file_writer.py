@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+#############################################################################
+##
+## Copyright (C) 2018 The Qt Company Ltd.
+## Contact: https://www.qt.io/licensing/
+##
+## This file is part of the plugins of the Qt Toolkit.
+##
+## $QT_BEGIN_LICENSE:GPL-EXCEPT$
+## Commercial License Usage
+## Licensees holding valid commercial Qt licenses may use this file in
+## accordance with the commercial license agreement provided with the
+## Software or, alternatively, in accordance with the terms contained in
+## a written agreement between you and The Qt Company. For licensing terms
+## and conditions see https://www.qt.io/terms-conditions. For further
+## information use the contact form at https://www.qt.io/contact-us.
+##
+## GNU General Public License Usage
+## Alternatively, this file may be used under the terms of the GNU
+## General Public License version 3 as published by the Free Software
+## Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+## included in the packaging of this file. Please review the following
+## information to ensure the GNU General Public License requirements will
+## be met: https://www.gnu.org/licenses/gpl-3.0.html.
+##
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+
+import collections
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+
+from typing import Optional
+
+# Counts the "written" and "unchanged" generated files of this process.
+generated_file_counters = collections.Counter()  # type: collections.Counter
+
+generated_file_counters_regex = re.compile(
+    r"^Generated files: (\d+) written, (\d+) unchanged\.$", re.MULTILINE
+)
+
+
+def _get_umask() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# The umask can only be read by changing it, which would race with other
+# threads creating files, so it is read once on import.
+_umask = _get_umask()
+
+
+def get_content_digest(content: str) -> bytes:
+    return hashlib.sha1(content.encode("utf-8")).digest()
+
+
+def get_file_digest(file_path: str) -> Optional[bytes]:
+    """ Returns the digest of the file content as it reads in text mode,
+    or None if the file can not be read. """
+    try:
+        with open(file_path, "r") as file_fd:
+            return get_content_digest(file_fd.read())
+    except (IOError, UnicodeDecodeError):
+        return None
+
+
+def write_generated_file(file_path: str, content: str) -> bool:
+    """ Writes content to file_path, unless the file already has that content.
+
+    Leaving unchanged files alone keeps their modification time, so that
+    CMake does not re-run and rebuild everything depending on them. The
+    file is replaced atomically, so that an interrupted conversion never
+    leaves a partially written file behind. Returns whether the file was
+    written. """
+    if get_file_digest(file_path) == get_content_digest(content):
+        generated_file_counters["unchanged"] += 1
+        return False
+
+    dir_path = os.path.dirname(os.path.abspath(file_path))
+    fd, temp_path = tempfile.mkstemp(dir=dir_path, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as temp_file:
+            temp_file.write(content)
+        # mkstemp creates files only readable by the user, use the
+        # permissions the file would get when written directly.
+        if os.path.exists(file_path):
+            shutil.copymode(file_path, temp_path)
+        else:
+            os.chmod(temp_path, 0o666 & ~_umask)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    generated_file_counters["written"] += 1
+    return True
+
+
+def format_generated_file_counters(counters: Optional[collections.Counter] = None) -> str:
+    if counters is None:
+        counters = generated_file_counters
+    return f"Generated files: {counters['written']} written, {counters['unchanged']} unchanged."
+
+
+def parse_generated_file_counters(output: str) -> collections.Counter:
+    """ Returns the sum of the counters reported in the output of one or
+    more conversions. """
+    counters = collections.Counter()  # type: collections.Counter
+    for match in generated_file_counters_regex.finditer(output):
+        counters["written"] += int(match.group(1))
+        counters["unchanged"] += int(match.group(2))
+    return counters
@@ -558,32 +558,90 @@ _library_map = [
 ]
 
 
-def _adjust_library_map():
+def _adjust_library_mapping(mapping: LibraryMapping) -> None:
     # Assign a Linux condition on all x and wayland related packages.
     # We don't want to get pages of package not found messages on
     # Windows and macOS, and this also improves configure time on
     # those platforms.
     linux_package_prefixes = ["xcb", "x11", "xkb", "xrender", "xlib", "wayland"]
-    for i, _ in enumerate(_library_map):
-        if any([_library_map[i].soName.startswith(p) for p in linux_package_prefixes]):
-            _library_map[i].emit_if = "config.linux"
+    if any([mapping.soName.startswith(p) for p in linux_package_prefixes]):
+        mapping.emit_if = "config.linux"
+
+
+def _adjust_library_map():
+    for mapping in _library_map:
+        _adjust_library_mapping(mapping)
 
 
 _adjust_library_map()
 
 
+# Indexes of the library maps by soName and targetName. Lookups return the
+# first mapping in the list with the given name, like a linear scan would.
+_library_map_by_so_name: typing.Dict[str, LibraryMapping] = {}
+_library_map_by_target_name: typing.Dict[str, LibraryMapping] = {}
+_qt_library_map_by_so_name: typing.Dict[str, LibraryMapping] = {}
+_qt_library_map_by_target_name: typing.Dict[str, LibraryMapping] = {}
+
+
+def _index_library_mapping(
+    mapping: LibraryMapping,
+    by_so_name: typing.Dict[str, LibraryMapping],
+    by_target_name: typing.Dict[str, LibraryMapping],
+) -> None:
+    by_so_name.setdefault(mapping.soName, mapping)
+    if mapping.targetName is not None:
+        by_target_name.setdefault(mapping.targetName, mapping)
+
+
+def _build_library_map_indexes():
+    for mapping in _library_map:
+        _index_library_mapping(mapping, _library_map_by_so_name, _library_map_by_target_name)
+    for mapping in _qt_library_map:
+        _index_library_mapping(mapping, _qt_library_map_by_so_name, _qt_library_map_by_target_name)
+
+
+_build_library_map_indexes()
+
+
+# Invalidate results computed from the library maps, e.g. memoized
+# condition mappings, when a mapping is registered.
+_library_map_change_callbacks: typing.List[typing.Callable[[], None]] = []
+
+
+def add_library_map_change_callback(callback: typing.Callable[[], None]) -> None:
+    _library_map_change_callbacks.append(callback)
+
+
+def _notify_library_map_changed() -> None:
+    for callback in _library_map_change_callbacks:
+        callback()
+
+
+def register_library_mapping(mapping: LibraryMapping) -> None:
+    """ Adds a 3rd party library mapping at runtime.
+
+    Like for the built-in mappings, lookups return the first registered
+    mapping for a soName or targetName. """
+    _adjust_library_mapping(mapping)
+    _library_map.append(mapping)
+    _index_library_mapping(mapping, _library_map_by_so_name, _library_map_by_target_name)
+    _notify_library_map_changed()
+
+
+def register_qt_library_mapping(mapping: LibraryMapping) -> None:
+    """ Adds a Qt library mapping at runtime. """
+    _qt_library_map.append(mapping)
+    _index_library_mapping(mapping, _qt_library_map_by_so_name, _qt_library_map_by_target_name)
+    _notify_library_map_changed()
+
+
 def find_3rd_party_library_mapping(soName: str) -> typing.Optional[LibraryMapping]:
-    for i in _library_map:
-        if i.soName == soName:
-            return i
-    return None
+    return _library_map_by_so_name.get(soName)
 
 
 def find_qt_library_mapping(soName: str) -> typing.Optional[LibraryMapping]:
-    for i in _qt_library_map:
-        if i.soName == soName:
-            return i
-    return None
+    return _qt_library_map_by_so_name.get(soName)
 
 
 def find_library_info_for_target(targetName: str) -> typing.Optional[LibraryMapping]:
@@ -591,15 +649,11 @@ def find_library_info_for_target(targetName: str) -> typing.Optional[LibraryMapp
     if targetName.endswith("Private"):
         qt_target = qt_target[:-7]
 
-    for i in _qt_library_map:
-        if i.targetName == qt_target:
-            return i
-
-    for i in _library_map:
-        if i.targetName == targetName:
-            return i
+    mapping = _qt_library_map_by_target_name.get(qt_target)
+    if mapping:
+        return mapping
 
-    return None
+    return _library_map_by_target_name.get(targetName)
 
 
 def featureName(name: str) -> str:
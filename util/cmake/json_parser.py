@@ -27,75 +27,46 @@
 ##
 #############################################################################
 
-import pyparsing as pp  # type: ignore
 import json
 import re
-from helper import _set_up_py_parsing_nicer_debug_output
+from typing import Match
 
-_set_up_py_parsing_nicer_debug_output(pp)
+
+# A JSON string, including its quotes. Escaped characters, like escaped
+# quotes, are part of the string.
+_quoted_string_pattern = re.compile(r'"(?:[^"\\]|\\.)*"', re.DOTALL)
+_newline_in_string_pattern = re.compile(r"\n[ ]*")
 
 
 class QMakeSpecificJSONParser:
     def __init__(self, *, debug: bool = False) -> None:
         self.debug = debug
-        self.grammar = self.create_py_parsing_grammar()
-
-    def create_py_parsing_grammar(self):
-        # Keep around all whitespace.
-        pp.ParserElement.setDefaultWhitespaceChars("")
-
-        def add_element(name: str, value: pp.ParserElement):
-            nonlocal self
-            if self.debug:
-                value.setName(name)
-                value.setDebug()
-            return value
-
-        # Our grammar is pretty simple. We want to remove all newlines
-        # inside quoted strings, to make the quoted strings JSON
-        # compliant. So our grammar should skip to the first quote while
-        # keeping everything before it as-is, process the quoted string
-        # skip to the next quote, and repeat that until the end of the
-        # file.
-
-        EOF = add_element("EOF", pp.StringEnd())
-        SkipToQuote = add_element("SkipToQuote", pp.SkipTo('"'))
-        SkipToEOF = add_element("SkipToEOF", pp.SkipTo(EOF))
-
-        def remove_newlines_and_whitespace_in_quoted_string(tokens):
-            first_string = tokens[0]
-            replaced_string = re.sub(r"\n[ ]*", " ", first_string)
-            return replaced_string
-
-        QuotedString = add_element(
-            "QuotedString", pp.QuotedString(quoteChar='"', multiline=True, unquoteResults=False)
-        )
-        QuotedString.setParseAction(remove_newlines_and_whitespace_in_quoted_string)
-
-        QuotedTerm = add_element("QuotedTerm", pp.Optional(SkipToQuote) + QuotedString)
-        Grammar = add_element("Grammar", pp.OneOrMore(QuotedTerm) + SkipToEOF)
-
-        return Grammar
-
-    def parse_file_using_py_parsing(self, file: str):
-        print(f'Pre processing "{file}" using py parsing to remove incorrect newlines.')
-        try:
-            with open(file, "r") as file_fd:
-                contents = file_fd.read()
-
-            parser_result = self.grammar.parseString(contents, parseAll=True)
-            token_list = parser_result.asList()
-            joined_string = "".join(token_list)
 
-            return joined_string
-        except pp.ParseException as pe:
-            print(pe.line)
-            print(" " * (pe.col - 1) + "^")
-            print(pe)
-            raise pe
+    @staticmethod
+    def remove_newlines_in_quoted_strings(contents: str) -> str:
+        """ Replaces the newlines inside quoted strings, together with the
+        indentation that follows them, by single spaces to make the quoted
+        strings JSON compliant. Everything else is kept as-is. """
+
+        def replace(match: Match) -> str:
+            quoted_string = match.group(0)
+            if "\n" not in quoted_string:
+                return quoted_string
+            return _newline_in_string_pattern.sub(" ", quoted_string)
+
+        return _quoted_string_pattern.sub(replace, contents)
+
+    def preprocess_file(self, file: str) -> str:
+        print(f'Pre processing "{file}" to remove incorrect newlines.')
+        with open(file, "r") as file_fd:
+            contents = file_fd.read()
+        pre_processed_string = self.remove_newlines_in_quoted_strings(contents)
+        if self.debug:
+            print(pre_processed_string)
+        return pre_processed_string
 
     def parse(self, file: str):
-        pre_processed_string = self.parse_file_using_py_parsing(file)
+        pre_processed_string = self.preprocess_file(file)
         print(f'Parsing "{file}" using json.loads().')
         json_parsed = json.loads(pre_processed_string)
         return json_parsed
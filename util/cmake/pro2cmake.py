@@ -31,6 +31,8 @@
 from __future__ import annotations
 
 import copy
+import hashlib
+import json
 import os.path
 import posixpath
 import sys
@@ -38,17 +40,23 @@ import re
 import io
 import glob
 
-from condition_simplifier import simplify_condition
+from condition_simplifier import (
+    set_condition_simplification_jobs,
+    set_condition_simplifier_step_budget,
+    simplify_condition,
+    simplify_condition_counters,
+    simplify_conditions,
+)
 from condition_simplifier_cache import set_condition_simplified_cache_enabled
+from generated_file_writer import format_generated_file_counters, write_generated_file
 
 import pyparsing as pp  # type: ignore
 import xml.etree.ElementTree as ET
 
-from argparse import ArgumentParser
+from argparse import ArgumentParser, Namespace
 from textwrap import dedent
 from textwrap import indent as textwrap_indent
 from functools import lru_cache
-from shutil import copyfile
 from collections import defaultdict
 from typing import (
     List,
@@ -62,10 +70,12 @@ from typing import (
     FrozenSet,
     Tuple,
     Match,
+    Pattern,
     Type,
 )
 
-from qmake_parser import parseProFile
+from qmake_parser import parseProFile, parser_backends, set_parser_backend
+from qmake_parser_cache import set_parse_tree_cache_enabled
 from special_case_helper import SpecialCaseHandler
 from helper import (
     map_qt_library,
@@ -76,14 +86,20 @@ from helper import (
     find_library_info_for_target,
     generate_find_package_info,
     LibraryMapping,
+    add_library_map_change_callback,
 )
 
 
 cmake_version_string = "3.15.0"
-cmake_api_version = 2
+default_cmake_api_version = 2
+cmake_api_version = default_cmake_api_version
+
+# Absolute paths of the files read while converting the current project,
+# see --dependency-file.
+project_dependencies: Set[str] = set()
 
 
-def _parse_commandline():
+def _parse_commandline(command_line_args: Optional[List[str]] = None) -> Namespace:
     parser = ArgumentParser(
         description="Generate CMakeLists.txt files from ." "pro files.",
         epilog="Requirements: pip install -r requirements.txt",
@@ -127,6 +143,12 @@ def _parse_commandline():
         action="store_true",
         help="Show all git commands and file copies.",
     )
+    parser.add_argument(
+        "--debug-condition-simplifier",
+        dest="debug_condition_simplifier",
+        action="store_true",
+        help="Show how many conditions were simplified with and without sympy.",
+    )
 
     parser.add_argument(
         "--is-example",
@@ -139,7 +161,22 @@ def _parse_commandline():
         "--skip-special-case-preservation",
         dest="skip_special_case_preservation",
         action="store_true",
-        help="Skips behavior to reapply " "special case modifications (requires git in PATH)",
+        help="Skips behavior to reapply " "special case modifications",
+    )
+    parser.add_argument(
+        "--record-prev-files",
+        dest="record_prev_files",
+        type=str,
+        help="Instead of running git add on the updated .prev_CMakeLists.txt file, append its "
+        "path to the given file, so that the caller can git add all of them at once.",
+    )
+    parser.add_argument(
+        "--use-native-merge",
+        dest="use_native_merge",
+        action="store_true",
+        help="Reapply special case modifications with the built-in three-way merge instead of "
+        "a merge in a temporary git repository. It does not need git, but it only approximates "
+        "the git merge, so the result can differ. It is also used when git is not in PATH.",
     )
     parser.add_argument(
         "-k",
@@ -157,6 +194,41 @@ def _parse_commandline():
         help="Don't use condition simplifier cache (conversion speed may decrease).",
     )
 
+    parser.add_argument(
+        "--condition-simplifier-budget",
+        dest="condition_simplifier_budget",
+        type=int,
+        help="Maximum number of steps spent on simplifying a single condition. Conditions "
+        "exceeding it are left unsimplified, and conditions with many symbols are simplified "
+        "with cheaper heuristics. Real world conditions take less than 1000 steps.",
+    )
+
+    parser.add_argument(
+        "--condition-simplification-jobs",
+        dest="condition_simplification_jobs",
+        type=int,
+        default=1,
+        help="Number of processes used to simplify the conditions of the scopes of a project. "
+        "With more than one, the distinct conditions that are not cached yet are simplified "
+        "in parallel.",
+    )
+
+    parser.add_argument(
+        "--skip-parse-tree-cache",
+        dest="skip_parse_tree_cache",
+        action="store_true",
+        help="Don't use the qmake parse tree cache (conversion speed may decrease).",
+    )
+
+    parser.add_argument(
+        "--qmake-parser",
+        dest="qmake_parser",
+        choices=parser_backends,
+        default="pyparsing",
+        help="Parser used for .pro and .pri files. The 'fast' parser is a hand-written "
+        "replacement of the pyparsing grammar, which produces the same results.",
+    )
+
     parser.add_argument(
         "--skip-subdirs-project",
         dest="skip_subdirs_project",
@@ -172,6 +244,14 @@ def _parse_commandline():
         help="If set, pro file will be converted even if skip marker is found in CMakeLists.txt.",
     )
 
+    parser.add_argument(
+        "--dependency-file",
+        dest="dependency_file",
+        type=str,
+        help="Write the paths of the files that the conversion of the project read, "
+        "like included .pri and .qrc files, to the given file as a JSON list.",
+    )
+
     parser.add_argument(
         "--api-version",
         dest="api_version",
@@ -186,105 +266,111 @@ def _parse_commandline():
         nargs="+",
         help="The .pro/.pri file to process",
     )
-    return parser.parse_args()
+    return parser.parse_args(command_line_args)
+
+
+class ProjectClassification:
+    """ Kinds of a project, based on its location relative to the directory
+    with the .qmake.conf file of its repository. """
+
+    def __init__(self, project_file_path: str) -> None:
+        qmake_conf_path = find_qmake_conf(project_file_path)
+        qmake_conf_dir_path = os.path.dirname(qmake_conf_path)
+        project_dir_path = os.path.dirname(project_file_path)
+        project_dir_name = os.path.basename(project_dir_path)
+        maybe_same_level_dir_path = os.path.normpath(os.path.join(project_dir_path, ".."))
+        project_relative_path = os.path.relpath(project_file_path, qmake_conf_dir_path)
+
+        self.is_top_level_repo = qmake_conf_dir_path == project_dir_path
+        self.is_top_level_repo_tests = (
+            qmake_conf_dir_path == maybe_same_level_dir_path and project_dir_name == "tests"
+        )
+        self.is_top_level_repo_examples = (
+            qmake_conf_dir_path == maybe_same_level_dir_path and project_dir_name == "examples"
+        )
+
+        # If the project file is found in a subdir called 'examples'
+        # relative to the repo source dir, then it must be an example, but
+        # some examples contain 3rdparty libraries that do not need to be
+        # built as examples.
+        self.is_example = (
+            project_relative_path.startswith("examples") and "3rdparty" not in project_relative_path
+        )
+
+        # If the project file is found in a subdir called 'config.tests'
+        # relative to the repo source dir, then it's probably a config test.
+        # Also if the .qmake.conf is found within config.tests dir (like in qtbase)
+        # then the project is probably a config .test
+        self.is_config_test = (
+            project_relative_path.startswith("config.tests")
+            or os.path.basename(qmake_conf_dir_path) == "config.tests"
+        )
+
+        # If the project file is found in a subdir called 'tests/benchmarks'
+        # relative to the repo source dir, then it must be a benchmark
+        self.is_benchmark = project_relative_path.startswith("tests/benchmarks")
+
+        # If the project file is found in a subdir called 'tests/manual'
+        # relative to the repo source dir, then it must be a manual test
+        self.is_manual_test = project_relative_path.startswith("tests/manual")
+
+
+@lru_cache(maxsize=None)
+def get_project_classification(project_file_path: str = "") -> ProjectClassification:
+    return ProjectClassification(project_file_path)
 
 
 def is_top_level_repo_project(project_file_path: str = "") -> bool:
-    qmake_conf_path = find_qmake_conf(project_file_path)
-    qmake_conf_dir_path = os.path.dirname(qmake_conf_path)
-    project_dir_path = os.path.dirname(project_file_path)
-    return qmake_conf_dir_path == project_dir_path
+    return get_project_classification(project_file_path).is_top_level_repo
 
 
 def is_top_level_repo_tests_project(project_file_path: str = "") -> bool:
-    qmake_conf_path = find_qmake_conf(project_file_path)
-    qmake_conf_dir_path = os.path.dirname(qmake_conf_path)
-    project_dir_path = os.path.dirname(project_file_path)
-    project_dir_name = os.path.basename(project_dir_path)
-    maybe_same_level_dir_path = os.path.join(project_dir_path, "..")
-    normalized_maybe_same_level_dir_path = os.path.normpath(maybe_same_level_dir_path)
-    return (
-        qmake_conf_dir_path == normalized_maybe_same_level_dir_path and project_dir_name == "tests"
-    )
+    return get_project_classification(project_file_path).is_top_level_repo_tests
 
 
 def is_top_level_repo_examples_project(project_file_path: str = "") -> bool:
-    qmake_conf_path = find_qmake_conf(project_file_path)
-    qmake_conf_dir_path = os.path.dirname(qmake_conf_path)
-    project_dir_path = os.path.dirname(project_file_path)
-    project_dir_name = os.path.basename(project_dir_path)
-    maybe_same_level_dir_path = os.path.join(project_dir_path, "..")
-    normalized_maybe_same_level_dir_path = os.path.normpath(maybe_same_level_dir_path)
-    return (
-        qmake_conf_dir_path == normalized_maybe_same_level_dir_path
-        and project_dir_name == "examples"
-    )
+    return get_project_classification(project_file_path).is_top_level_repo_examples
 
 
 def is_example_project(project_file_path: str = "") -> bool:
-    qmake_conf_path = find_qmake_conf(project_file_path)
-    qmake_conf_dir_path = os.path.dirname(qmake_conf_path)
-
-    project_relative_path = os.path.relpath(project_file_path, qmake_conf_dir_path)
-    # If the project file is found in a subdir called 'examples'
-    # relative to the repo source dir, then it must be an example, but
-    # some examples contain 3rdparty libraries that do not need to be
-    # built as examples.
-    return project_relative_path.startswith("examples") and "3rdparty" not in project_relative_path
+    return get_project_classification(project_file_path).is_example
 
 
 def is_config_test_project(project_file_path: str = "") -> bool:
-    qmake_conf_path = find_qmake_conf(project_file_path)
-    qmake_conf_dir_path = os.path.dirname(qmake_conf_path)
-    dir_name_with_qmake_confg = os.path.basename(qmake_conf_dir_path)
-
-    project_relative_path = os.path.relpath(project_file_path, qmake_conf_dir_path)
-    # If the project file is found in a subdir called 'config.tests'
-    # relative to the repo source dir, then it's probably a config test.
-    # Also if the .qmake.conf is found within config.tests dir (like in qtbase)
-    # then the project is probably a config .test
-    return (
-        project_relative_path.startswith("config.tests")
-        or dir_name_with_qmake_confg == "config.tests"
-    )
+    return get_project_classification(project_file_path).is_config_test
 
 
 def is_benchmark_project(project_file_path: str = "") -> bool:
-    qmake_conf_path = find_qmake_conf(project_file_path)
-    qmake_conf_dir_path = os.path.dirname(qmake_conf_path)
-
-    project_relative_path = os.path.relpath(project_file_path, qmake_conf_dir_path)
-    # If the project file is found in a subdir called 'tests/benchmarks'
-    # relative to the repo source dir, then it must be a benchmark
-    return project_relative_path.startswith("tests/benchmarks")
+    return get_project_classification(project_file_path).is_benchmark
 
 
 def is_manual_test_project(project_file_path: str = "") -> bool:
-    qmake_conf_path = find_qmake_conf(project_file_path)
-    qmake_conf_dir_path = os.path.dirname(qmake_conf_path)
+    return get_project_classification(project_file_path).is_manual_test
 
-    project_relative_path = os.path.relpath(project_file_path, qmake_conf_dir_path)
-    # If the project file is found in a subdir called 'tests/manual'
-    # relative to the repo source dir, then it must be a manual test
-    return project_relative_path.startswith("tests/manual")
 
+# Maps directories to the nearest .qmake.conf file in them or their
+# ancestors, or to "" if there is none. Shared by all projects converted
+# by this process, so each directory is probed only once.
+_qmake_conf_by_directory: Dict[str, str] = {}
 
-@lru_cache(maxsize=None)
-def find_qmake_conf(project_file_path: str = "") -> str:
-    if not os.path.isabs(project_file_path):
-        print(
-            f"Warning: could not find .qmake.conf file, given path is not an "
-            f"absolute path: {project_file_path}"
-        )
-        return ""
 
-    cwd = os.path.dirname(project_file_path)
+def _find_qmake_conf_in_directory(directory: str) -> str:
     file_name = ".qmake.conf"
+    visited_dirs = []
+    result = ""
 
+    cwd = directory
     while os.path.isdir(cwd):
+        cached_result = _qmake_conf_by_directory.get(cwd)
+        if cached_result is not None:
+            result = cached_result
+            break
+
+        visited_dirs.append(cwd)
         maybe_file = posixpath.join(cwd, file_name)
         if os.path.isfile(maybe_file):
-            return maybe_file
+            result = maybe_file
+            break
         else:
             last_cwd = cwd
             cwd = os.path.dirname(cwd)
@@ -292,8 +378,33 @@ def find_qmake_conf(project_file_path: str = "") -> str:
                 # reached the top level directory, stop looking
                 break
 
-    print(f"Warning: could not find .qmake.conf file")
-    return ""
+    for visited_dir in visited_dirs:
+        _qmake_conf_by_directory[visited_dir] = result
+    return result
+
+
+@lru_cache(maxsize=None)
+def find_qmake_conf(project_file_path: str = "") -> str:
+    if not os.path.isabs(project_file_path):
+        print(
+            f"Warning: could not find .qmake.conf file, given path is not an "
+            f"absolute path: {project_file_path}"
+        )
+        return ""
+
+    qmake_conf_path = _find_qmake_conf_in_directory(os.path.dirname(project_file_path))
+    if not qmake_conf_path:
+        print(f"Warning: could not find .qmake.conf file")
+    return qmake_conf_path
+
+
+def add_project_dependency(path: str) -> None:
+    project_dependencies.add(os.path.abspath(path))
+
+
+def write_project_dependencies(dependency_file_path: str, dependencies: Set[str]) -> None:
+    with open(dependency_file_path, "w") as dependency_file:
+        json.dump(sorted(dependencies), dependency_file)
 
 
 def set_up_cmake_api_calls():
@@ -373,7 +484,75 @@ def get_cmake_api_call(api_name: str, api_version: Optional[int] = None) -> str:
     return cmake_api_calls[api_version][api_name]
 
 
+class QrcResource:
+    """ A <qresource> element of a .qrc file. """
+
+    def __init__(self, lang: str, prefix: str) -> None:
+        self.lang = lang
+        self.prefix = prefix
+        # Maps the file paths to their (possibly empty) aliases.
+        self.files: Dict[str, str] = {}
+
+
+# Parsed .qrc files by absolute path. Each entry holds the modification time
+# and size of the file, the hash of its contents and its resources.
+_parsed_qrc_files: Dict[str, Tuple[Tuple[int, int], str, List[QrcResource]]] = {}
+
+
+def _parse_qrc_contents(contents: bytes) -> List[QrcResource]:
+    resources: List[QrcResource] = []
+    depth = 0
+    for event, element in ET.iterparse(io.BytesIO(contents), events=("start", "end")):
+        if event == "start":
+            depth += 1
+            if depth == 1:
+                assert element.tag == "RCC"
+            elif depth == 2:
+                assert element.tag == "qresource"
+                prefix = element.get("prefix", "/")
+                if not prefix.startswith("/"):
+                    prefix = f"/{prefix}"
+                resources.append(QrcResource(element.get("lang", ""), prefix))
+            continue
+
+        depth -= 1
+        if depth == 2:
+            path = element.text
+            assert path
+            resources[-1].files[path] = element.get("alias", "")
+        if depth in (1, 2):
+            # Release the already handled elements, large .qrc files can
+            # list thousands of files.
+            element.clear()
+    return resources
+
+
+def parse_qrc_file(filepath: str) -> List[QrcResource]:
+    """ Returns the resources of a .qrc file.
+
+    The result is cached by the modification time and size of the file,
+    and by the hash of its contents when those change. """
+    path = os.path.abspath(filepath)
+    add_project_dependency(path)
+    stat = os.stat(path)
+    stat_key = (stat.st_mtime_ns, stat.st_size)
+    cached = _parsed_qrc_files.get(path)
+    if cached and cached[0] == stat_key:
+        return cached[2]
+
+    with open(path, "rb") as file_fd:
+        contents = file_fd.read()
+    contents_hash = hashlib.sha1(contents).hexdigest()
+    if cached and cached[1] == contents_hash:
+        resources = cached[2]
+    else:
+        resources = _parse_qrc_contents(contents)
+    _parsed_qrc_files[path] = (stat_key, contents_hash, resources)
+    return resources
+
+
 def process_qrc_file(
+    cm_fh: IO[str],
     target: str,
     filepath: str,
     base_dir: str = "",
@@ -381,7 +560,7 @@ def process_qrc_file(
     skip_qtquick_compiler: bool = False,
     retain_qtquick_compiler: bool = False,
     is_example: bool = False,
-) -> str:
+):
     assert target
 
     # Hack to handle QT_SOURCE_TREE. Assume currently that it's the same
@@ -409,53 +588,32 @@ def process_qrc_file(
     if not os.path.isfile(filepath):
         raise RuntimeError(f"Invalid file path given to process_qrc_file: {filepath}")
 
-    tree = ET.parse(filepath)
-    root = tree.getroot()
-    assert root.tag == "RCC"
-
-    output = ""
-
-    resource_count = 0
-    for resource in root:
-        assert resource.tag == "qresource"
-        lang = resource.get("lang", "")
-        prefix = resource.get("prefix", "/")
-        if not prefix.startswith("/"):
-            prefix = f"/{prefix}"
-
+    for resource_count, resource in enumerate(parse_qrc_file(filepath)):
         full_resource_name = resource_name + (str(resource_count) if resource_count > 0 else "")
 
-        files: Dict[str, str] = {}
-        for file in resource:
-            path = file.text
-            assert path
-
-            # Get alias:
-            alias = file.get("alias", "")
+        files = resource.files
+        if is_parent_path:
             # In cases where examples use shared resources, we set the alias
             # too the same name of the file, or the applications won't be
             # be able to locate the resource
-            if not alias and is_parent_path:
-                alias = path
-            files[path] = alias
+            files = {path: alias or path for path, alias in files.items()}
 
-        output += write_add_qt_resource_call(
+        write_add_qt_resource_call(
+            cm_fh,
             target,
             full_resource_name,
-            prefix,
+            resource.prefix,
             base_dir,
-            lang,
+            resource.lang,
             files,
             skip_qtquick_compiler,
             retain_qtquick_compiler,
             is_example,
         )
-        resource_count += 1
-
-    return output
 
 
 def write_add_qt_resource_call(
+    cm_fh: IO[str],
     target: str,
     resource_name: str,
     prefix: Optional[str],
@@ -465,9 +623,7 @@ def write_add_qt_resource_call(
     skip_qtquick_compiler: bool,
     retain_qtquick_compiler: bool,
     is_example: bool,
-) -> str:
-    output = ""
-
+):
     sorted_files = sorted(files.keys())
 
     assert sorted_files
@@ -476,61 +632,45 @@ def write_add_qt_resource_call(
         alias = files[source]
         if alias:
             full_source = posixpath.join(base_dir, source)
-            output += dedent(
-                f"""\
-                set_source_files_properties("{full_source}"
-                    PROPERTIES QT_RESOURCE_ALIAS "{alias}"
-                )
-            """
+            cm_fh.write(
+                f'set_source_files_properties("{full_source}"\n'
+                f'    PROPERTIES QT_RESOURCE_ALIAS "{alias}"\n'
+                ")\n"
             )
 
-    # Quote file paths in case there are spaces.
-    sorted_files_backup = sorted_files
-    sorted_files = []
-    for source in sorted_files_backup:
+    cm_fh.write(f"set({resource_name}_resource_files\n")
+    for source in sorted_files:
+        # Quote file paths in case there are spaces.
         if source.startswith("${"):
-            sorted_files.append(source)
+            cm_fh.write(f"    {source}\n")
         else:
-            sorted_files.append(f'"{source}"')
+            cm_fh.write(f'    "{source}"\n')
+    cm_fh.write(")\n\n")
 
-    file_list = "\n            ".join(sorted_files)
-    output += dedent(
-        f"""\
-        set({resource_name}_resource_files
-            {file_list}
-        )\n
-        """
-    )
     file_list = f"${{{resource_name}_resource_files}}"
     if skip_qtquick_compiler:
-        output += (
+        cm_fh.write(
             f"set_source_files_properties(${{{resource_name}_resource_files}}"
             " PROPERTIES QT_SKIP_QUICKCOMPILER 1)\n\n"
         )
 
     if retain_qtquick_compiler:
-        output += (
+        cm_fh.write(
             f"set_source_files_properties(${{{resource_name}_resource_files}}"
             "PROPERTIES QT_RETAIN_QUICKCOMPILER 1)\n\n"
         )
 
-    params = ""
-    if lang:
-        params += f'{spaces(1)}LANG\n{spaces(2)}"{lang}"\n'
-    params += f'{spaces(1)}PREFIX\n{spaces(2)}"{prefix}"\n'
-    if base_dir:
-        params += f'{spaces(1)}BASE\n{spaces(2)}"{base_dir}"\n'
-    add_resource_command = ""
     if is_example:
         add_resource_command = "qt6_add_resources"
     else:
         add_resource_command = get_cmake_api_call("qt_add_resource")
-    output += (
-        f'{add_resource_command}({target} "{resource_name}"\n{params}{spaces(1)}FILES\n'
-        f"{spaces(2)}{file_list}\n)\n"
-    )
-
-    return output
+    cm_fh.write(f'{add_resource_command}({target} "{resource_name}"\n')
+    if lang:
+        cm_fh.write(f'{spaces(1)}LANG\n{spaces(2)}"{lang}"\n')
+    cm_fh.write(f'{spaces(1)}PREFIX\n{spaces(2)}"{prefix}"\n')
+    if base_dir:
+        cm_fh.write(f'{spaces(1)}BASE\n{spaces(2)}"{base_dir}"\n')
+    cm_fh.write(f"{spaces(1)}FILES\n{spaces(2)}{file_list}\n)\n")
 
 
 class QmlDirFileInfo:
@@ -673,6 +813,27 @@ def map_to_file(f: str, scope: Scope, *, is_include: bool = False) -> str:
     return trim_leading_dot(f)
 
 
+_variable_reference_pattern = re.compile(r"\$\$\{?([A-Za-z_][A-Za-z0-9_]*)\}?")
+_env_variable_reference_pattern = re.compile(r"\$\$\(([A-Za-z_][A-Za-z0-9_]*)\)")
+
+
+# Splits a value into literal text and $$VAR / $${VAR} references. Each
+# token is a (text, variable name) tuple, the variable name is None for
+# literal text.
+@lru_cache(maxsize=None)
+def tokenize_variable_references(value: str) -> Tuple[Tuple[str, Optional[str]], ...]:
+    tokens: List[Tuple[str, Optional[str]]] = []
+    position = 0
+    for match in _variable_reference_pattern.finditer(value):
+        if match.start() > position:
+            tokens.append((value[position : match.start()], None))
+        tokens.append((match.group(0), match.group(1)))
+        position = match.end()
+    if position < len(value):
+        tokens.append((value[position:], None))
+    return tuple(tokens)
+
+
 def handle_vpath(source: str, base_dir: str, vpath: List[str]) -> str:
     assert "$$" not in source
 
@@ -702,6 +863,8 @@ def handle_vpath(source: str, base_dir: str, vpath: List[str]) -> str:
 
 
 class Operation:
+    __slots__ = ("_value", "_line_no")
+
     def __init__(self, value: Union[List[str], str], line_no: int = -1) -> None:
         if isinstance(value, list):
             self._value = value
@@ -734,6 +897,8 @@ class Operation:
 
 
 class AddOperation(Operation):
+    __slots__ = ()
+
     def process(
         self, key: str, sinput: List[str], transformer: Callable[[List[str]], List[str]]
     ) -> List[str]:
@@ -744,6 +909,8 @@ class AddOperation(Operation):
 
 
 class UniqueAddOperation(Operation):
+    __slots__ = ()
+
     def process(
         self, key: str, sinput: List[str], transformer: Callable[[List[str]], List[str]]
     ) -> List[str]:
@@ -758,6 +925,8 @@ class UniqueAddOperation(Operation):
 
 
 class ReplaceOperation(Operation):
+    __slots__ = ()
+
     def process(
         self, key: str, sinput: List[str], transformer: Callable[[List[str]], List[str]]
     ) -> List[str]:
@@ -791,6 +960,8 @@ class ReplaceOperation(Operation):
 
 
 class SetOperation(Operation):
+    __slots__ = ()
+
     def process(
         self, key: str, sinput: List[str], transformer: Callable[[List[str]], List[str]]
     ) -> List[str]:
@@ -811,6 +982,8 @@ class SetOperation(Operation):
 
 
 class RemoveOperation(Operation):
+    __slots__ = ()
+
     def process(
         self, key: str, sinput: List[str], transformer: Callable[[List[str]], List[str]]
     ) -> List[str]:
@@ -840,6 +1013,8 @@ class RemoveOperation(Operation):
 # traversing include()'d scopes. Used for sorting when determining
 # operation order when evaluating operations.
 class OperationLocation(object):
+    __slots__ = ("list_of_scope_ids_and_line_numbers",)
+
     def __init__(self):
         self.list_of_scope_ids_and_line_numbers = []
 
@@ -851,6 +1026,14 @@ class OperationLocation(object):
         new_location.list_of_scope_ids_and_line_numbers.append((scope_id, line_number))
         return new_location
 
+    def clone_and_prepend(self, scope_id: int, line_number: int) -> OperationLocation:
+        new_location = OperationLocation()
+        new_location.list_of_scope_ids_and_line_numbers = [
+            (scope_id, line_number),
+            *self.list_of_scope_ids_and_line_numbers,
+        ]
+        return new_location
+
     def __lt__(self, other: OperationLocation) -> Any:
         return self.list_of_scope_ids_and_line_numbers < other.list_of_scope_ids_and_line_numbers
 
@@ -866,6 +1049,14 @@ class Scope(object):
 
     SCOPE_ID: int = 1
 
+    # Bumped whenever the operations of any scope change. Evaluated values
+    # can depend on the operations of parent and included scopes, so this
+    # invalidates the evaluation caches of all scopes at once.
+    OPERATIONS_GENERATION: int = 0
+
+    # Sets of (scope, key) pairs visited by the evaluations in progress.
+    _visited_keys_recorders: List[Set[Tuple[Scope, str]]] = []
+
     def __init__(
         self,
         *,
@@ -907,6 +1098,12 @@ class Scope(object):
         self._children = []  # type: List[Scope]
         self._included_children = []  # type: List[Scope]
         self._visited_keys = set()  # type: Set[str]
+        self._evaluation_cache: Dict[
+            Tuple[str, bool, Any], Tuple[List[str], Set[Tuple[Scope, str]]]
+        ] = {}
+        self._expansion_cache: Dict[str, Tuple[List[str], Set[Tuple[Scope, str]]]] = {}
+        self._operation_index: Dict[str, List[Tuple[OperationLocation, Operation, Scope]]] = {}
+        self._cache_generation = Scope.OPERATIONS_GENERATION
         self._total_condition = None  # type: Optional[str]
         self._parent_include_line_no = parent_include_line_no
         self._is_public_module = False
@@ -921,9 +1118,46 @@ class Scope(object):
     def reset_visited_keys(self):
         self._visited_keys = set()
 
+    def _drop_stale_caches(self) -> None:
+        if self._cache_generation != Scope.OPERATIONS_GENERATION:
+            self._evaluation_cache = {}
+            self._expansion_cache = {}
+            self._operation_index = {}
+            self._cache_generation = Scope.OPERATIONS_GENERATION
+
+    @staticmethod
+    def _memoize_evaluation(
+        cache: Dict[Any, Tuple[List[str], Set[Tuple[Scope, str]]]],
+        cache_key: Any,
+        evaluate: Callable[[], List[str]],
+    ) -> List[str]:
+        cached = cache.get(cache_key)
+        if cached is None:
+            # Remember which keys the evaluation visits, including the ones
+            # visited by transformers, to mark them again on cache hits.
+            visited_keys: Set[Tuple[Scope, str]] = set()
+            Scope._visited_keys_recorders.append(visited_keys)
+            try:
+                result = evaluate()
+            finally:
+                Scope._visited_keys_recorders.pop()
+            cache[cache_key] = (list(result), visited_keys)
+            return result
+
+        cached_result, visited_keys = cached
+        for scope, visited_key in visited_keys:
+            scope._visit_key(visited_key)
+        return list(cached_result)
+
+    def _visit_key(self, key: str) -> None:
+        self._visited_keys.add(key)
+        for recorded_keys in Scope._visited_keys_recorders:
+            recorded_keys.add((self, key))
+
     def merge(self, other: "Scope") -> None:
         assert self != other
         self._included_children.append(other)
+        Scope.invalidate_evaluation_caches()
 
     @property
     def scope_debug(self) -> bool:
@@ -1069,6 +1303,11 @@ class Scope(object):
             self._operations[key].append(op)
         else:
             self._operations[key] = [op]
+        Scope.invalidate_evaluation_caches()
+
+    @staticmethod
+    def invalidate_evaluation_caches() -> None:
+        Scope.OPERATIONS_GENERATION += 1
 
     @property
     def file(self) -> str:
@@ -1151,32 +1390,37 @@ class Scope(object):
     def visited_keys(self):
         return self._visited_keys
 
-    # Traverses a scope and its children, and collects operations
-    # that need to be processed for a certain key.
-    def _gather_operations_from_scope(
-        self,
-        operations_result: List[Dict[str, Any]],
-        current_scope: Scope,
-        op_key: str,
-        current_location: OperationLocation,
-    ):
-        for op in current_scope._operations.get(op_key, []):
-            new_op_location = current_location.clone_and_append(
-                current_scope._scope_id, op._line_no
-            )
-            op_info: Dict[str, Any] = {}
-            op_info["op"] = op
-            op_info["scope"] = current_scope
-            op_info["location"] = new_op_location
-            operations_result.append(op_info)
-
-        for included_child in current_scope._included_children:
-            new_scope_location = current_location.clone_and_append(
-                current_scope._scope_id, included_child._parent_include_line_no
-            )
-            self._gather_operations_from_scope(
-                operations_result, included_child, op_key, new_scope_location
-            )
+    # Returns the operations for a certain key of a scope and its
+    # included children, together with the scope that each operation
+    # belongs to, sorted by the location of each operation.
+    def _get_operation_index(self, key: str) -> List[Tuple[OperationLocation, Operation, Scope]]:
+        self._drop_stale_caches()
+        index = self._operation_index.get(key)
+        if index is None:
+            index = [
+                (OperationLocation().clone_and_append(self._scope_id, op._line_no), op, self)
+                for op in self._operations.get(key, [])
+            ]
+            # The index of each included child is already sorted, and stays
+            # sorted after prepending the location of the include.
+            for included_child in self._included_children:
+                index += [
+                    (
+                        location.clone_and_prepend(
+                            self._scope_id, included_child._parent_include_line_no
+                        ),
+                        op,
+                        op_scope,
+                    )
+                    for location, op, op_scope in included_child._get_operation_index(key)
+                ]
+
+            # Sorts the operations based on the location of each operation. Technically
+            # compares two lists of tuples. The sort is stable, so operations with the same
+            # location keep the order in which they were added.
+            index.sort(key=lambda entry: entry[0])
+            self._operation_index[key] = index
+        return index
 
     # Partially applies a scope argument to a given transformer.
     @staticmethod
@@ -1204,7 +1448,28 @@ class Scope(object):
         *,
         inherit: bool = False,
     ) -> List[str]:
-        self._visited_keys.add(key)
+        # Evaluations starting from scratch are memoized. The transformer is
+        # part of the cache key, so callers need to pass the same transformer
+        # object for equivalent transformations to hit the cache.
+        if result:
+            return self._evalOpsUncached(key, transformer, result, inherit=inherit)
+
+        self._drop_stale_caches()
+        return self._memoize_evaluation(
+            self._evaluation_cache,
+            (key, inherit, transformer),
+            lambda: self._evalOpsUncached(key, transformer, [], inherit=inherit),
+        )
+
+    def _evalOpsUncached(
+        self,
+        key: str,
+        transformer: Optional[Callable[[Scope, List[str]], List[str]]],
+        result: List[str],
+        *,
+        inherit: bool = False,
+    ) -> List[str]:
+        self._visit_key(key)
 
         # Inherit values from parent scope.
         # This is a strange edge case which is wrong in principle, because
@@ -1214,21 +1479,10 @@ class Scope(object):
         if self._parent and inherit:
             result = self._parent._evalOps(key, transformer, result)
 
-        operations_to_run: List[Dict[str, Any]] = []
-        starting_location = OperationLocation()
-        starting_scope = self
-        self._gather_operations_from_scope(
-            operations_to_run, starting_scope, key, starting_location
-        )
-
-        # Sorts the operations based on the location of each operation. Technically compares two
-        # lists of tuples.
-        operations_to_run = sorted(operations_to_run, key=lambda o: o["location"])
-
         # Process the operations.
-        for op_info in operations_to_run:
-            op_transformer = self._create_transformer_for_operation(transformer, op_info["scope"])
-            result = op_info["op"].process(key, result, op_transformer)
+        for _, op, op_scope in self._get_operation_index(key):
+            op_transformer = self._create_transformer_for_operation(transformer, op_scope)
+            result = op.process(key, result, op_transformer)
         return result
 
     def get(self, key: str, *, ignore_includes: bool = False, inherit: bool = False) -> List[str]:
@@ -1303,58 +1557,81 @@ class Scope(object):
     def get_files(
         self, key: str, *, use_vpath: bool = False, is_include: bool = False
     ) -> List[str]:
+        transformer = self._get_files_transformer(use_vpath, is_include)
+        return list(self._evalOps(key, transformer, []))
+
+    # Returns the same transformer object for the same arguments, so that
+    # the results of get_files() can be served from the evaluation cache.
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _get_files_transformer(
+        use_vpath: bool, is_include: bool
+    ) -> Callable[[Scope, List[str]], List[str]]:
         def transformer(scope, files):
             return scope._map_files(files, use_vpath=use_vpath, is_include=is_include)
 
-        return list(self._evalOps(key, transformer, []))
+        return transformer
 
     @staticmethod
     def _replace_env_var_value(value: Any) -> Any:
         if not isinstance(value, str):
             return value
+        return _env_variable_reference_pattern.sub(r"$ENV{\1}", value)
 
-        pattern = re.compile(r"\$\$\(([A-Za-z_][A-Za-z0-9_]*)\)")
-        match = re.search(pattern, value)
-        if match:
-            value = re.sub(pattern, r"$ENV{\1}", value)
+    def _expand_value(self, value: str) -> List[str]:
+        self._drop_stale_caches()
+        return self._memoize_evaluation(
+            self._expansion_cache,
+            value,
+            lambda: self._expand_value_uncached(value, frozenset()),
+        )
 
-        return value
+    # Expands the variable references of a value. A value consisting of a
+    # single reference expands to the list of values of the variable,
+    # otherwise each reference is replaced by the first value of the
+    # variable. Variables in the expanding set are being expanded already,
+    # their references are kept as they are, instead of recursing forever.
+    def _expand_value_uncached(self, value: str, expanding: FrozenSet[str]) -> List[str]:
+        tokens = tokenize_variable_references(value)
+        if len(tokens) == 1 and tokens[0][1] is not None and tokens[0][1] not in expanding:
+            name = tokens[0][1]
+            get_result = self.get(name, inherit=True)
+            if len(get_result) == 1:
+                return [
+                    self._expand_string(
+                        self._replace_env_var_value(get_result[0]), value, expanding | {name}
+                    )
+                ]
 
-    def _expand_value(self, value: str) -> List[str]:
-        result = value
-        pattern = re.compile(r"\$\$\{?([A-Za-z_][A-Za-z0-9_]*)\}?")
-        match = re.search(pattern, result)
-        while match:
-            old_result = result
-            match_group_0 = match.group(0)
-            if match_group_0 == value:
-                get_result = self.get(match.group(1), inherit=True)
-                if len(get_result) == 1:
-                    result = get_result[0]
-                    result = self._replace_env_var_value(result)
-                else:
-                    # Recursively expand each value from the result list
-                    # returned from self.get().
-                    result_list: List[str] = []
-                    for entry_value in get_result:
-                        result_list += self._expand_value(self._replace_env_var_value(entry_value))
-                    return result_list
-            else:
-                replacement = self.get(match.group(1), inherit=True)
-                replacement_str = replacement[0] if replacement else ""
-                if replacement_str == value:
-                    # we have recursed
-                    replacement_str = ""
-                result = result[: match.start()] + replacement_str + result[match.end() :]
-                result = self._replace_env_var_value(result)
+            # Recursively expand each value from the result list
+            # returned from self.get().
+            result_list: List[str] = []
+            for entry_value in get_result:
+                result_list += self._expand_value_uncached(
+                    self._replace_env_var_value(entry_value), expanding | {name}
+                )
+            return result_list
 
-            if result == old_result:
-                return [result]  # Do not go into infinite loop
+        return [self._expand_string(value, value, expanding)]
 
-            match = re.search(pattern, result)
+    def _expand_string(self, string: str, value: str, expanding: FrozenSet[str]) -> str:
+        parts: List[str] = []
+        for text, name in tokenize_variable_references(string):
+            if name is None or name in expanding:
+                parts.append(text)
+                continue
 
-        result = self._replace_env_var_value(result)
-        return [result]
+            replacement = self.get(name, inherit=True)
+            replacement_str = replacement[0] if replacement else ""
+            if replacement_str == value:
+                # we have recursed
+                replacement_str = ""
+            parts.append(
+                self._expand_string(
+                    self._replace_env_var_value(replacement_str), value, expanding | {name}
+                )
+            )
+        return self._replace_env_var_value("".join(parts))
 
     def expand(self, key: str) -> List[str]:
         value = self.get(key)
@@ -1420,89 +1697,123 @@ def unwrap_if(input_string):
     return output_string
 
 
-def map_condition(condition: str) -> str:
-    # Some hardcoded cases that are too bothersome to generalize.
-    condition = re.sub(
-        r"qtConfig\(opengles\.\)",
-        r"(QT_FEATURE_opengles2 OR QT_FEATURE_opengles3 OR QT_FEATURE_opengles31 OR QT_FEATURE_opengles32)",
-        condition,
-    )
-    condition = re.sub(
-        r"qtConfig\(opengl\(es1\|es2\)\?\)",
-        r"QT_FEATURE_opengl OR QT_FEATURE_opengles2 OR QT_FEATURE_opengles3",
-        condition,
-    )
-    condition = re.sub(r"qtConfig\(opengl\.\*\)", r"QT_FEATURE_opengl", condition)
-    condition = re.sub(r"^win\*$", r"win", condition)
-    condition = re.sub(r"^no-png$", r"NOT QT_FEATURE_png", condition)
-    condition = re.sub(r"contains\(CONFIG, static\)", r"NOT QT_BUILD_SHARED_LIBS", condition)
-    condition = re.sub(r"contains\(QT_CONFIG,\w*shared\)", r"QT_BUILD_SHARED_LIBS", condition)
-    condition = re.sub(r"CONFIG\(osx\)", r"APPLE_OSX", condition)
-
-    def gcc_version_handler(match_obj: Match):
-        operator = match_obj.group(1)
-        version_type = match_obj.group(2)
-        if operator == "equals":
-            operator = "STREQUAL"
-        elif operator == "greaterThan":
-            operator = "STRGREATER"
-        elif operator == "lessThan":
-            operator = "STRLESS"
-
-        version = match_obj.group(3)
-        return f"(QT_COMPILER_VERSION_{version_type} {operator} {version})"
+def _version_comparison_handler(
+    comparison_operators: Dict[str, str], format_string: str
+) -> Callable[[Match], str]:
+    def handler(match_obj: Match) -> str:
+        operator = comparison_operators[match_obj.group(1)]
+        return format_string.format(*match_obj.groups()[1:], operator=operator)
 
-    # TODO: Possibly fix for other compilers.
-    pattern = r"(equals|greaterThan|lessThan)\(QT_GCC_([A-Z]+)_VERSION,[ ]*([0-9]+)\)"
-    condition = re.sub(pattern, gcc_version_handler, condition)
+    return handler
 
-    def windows_sdk_version_handler(match_obj: Match):
-        operator = match_obj.group(1)
-        if operator == "equals":
-            operator = "STREQUAL"
-        elif operator == "greaterThan":
-            operator = "STRGREATER"
-        elif operator == "lessThan":
-            operator = "STRLESS"
 
-        version = match_obj.group(2)
-        return f"(QT_WINDOWS_SDK_VERSION {operator} {version})"
+_string_comparison_operators = {
+    "equals": "STREQUAL",
+    "greaterThan": "STRGREATER",
+    "lessThan": "STRLESS",
+}
+_number_comparison_operators = {"equals": "EQUAL", "greaterThan": "GREATER", "lessThan": "LESS"}
 
-    pattern = r"(equals|greaterThan|lessThan)\(WINDOWS_SDK_VERSION,[ ]*([0-9]+)\)"
-    condition = re.sub(pattern, windows_sdk_version_handler, condition)
+# Each rewrite is a (trigger, pattern, replacement) tuple. The trigger is a
+# substring that the condition must contain for the pattern to match, it
+# allows skipping the regular expression entirely for most conditions.
+ConditionRewrite = Tuple[str, Pattern, Union[str, Callable[[Match], str]]]
 
+# Rewrites applied by map_condition() before handling if(...) conditions.
+_condition_rewrites_before_unwrap: List[ConditionRewrite] = [
+    # Some hardcoded cases that are too bothersome to generalize.
+    (
+        "qtConfig(opengles.)",
+        re.compile(r"qtConfig\(opengles\.\)"),
+        r"(QT_FEATURE_opengles2 OR QT_FEATURE_opengles3 OR QT_FEATURE_opengles31 OR QT_FEATURE_opengles32)",
+    ),
+    (
+        "qtConfig(opengl(es1|es2)?)",
+        re.compile(r"qtConfig\(opengl\(es1\|es2\)\?\)"),
+        r"QT_FEATURE_opengl OR QT_FEATURE_opengles2 OR QT_FEATURE_opengles3",
+    ),
+    ("qtConfig(opengl.*)", re.compile(r"qtConfig\(opengl\.\*\)"), r"QT_FEATURE_opengl"),
+    ("win*", re.compile(r"^win\*$"), r"win"),
+    ("no-png", re.compile(r"^no-png$"), r"NOT QT_FEATURE_png"),
+    (
+        "contains(CONFIG, static)",
+        re.compile(r"contains\(CONFIG, static\)"),
+        r"NOT QT_BUILD_SHARED_LIBS",
+    ),
+    (
+        "contains(QT_CONFIG,",
+        re.compile(r"contains\(QT_CONFIG,\w*shared\)"),
+        r"QT_BUILD_SHARED_LIBS",
+    ),
+    ("CONFIG(osx)", re.compile(r"CONFIG\(osx\)"), r"APPLE_OSX"),
+    # TODO: Possibly fix for other compilers.
+    (
+        "(QT_GCC_",
+        re.compile(r"(equals|greaterThan|lessThan)\(QT_GCC_([A-Z]+)_VERSION,[ ]*([0-9]+)\)"),
+        _version_comparison_handler(
+            _string_comparison_operators, "(QT_COMPILER_VERSION_{0} {operator} {1})"
+        ),
+    ),
+    (
+        "(WINDOWS_SDK_VERSION,",
+        re.compile(r"(equals|greaterThan|lessThan)\(WINDOWS_SDK_VERSION,[ ]*([0-9]+)\)"),
+        _version_comparison_handler(
+            _string_comparison_operators, "(QT_WINDOWS_SDK_VERSION {operator} {0})"
+        ),
+    ),
     # Generic lessThan|equals|lessThan()
+    (
+        "(",
+        re.compile(r"(equals|greaterThan|lessThan)\(([^,]+?),[ ]*([0-9]+)\)"),
+        _version_comparison_handler(_number_comparison_operators, "({0} {operator} {1})"),
+    ),
+]
+
+# Rewrites applied by map_condition() after handling if(...) conditions.
+_condition_rewrites_after_unwrap: List[ConditionRewrite] = [
+    ("isEmpty", re.compile(r"\bisEmpty\s*\((.*?)\)"), r"\1_ISEMPTY"),
+    (
+        "contains",
+        re.compile(r"\bcontains\s*\(\s*(?:QT_)?CONFIG\s*,\s*c\+\+(\d+)\)"),
+        r"cxx_std_\1 IN_LIST CMAKE_CXX_COMPILE_FEATURES",
+    ),
+    ("contains", re.compile(r'\bcontains\s*\((.*?),\s*"?(.*?)"?\)'), r"\1___contains___\2"),
+    ("equals", re.compile(r'\bequals\s*\((.*?),\s*"?(.*?)"?\)'), r"\1___equals___\2"),
+    ("isEqual", re.compile(r'\bisEqual\s*\((.*?),\s*"?(.*?)"?\)'), r"\1___equals___\2"),
+    ("==", re.compile(r"\s*==\s*"), "___STREQUAL___"),
+    ("exists", re.compile(r"\bexists\s*\((.*?)\)"), r"EXISTS \1"),
+]
+
+# Rewrites applied by map_condition() for the android multi arch qmake build.
+_condition_rewrites_for_architectures: List[ConditionRewrite] = [
+    ("x86", re.compile(r"(^| )x86((?=[^\w])|$)"), "TEST_architecture_arch STREQUAL i386"),
+    ("x86_64", re.compile(r"(^| )x86_64"), " TEST_architecture_arch STREQUAL x86_64"),
+    ("arm64-v8a", re.compile(r"(^| )arm64-v8a"), "TEST_architecture_arch STREQUAL arm64"),
+    ("armeabi-v7a", re.compile(r"(^| )armeabi-v7a"), "TEST_architecture_arch STREQUAL arm"),
+]
+
+_build_type_config_pattern = re.compile(r"CONFIG\((debug|release),debug\|release\)")
+_feature_pattern = re.compile(r"(qtConfig|qtHaveModule)\(([a-zA-Z0-9_-]+)\)")
+
+
+def _apply_condition_rewrites(condition: str, rewrites: List[ConditionRewrite]) -> str:
+    for trigger, pattern, replacement in rewrites:
+        if trigger in condition:
+            condition = pattern.sub(replacement, condition)
+    return condition
 
-    def generic_version_handler(match_obj: Match):
-        operator = match_obj.group(1)
-        if operator == "equals":
-            operator = "EQUAL"
-        elif operator == "greaterThan":
-            operator = "GREATER"
-        elif operator == "lessThan":
-            operator = "LESS"
-
-        variable = match_obj.group(2)
-        version = match_obj.group(3)
-        return f"({variable} {operator} {version})"
 
-    pattern = r"(equals|greaterThan|lessThan)\(([^,]+?),[ ]*([0-9]+)\)"
-    condition = re.sub(pattern, generic_version_handler, condition)
+# Called for every scope of every project, with only a few distinct
+# conditions per tree, so the results are memoized.
+@lru_cache(maxsize=None)
+def map_condition(condition: str) -> str:
+    condition = _apply_condition_rewrites(condition, _condition_rewrites_before_unwrap)
 
     # Handle if(...) conditions.
-    condition = unwrap_if(condition)
+    if "if" in condition:
+        condition = unwrap_if(condition)
 
-    condition = re.sub(r"\bisEmpty\s*\((.*?)\)", r"\1_ISEMPTY", condition)
-    condition = re.sub(
-        r"\bcontains\s*\(\s*(?:QT_)?CONFIG\s*,\s*c\+\+(\d+)\)",
-        r"cxx_std_\1 IN_LIST CMAKE_CXX_COMPILE_FEATURES",
-        condition,
-    )
-    condition = re.sub(r'\bcontains\s*\((.*?),\s*"?(.*?)"?\)', r"\1___contains___\2", condition)
-    condition = re.sub(r'\bequals\s*\((.*?),\s*"?(.*?)"?\)', r"\1___equals___\2", condition)
-    condition = re.sub(r'\bisEqual\s*\((.*?),\s*"?(.*?)"?\)', r"\1___equals___\2", condition)
-    condition = re.sub(r"\s*==\s*", "___STREQUAL___", condition)
-    condition = re.sub(r"\bexists\s*\((.*?)\)", r"EXISTS \1", condition)
+    condition = _apply_condition_rewrites(condition, _condition_rewrites_after_unwrap)
 
     # checking mkspec, predating gcc scope in qmake, will then be replaced by platform_mapping in helper.py
     condition = condition.replace("*-g++*", "GCC")
@@ -1513,15 +1824,16 @@ def map_condition(condition: str) -> str:
     condition = condition.replace("*-llvm", "CLANG")
     condition = condition.replace("win32-*", "WIN32")
 
-    pattern = r"CONFIG\((debug|release),debug\|release\)"
-    match_result = re.match(pattern, condition)
+    match_result = _build_type_config_pattern.match(condition)
     if match_result:
         build_type = match_result.group(1)
         if build_type == "debug":
             build_type = "Debug"
         elif build_type == "release":
             build_type = "Release"
-        condition = re.sub(pattern, f"(CMAKE_BUILD_TYPE STREQUAL {build_type})", condition)
+        condition = _build_type_config_pattern.sub(
+            f"(CMAKE_BUILD_TYPE STREQUAL {build_type})", condition
+        )
 
     condition = condition.replace("*", "_x_")
     condition = condition.replace(".$$", "__ss_")
@@ -1532,17 +1844,14 @@ def map_condition(condition: str) -> str:
     condition = condition.replace("|", " OR ")
 
     # new conditions added by the android multi arch qmake build
-    condition = re.sub(r"(^| )x86((?=[^\w])|$)", "TEST_architecture_arch STREQUAL i386", condition)
-    condition = re.sub(r"(^| )x86_64", " TEST_architecture_arch STREQUAL x86_64", condition)
-    condition = re.sub(r"(^| )arm64-v8a", "TEST_architecture_arch STREQUAL arm64", condition)
-    condition = re.sub(r"(^| )armeabi-v7a", "TEST_architecture_arch STREQUAL arm", condition)
+    condition = _apply_condition_rewrites(condition, _condition_rewrites_for_architectures)
 
     # some defines replacements
-    condition = re.sub(r"DEFINES___contains___QT_NO_CURSOR", r"(NOT QT_FEATURE_cursor)", condition)
-    condition = re.sub(
-        r"DEFINES___contains___QT_NO_TRANSLATION", r"(NOT QT_FEATURE_translation)", condition
+    condition = condition.replace("DEFINES___contains___QT_NO_CURSOR", "(NOT QT_FEATURE_cursor)")
+    condition = condition.replace(
+        "DEFINES___contains___QT_NO_TRANSLATION", "(NOT QT_FEATURE_translation)"
     )
-    condition = re.sub(r"styles___contains___fusion", r"QT_FEATURE_style_fusion", condition)
+    condition = condition.replace("styles___contains___fusion", "QT_FEATURE_style_fusion")
 
     condition = condition.replace("cross_compile", "CMAKE_CROSSCOMPILING")
 
@@ -1550,7 +1859,7 @@ def map_condition(condition: str) -> str:
     for part in condition.split():
         # some features contain e.g. linux, that should not be
         # turned upper case
-        feature = re.match(r"(qtConfig|qtHaveModule)\(([a-zA-Z0-9_-]+)\)", part)
+        feature = _feature_pattern.match(part)
         if feature:
             if feature.group(1) == "qtHaveModule":
                 part = f"TARGET {map_qt_library(feature.group(2))}"
@@ -1576,6 +1885,9 @@ def map_condition(condition: str) -> str:
     return cmake_condition.strip()
 
 
+add_library_map_change_callback(map_condition.cache_clear)
+
+
 _path_replacements = {
     "$$[QT_INSTALL_PREFIX]": "${INSTALL_DIRECTORY}",
     "$$[QT_INSTALL_EXAMPLES]": "${INSTALL_EXAMPLESDIR}",
@@ -1651,6 +1963,7 @@ def handle_subdir(
                 if dirname:
                     collect_subdir_info(dirname, current_conditions=current_conditions)
                 else:
+                    add_project_dependency(sd)
                     subdir_result, project_file_content = parseProFile(sd, debug=False)
                     subdir_scope = Scope.FromDict(
                         scope,
@@ -2157,8 +2470,11 @@ def write_ignored_keys(scope: Scope, indent: str) -> str:
     return result
 
 
-def recursive_evaluate_scope(
-    scope: Scope, parent_condition: str = "", previous_condition: str = ""
+def _collect_total_conditions(
+    scope: Scope,
+    parent_condition: str,
+    previous_condition: str,
+    total_conditions: List[Tuple[Scope, str]],
 ) -> str:
     current_condition = scope.condition
     total_condition = current_condition
@@ -2171,11 +2487,31 @@ def recursive_evaluate_scope(
         else:
             total_condition = f"({parent_condition}) AND ({total_condition})"
 
-    scope.total_condition = simplify_condition(total_condition)
+    total_conditions.append((scope, total_condition))
 
     prev_condition = ""
     for c in scope.children:
-        prev_condition = recursive_evaluate_scope(c, total_condition, prev_condition)
+        prev_condition = _collect_total_conditions(
+            c, total_condition, prev_condition, total_conditions
+        )
+
+    return current_condition
+
+
+def recursive_evaluate_scope(
+    scope: Scope, parent_condition: str = "", previous_condition: str = ""
+) -> str:
+    # The total conditions of the scopes only depend on the unsimplified
+    # conditions of their parents, so they are collected first and then
+    # simplified at once, possibly in parallel.
+    total_conditions: List[Tuple[Scope, str]] = []
+    current_condition = _collect_total_conditions(
+        scope, parent_condition, previous_condition, total_conditions
+    )
+
+    simplified_conditions = simplify_conditions([c for _, c in total_conditions])
+    for s, total_condition in total_conditions:
+        s.total_condition = simplified_conditions[total_condition]
 
     return current_condition
 
@@ -2230,7 +2566,7 @@ def write_resources(cm_fh: IO[str], target: str, scope: Scope, indent: int = 0,
     resources = scope.get_files("RESOURCES")
     qtquickcompiler_skipped = scope.get_files("QTQUICK_COMPILER_SKIPPED_RESOURCES")
     qtquickcompiler_retained = scope.get_files("QTQUICK_COMPILER_RETAINED_RESOURCES")
-    qrc_output = ""
+    qrc_output = io.StringIO()
     if resources:
         standalone_files: List[str] = []
         for r in resources:
@@ -2240,7 +2576,8 @@ def write_resources(cm_fh: IO[str], target: str, scope: Scope, indent: int = 0,
                 if "${CMAKE_CURRENT_BINARY_DIR}" in r:
                     cm_fh.write(f"#### Ignored generated resource: {r}")
                     continue
-                qrc_output += process_qrc_file(
+                process_qrc_file(
+                    qrc_output,
                     target,
                     r,
                     scope.basedir,
@@ -2271,7 +2608,8 @@ def write_resources(cm_fh: IO[str], target: str, scope: Scope, indent: int = 0,
                     immediate_base = replace_path_constants("".join(immediate_base_list), scope)
                     immediate_lang = None
                     immediate_name = f"qmake_{r}"
-                    qrc_output += write_add_qt_resource_call(
+                    write_add_qt_resource_call(
+                        qrc_output,
                         target=target,
                         resource_name=immediate_name,
                         prefix=immediate_prefix,
@@ -2289,13 +2627,13 @@ def write_resources(cm_fh: IO[str], target: str, scope: Scope, indent: int = 0,
                         # stadalone source file properties need to be set as they
                         # are parsed.
                         if skip_qtquick_compiler:
-                            qrc_output += (
+                            qrc_output.write(
                                 f'set_source_files_properties("{r}" PROPERTIES '
                                 f"QT_SKIP_QUICKCOMPILER 1)\n\n"
                             )
 
                         if retain_qtquick_compiler:
-                            qrc_output += (
+                            qrc_output.write(
                                 f'set_source_files_properties("{r}" PROPERTIES '
                                 f"QT_RETAIN_QUICKCOMPILER 1)\n\n"
                             )
@@ -2308,7 +2646,8 @@ def write_resources(cm_fh: IO[str], target: str, scope: Scope, indent: int = 0,
             lang = None
             files = {f: "" for f in standalone_files}
             skip_qtquick_compiler = False
-            qrc_output += write_add_qt_resource_call(
+            write_add_qt_resource_call(
+                qrc_output,
                 target=target,
                 resource_name=name,
                 prefix=prefix,
@@ -2320,10 +2659,11 @@ def write_resources(cm_fh: IO[str], target: str, scope: Scope, indent: int = 0,
                 is_example=is_example,
             )
 
-    if qrc_output:
+    qrc_contents = qrc_output.getvalue()
+    if qrc_contents:
         str_indent = spaces(indent)
         cm_fh.write(f"\n{str_indent}# Resources:\n")
-        for line in qrc_output.split("\n"):
+        for line in qrc_contents.split("\n"):
             if line:
                 cm_fh.write(f"{str_indent}{line}\n")
             else:
@@ -2635,6 +2975,7 @@ def handle_source_subtractions(scopes: List[Scope]):
                 continue
             if file in op._value:
                 op._value.remove(file)
+                Scope.invalidate_evaluation_caches()
                 file_removed = True
         for include_child_scope in scope._included_children:
             file_removed = file_removed or remove_file_from_operation(
@@ -3253,6 +3594,7 @@ def write_example(
             qmldir_file_path = os.path.join(os.getcwd(), qmldir_file_path[0])
 
             dynamic_qmldir = scope.get("DYNAMIC_QMLDIR")
+            add_project_dependency(qmldir_file_path)
             if os.path.exists(qmldir_file_path):
                 qml_dir = QmlDir()
                 qml_dir.from_file(qmldir_file_path)
@@ -3522,6 +3864,7 @@ def write_qml_plugin(
     qml_dir = None
     qmldir_file_path = os.path.join(os.getcwd(), "qmldir")
     qml_dir_dynamic_imports = False
+    add_project_dependency(qmldir_file_path)
     if os.path.exists(qmldir_file_path):
         qml_dir = QmlDir()
         qml_dir.from_file(qmldir_file_path)
@@ -3939,13 +4282,16 @@ def cmakeify_scope(
 def generate_new_cmakelists(scope: Scope, *, is_example: bool = False, debug: bool = False) -> None:
     if debug:
         print("Generating CMakeLists.gen.txt")
-    with open(scope.generated_cmake_lists_path, "w") as cm_fh:
-        assert scope.file
-        cm_fh.write(f"# Generated from {os.path.basename(scope.file)}.\n\n")
+    cm_fh = io.StringIO()
+    assert scope.file
+    cm_fh.write(f"# Generated from {os.path.basename(scope.file)}.\n\n")
+
+    is_example_heuristic = is_example_project(scope.file_absolute_path)
+    final_is_example_decision = is_example or is_example_heuristic
+    cmakeify_scope(scope, cm_fh, is_example=final_is_example_decision)
 
-        is_example_heuristic = is_example_project(scope.file_absolute_path)
-        final_is_example_decision = is_example or is_example_heuristic
-        cmakeify_scope(scope, cm_fh, is_example=final_is_example_decision)
+    with open(scope.generated_cmake_lists_path, "w") as gen_fh:
+        gen_fh.write(cm_fh.getvalue())
 
 
 def do_include(scope: Scope, *, debug: bool = False) -> None:
@@ -3955,6 +4301,8 @@ def do_include(scope: Scope, *, debug: bool = False) -> None:
     for include_index, include_file in enumerate(scope.get_files("_INCLUDED", is_include=True)):
         if not include_file:
             continue
+        # Also missing files, their creation changes the conversion result.
+        add_project_dependency(include_file)
         if not os.path.isfile(include_file):
             generated_config_pri_pattern = re.compile(r"qt.+?-config\.pri$")
             match_result = re.search(generated_config_pri_pattern, include_file)
@@ -3986,7 +4334,10 @@ def copy_generated_file_to_final_location(
 ) -> None:
     if debug:
         print(f"Copying {scope.generated_cmake_lists_path} to {scope.original_cmake_lists_path}")
-    copyfile(scope.generated_cmake_lists_path, scope.original_cmake_lists_path)
+    with open(scope.generated_cmake_lists_path, "r") as gen_fh:
+        content = gen_fh.read()
+    if not write_generated_file(scope.original_cmake_lists_path, content) and debug:
+        print(f"{scope.original_cmake_lists_path} is unchanged, not touching it")
     if not keep_temporary_files:
         os.remove(scope.generated_cmake_lists_path)
 
@@ -4054,34 +4405,46 @@ def should_convert_project_after_parsing(
     return True
 
 
-def main() -> None:
-    # Be sure of proper Python version
-    assert sys.version_info >= (3, 7)
+def convert_project(file: str, args: Namespace) -> None:
+    """ Converts a single .pro file using the options parsed by _parse_commandline().
 
-    args = _parse_commandline()
+    Can be called repeatedly from a long-running process, the global
+    conversion state is reset and the working directory is restored
+    after each project. """
+    global cmake_api_version
+    global resource_file_expansion_counter
 
     debug_parsing = args.debug_parser or args.debug
-    if args.skip_condition_cache:
-        set_condition_simplified_cache_enabled(False)
+    set_condition_simplified_cache_enabled(not args.skip_condition_cache)
+    set_condition_simplifier_step_budget(args.condition_simplifier_budget)
+    set_condition_simplification_jobs(args.condition_simplification_jobs)
+    set_parse_tree_cache_enabled(not args.skip_parse_tree_cache)
+    set_parser_backend(args.qmake_parser)
+    resource_file_expansion_counter = 0
+    Scope.SCOPE_ID = 1
+    simplify_condition_counters.clear()
+    project_dependencies.clear()
 
     backup_current_dir = os.getcwd()
-
-    for file in args.files:
+    try:
         new_current_dir = os.path.dirname(file)
         file_relative_path = os.path.basename(file)
         if new_current_dir:
             os.chdir(new_current_dir)
 
         project_file_absolute_path = os.path.abspath(file_relative_path)
+        add_project_dependency(project_file_absolute_path)
+        qmake_conf_path = find_qmake_conf(project_file_absolute_path)
+        if qmake_conf_path:
+            add_project_dependency(qmake_conf_path)
         if not should_convert_project(project_file_absolute_path, args.ignore_skip_marker):
             print(f'Skipping conversion of project: "{project_file_absolute_path}"')
-            continue
+            return
 
         parseresult, project_file_content = parseProFile(file_relative_path, debug=debug_parsing)
 
         # If CMake api version is given on command line, that means the
         # user wants to force use that api version.
-        global cmake_api_version
         if args.api_version:
             cmake_api_version = args.api_version
         else:
@@ -4090,8 +4453,7 @@ def main() -> None:
             detected_cmake_api_version = detect_cmake_api_version_used_in_file_content(
                 file_relative_path
             )
-            if detected_cmake_api_version:
-                cmake_api_version = detected_cmake_api_version
+            cmake_api_version = detected_cmake_api_version or default_cmake_api_version
 
         if args.debug_parse_result or args.debug:
             print("\n\n#### Parser result:")
@@ -4123,10 +4485,16 @@ def main() -> None:
 
         if not should_convert_project_after_parsing(file_scope, args.skip_subdirs_project):
             print(f'Skipping conversion of project: "{project_file_absolute_path}"')
-            continue
+            return
 
         generate_new_cmakelists(file_scope, is_example=args.is_example, debug=args.debug)
 
+        if args.debug_condition_simplifier or args.debug:
+            print(
+                f"Simplified {simplify_condition_counters['fast_path']} conditions without "
+                f"sympy, {simplify_condition_counters['sympy']} conditions with sympy."
+            )
+
         copy_generated_file = True
         if not args.skip_special_case_preservation:
             debug_special_case = args.debug_special_case_preservation or args.debug
@@ -4135,6 +4503,12 @@ def main() -> None:
                 file_scope.generated_cmake_lists_path,
                 file_scope.basedir,
                 keep_temporary_files=args.keep_temporary_files,
+                use_git_merge=not args.use_native_merge,
+                prev_files_list_path=(
+                    os.path.join(backup_current_dir, args.record_prev_files)
+                    if args.record_prev_files
+                    else None
+                ),
                 debug=debug_special_case,
             )
 
@@ -4144,8 +4518,33 @@ def main() -> None:
             copy_generated_file_to_final_location(
                 file_scope, keep_temporary_files=args.keep_temporary_files
             )
+    finally:
         os.chdir(backup_current_dir)
 
 
+def convert_projects(files: List[str], args: Namespace) -> None:
+    """ Converts the given .pro files with convert_project().
+
+    The dependency file, if any, is written once and lists the dependencies
+    of all the projects. """
+    dependencies: Set[str] = set()
+    for file in files:
+        convert_project(file, args)
+        dependencies |= project_dependencies
+    if args.dependency_file:
+        write_project_dependencies(args.dependency_file, dependencies)
+
+
+def main() -> None:
+    # Be sure of proper Python version
+    assert sys.version_info >= (3, 7)
+
+    args = _parse_commandline()
+
+    convert_projects(args.files, args)
+
+    print(format_generated_file_counters())
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,733 @@
+#!/usr/bin/env python3
+#############################################################################
+##
+## Copyright (C) 2018 The Qt Company Ltd.
+## Contact: https://www.qt.io/licensing/
+##
+## This file is part of the plugins of the Qt Toolkit.
+##
+## $QT_BEGIN_LICENSE:GPL-EXCEPT$
+## Commercial License Usage
+## Licensees holding valid commercial Qt licenses may use this file in
+## accordance with the commercial license agreement provided with the
+## Software or, alternatively, in accordance with the terms contained in
+## a written agreement between you and The Qt Company. For licensing terms
+## and conditions see https://www.qt.io/terms-conditions. For further
+## information use the contact form at https://www.qt.io/contact-us.
+##
+## GNU General Public License Usage
+## Alternatively, this file may be used under the terms of the GNU
+## General Public License version 3 as published by the Free Software
+## Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+## included in the packaging of this file. Please review the following
+## information to ensure the GNU General Public License requirements will
+## be met: https://www.gnu.org/licenses/gpl-3.0.html.
+##
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+""" Hand-written recursive descent parser for qmake project files.
+
+This is a drop-in replacement for the pyparsing grammar in qmake_parser.py.
+It follows the same rules (including the quirks of the pyparsing grammar)
+and produces the same statement dictionaries as pp.ParseResults.asDict(),
+but without the backtracking overhead of the parser combinators. """
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import pyparsing as pp  # type: ignore
+
+from qmake_parser import DictParseResults, handle_function_value, readProFile
+
+_Match = Optional[Tuple[int, Any]]
+
+# The grammar skips spaces and tabs between most tokens, and "#" comments
+# anywhere except inside substitutions.
+_ignorable_re = re.compile(r"(?:[ \t]*#[^\n]*)*")
+_space_re = re.compile(r"(?:[ \t]*#[^\n]*)*[ \t]*")
+_space_nl_re = re.compile(r"(?:[ \t]*#[^\n]*)*[ \t\r\n]*")
+_space_no_comment_re = re.compile(r"[ \t]*")
+_space_nl_no_comment_re = re.compile(r"[ \t\r\n]*")
+
+_identifier_re = re.compile(r"[A-Za-z_][A-Za-z0-9_\-./]*")
+_identifier_chars = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_$")
+_literal_value_part_re = re.compile(
+    "[" + re.escape("".join(c for c in pp.printables if c not in "$#{}()")) + "]+"
+)
+_double_quoted_re = re.compile(r'"(?:[^"\n\r\\]|(?:"")|(?:\\(?:[^x]|x[0-9a-fA-F]+)))*')
+_single_quoted_re = re.compile(r"'(?:[^'\n\r\\]|(?:'')|(?:\\(?:[^x]|x[0-9a-fA-F]+)))*")
+_quoted_value_re = re.compile(r'"(?:[^"\n\r\\]|(?:\\.))*"')
+_dollar_parenthesis_re = re.compile(r"\$\((?:[^)\n\r]|(?:\\))*\)")
+_nested_content_re = re.compile(r"[^() \t\"']+")
+_braced_content_re = re.compile(r"[^() \t\"'$]+")
+_block_content_re = re.compile(r"[^{} \t\n]+")
+_condition_part_re = re.compile(r"[^#{}|:=\\\n]+")
+_condition_end_re = re.compile(r"[ \t\r\n]*[:{|]")
+_escaped_whitespace = {r"\t": "\t", r"\n": "\n", r"\f": "\f", r"\r": "\r"}
+_escaped_char_re = re.compile(r"\\(.)")
+
+
+class _Parser:
+    """ Parses a single (already fixed up) project file.
+
+    Each _parse* method takes a position, and returns a tuple of the
+    position after the match and the matched value, or None if there was no
+    match. Positions can point one past the end of the contents, which is
+    where pp.LineEnd() leaves the parser when matching the end of the
+    string. """
+
+    def __init__(self, contents: str) -> None:
+        # pyparsing expands tabs before parsing, do the same.
+        self.contents = contents.expandtabs()
+        self.length = len(self.contents)
+
+    def _skip(self, regex, pos: int) -> int:
+        if pos >= self.length:
+            return pos
+        return regex.match(self.contents, pos).end()
+
+    def _skip_ignorables(self, pos: int) -> int:
+        return self._skip(_ignorable_re, pos)
+
+    def _skip_space(self, pos: int) -> int:
+        return self._skip(_space_re, pos)
+
+    def _skip_space_nl(self, pos: int) -> int:
+        return self._skip(_space_nl_re, pos)
+
+    def _is_keyword(self, pos: int, keyword: str) -> bool:
+        contents = self.contents
+        if not contents.startswith(keyword, pos):
+            return False
+        end = pos + len(keyword)
+        if end < self.length and contents[end] in _identifier_chars:
+            return False
+        return pos == 0 or contents[pos - 1] not in _identifier_chars
+
+    def _is_eol(self, pos: int) -> bool:
+        return pos == self.length or self.contents.startswith("\n", pos)
+
+    def _parse_eol(self, pos: int) -> Optional[int]:
+        pos = self._skip_space(pos)
+        if self.contents.startswith("\n", pos):
+            return pos + 1
+        if pos == self.length:
+            return pos + 1
+        return None
+
+    def _parse_optional_eol(self, pos: int) -> int:
+        pos = self._skip_space(pos)
+        if self.contents.startswith("\n", pos) or pos == self.length:
+            return pos + 1
+        return pos
+
+    def _parse_identifier(self, pos: int) -> _Match:
+        if pos >= self.length:
+            return None
+        match = _identifier_re.match(self.contents, pos)
+        if not match:
+            return None
+        return match.end(), match.group()
+
+    def _parse_quoted_string(self, pos: int) -> Optional[int]:
+        # Same as pp.quotedString.
+        contents = self.contents
+        for quote, regex in (('"', _double_quoted_re), ("'", _single_quoted_re)):
+            if contents.startswith(quote, pos):
+                match = regex.match(contents, pos)
+                if match and contents.startswith(quote, match.end()):
+                    return match.end() + 1
+        return None
+
+    def _scan_content(self, regex, pos: int, stop) -> int:
+        """ Returns the end of a run of content characters matched by regex.
+
+        Characters not matched by regex are only accepted if stop() returns
+        False for their position. """
+        contents = self.contents
+        end = pos
+        while end < self.length:
+            match = regex.match(contents, end)
+            if match:
+                end = match.end()
+                if end >= self.length:
+                    break
+            if contents[end] in "() \t" or stop(end):
+                break
+            end += 1
+        return end
+
+    def _parse_nested(self, pos: int, comments: bool = True) -> _Match:
+        """ Same as pp.nestedExpr(), comments are not skipped inside of substitutions. """
+        contents = self.contents
+        if not contents.startswith("(", pos):
+            return None
+        skip_space = self._skip_space if comments else self._skip_no_comment_space
+        skip_space_nl = self._skip_space_nl if comments else self._skip_no_comment_space_nl
+        items: List[Any] = []
+        pos += 1
+        first = True
+        while True:
+            item_pos = pos if first or not comments else self._skip_ignorables(pos)
+            first = False
+
+            start = self._skip_space_nl(item_pos)
+            end = self._parse_quoted_string(start)
+            if end is not None:
+                items.append(contents[start:end])
+                pos = end
+                continue
+
+            start = skip_space(item_pos)
+            nested = self._parse_nested(start, comments)
+            if nested is not None:
+                pos, nested_items = nested
+                items.append(nested_items)
+                continue
+
+            start = skip_space_nl(item_pos)
+            end = self._scan_content(
+                _nested_content_re, start, lambda p: self._parse_quoted_string(p) is not None
+            )
+            if end > start:
+                items.append(contents[start:end].strip())
+                pos = end
+                continue
+            break
+
+        pos = skip_space(pos)
+        if not contents.startswith(")", pos):
+            return None
+        return pos + 1, items
+
+    def _skip_no_comment_space(self, pos: int) -> int:
+        return self._skip(_space_no_comment_re, pos)
+
+    def _skip_no_comment_space_nl(self, pos: int) -> int:
+        return self._skip(_space_nl_no_comment_re, pos)
+
+    def _parse_dollar_parenthesis(self, pos: int) -> Optional[int]:
+        if not self.contents.startswith("$(", pos):
+            return None
+        match = _dollar_parenthesis_re.match(self.contents, pos)
+        return match.end() if match else None
+
+    def _parse_braced_value(self, pos: int) -> _Match:
+        """ Returns the flattened tokens of a BracedValue, including the parentheses. """
+        contents = self.contents
+        if not contents.startswith("(", pos):
+            return None
+        tokens: List[str] = ["("]
+        pos += 1
+        first = True
+        while True:
+            item_pos = pos if first else self._skip_ignorables(pos)
+            first = False
+
+            start = self._skip_space_nl(item_pos)
+            end = self._parse_quoted_string(start)
+            if end is not None:
+                tokens.append(contents[start:end])
+                pos = end
+                continue
+
+            start = self._skip_space(item_pos)
+            end = self._parse_dollar_parenthesis(start)
+            if end is not None:
+                tokens.append(contents[start:end])
+                pos = end
+                continue
+
+            nested = self._parse_braced_value(start)
+            if nested is not None:
+                pos, nested_tokens = nested
+                tokens.extend(nested_tokens)
+                continue
+
+            end = self._scan_content(
+                _braced_content_re,
+                start,
+                lambda p: self._parse_quoted_string(p) is not None
+                or self._parse_dollar_parenthesis(p) is not None,
+            )
+            if end > start:
+                tokens.append(contents[start:end].strip())
+                pos = end
+                continue
+            break
+
+        pos = self._skip_space(pos)
+        if not contents.startswith(")", pos):
+            return None
+        tokens.append(")")
+        return pos + 1, tokens
+
+    def _parse_block_body(self, pos: int) -> Optional[int]:
+        """ Skips over a {} block of a for() loop or a defineTest() definition. """
+        contents = self.contents
+        if not contents.startswith("{", pos):
+            return None
+        pos += 1
+        first = True
+        while True:
+            item_pos = pos if first else self._skip_ignorables(pos)
+            first = False
+
+            start = self._skip_space(item_pos)
+            if self._is_eol(start):
+                pos = start + 1
+                continue
+
+            nested_end = self._parse_block_body(start)
+            if nested_end is not None:
+                pos = nested_end
+                continue
+
+            if start >= self.length:
+                break
+            match = _block_content_re.match(contents, start)
+            if not match:
+                break
+            pos = match.end()
+
+        pos = self._skip_space(pos)
+        if not contents.startswith("}", pos):
+            return None
+        return pos + 1
+
+    def _parse_call_args(self, pos: int) -> _Match:
+        nested = self._parse_nested(self._skip_space(pos))
+        if nested is None:
+            return None
+        end, items = nested
+        return end, _join_call_args(items)
+
+    def _parse_function_value(self, pos: int) -> _Match:
+        contents = self.contents
+        if not contents.startswith("$", pos):
+            return None
+        pos = self._skip_space(pos + 1)
+        if not contents.startswith("$", pos):
+            return None
+        identifier = self._parse_identifier(self._skip_space(pos + 1))
+        if identifier is None:
+            return None
+        pos, function_name = identifier
+        nested = self._parse_nested(self._skip_space(pos))
+        if nested is None:
+            return None
+        pos, function_args = nested
+        try:
+            return pos, handle_function_value([function_name, function_args])
+        except IndexError:
+            return None
+
+    def _parse_substitution(self, pos: int) -> _Match:
+        contents = self.contents
+        if not contents.startswith("$", pos):
+            return None
+        pos += 1
+
+        if contents.startswith("$", pos):
+            identifier = self._parse_identifier(pos + 1)
+            if identifier is not None:
+                end, name = identifier
+                nested = self._parse_nested(end, comments=False)
+                if nested is not None:
+                    return nested[0], f"$${name}{''.join(_flatten(nested[1]))}"
+                return end, f"$${name}"
+
+        if contents.startswith("(", pos):
+            identifier = self._parse_identifier(pos + 1)
+            if identifier is not None and contents.startswith(")", identifier[0]):
+                return identifier[0] + 1, f"$({identifier[1]})"
+
+        if contents.startswith("{", pos):
+            identifier = self._parse_identifier(pos + 1)
+            if identifier is not None and contents.startswith("}", identifier[0]):
+                return identifier[0] + 1, f"${{{identifier[1]}}}"
+
+        if contents.startswith("${", pos):
+            identifier = self._parse_identifier(pos + 2)
+            if identifier is not None:
+                end, name = identifier
+                arguments = ""
+                nested = self._parse_nested(end, comments=False)
+                if nested is not None:
+                    end = nested[0]
+                    arguments = "".join(_flatten(nested[1]))
+                if contents.startswith("}", end):
+                    return end + 1, f"$${{{name}{arguments}}}"
+
+        if contents.startswith("$[", pos):
+            identifier = self._parse_identifier(pos + 2)
+            if identifier is not None and contents.startswith("]", identifier[0]):
+                return identifier[0] + 1, f"$$[{identifier[1]}]"
+
+        return None
+
+    def _parse_substitution_value(self, pos: int) -> _Match:
+        contents = self.contents
+        parts = []
+        while pos < self.length:
+            substitution = self._parse_substitution(pos)
+            if substitution is not None:
+                pos, part = substitution
+                parts.append(part)
+                continue
+            match = _literal_value_part_re.match(contents, pos)
+            if match:
+                pos = match.end()
+                parts.append(match.group())
+                continue
+            if contents[pos] == "$":
+                pos += 1
+                parts.append("$")
+                continue
+            break
+        if not parts:
+            return None
+        return pos, "".join(parts)
+
+    def _parse_quoted_value(self, pos: int) -> _Match:
+        if not self.contents.startswith('"', pos):
+            return None
+        match = _quoted_value_re.match(self.contents, pos)
+        if not match:
+            return None
+        value = match.group()[1:-1]
+        for escaped, replacement in _escaped_whitespace.items():
+            value = value.replace(escaped, replacement)
+        return match.end(), _escaped_char_re.sub(r"\g<1>", value)
+
+    def _parse_values(self, pos: int) -> Tuple[int, List[str]]:
+        contents = self.contents
+        values: List[str] = []
+        while True:
+            start = self._skip_space(pos)
+            if (
+                self._is_keyword(start, "else")
+                or contents.startswith("}", start)
+                or self._is_eol(start)
+            ):
+                break
+
+            value = self._parse_quoted_value(start)
+            if value is None:
+                value = self._parse_function_value(start)
+            if value is None:
+                value = self._parse_substitution_value(start)
+            if value is not None:
+                pos = value[0]
+                values.append(value[1])
+                continue
+
+            braced = self._parse_braced_value(start)
+            if braced is None:
+                break
+            pos = braced[0]
+            values.extend(braced[1])
+        return pos, values
+
+    def _parse_operation(self, pos: int) -> _Match:
+        identifier = self._parse_identifier(pos)
+        if identifier is None:
+            return None
+        pos, key = identifier
+        op_start = self._skip_space(pos)
+        for op in ("=", "-=", "+=", "*=", "~="):
+            if self.contents.startswith(op, op_start):
+                break
+        else:
+            return None
+        op_end = self._skip_ignorables(op_start + len(op))
+        pos, values = self._parse_values(op_end)
+        operation: Dict[str, Any] = {
+            "key": key,
+            "operation": {"locn_start": op_start, "value": op, "locn_end": op_end},
+        }
+        if values:
+            operation["value"] = values
+        return pos, operation
+
+    def _parse_function_call(self, pos: int) -> Optional[int]:
+        identifier = self._parse_identifier(pos)
+        if identifier is None:
+            return None
+        nested = self._parse_nested(self._skip_space(identifier[0]))
+        return nested[0] if nested is not None else None
+
+    def _parse_keyword_statement(self, pos: int) -> _Match:
+        contents = self.contents
+        for keyword, name in (("load", "loaded"), ("option", "option")):
+            if self._is_keyword(pos, keyword):
+                call_args = self._parse_call_args(pos + len(keyword))
+                if call_args is not None:
+                    return call_args[0], _named_statement(keyword, name, call_args[1])
+
+        if self._is_keyword(pos, "include"):
+            start = self._skip_space(pos + 7)
+            call_args = self._parse_call_args(start)
+            if call_args is not None:
+                end = self._skip_ignorables(call_args[0])
+                included: Dict[str, Any] = {"locn_start": start}
+                if call_args[1]:
+                    included["value"] = call_args[1]
+                included["locn_end"] = end
+                return end, {"included": included}
+
+        if self._is_keyword(pos, "requires"):
+            start = self._skip_space(pos + 8)
+            nested = self._parse_nested(start)
+            if nested is not None:
+                end = nested[0]
+                condition = contents[start + 1 : end - 1].strip().replace(":", " && ").strip(" && ")
+                return end, _named_statement("requires", "project_required_condition", condition)
+
+        if self._is_keyword(pos, "for"):
+            call_args = self._parse_call_args(pos + 3)
+            if call_args is not None:
+                block_end = self._parse_block_body(self._skip_space(call_args[0]))
+                if block_end is not None:
+                    return block_end, []
+                colon = self._skip_space(call_args[0])
+                if contents.startswith(":", colon):
+                    line_end = contents.find("\n", self._skip_space(colon + 1))
+                    return (self.length if line_end == -1 else line_end), []
+
+        if self._is_keyword(pos, "defineTest"):
+            call_args = self._parse_call_args(pos + 10)
+            if call_args is not None:
+                block_end = self._parse_block_body(self._skip_space(call_args[0]))
+                if block_end is not None:
+                    return block_end, []
+
+        return None
+
+    def _parse_statement(self, pos: int) -> _Match:
+        pos = self._skip_space(pos)
+        statement = self._parse_keyword_statement(pos)
+        if statement is not None:
+            return statement
+        end = self._parse_function_call(pos)
+        if end is not None:
+            return end, []
+        return self._parse_operation(pos)
+
+    def _parse_statement_line(self, pos: int) -> _Match:
+        statement = self._parse_statement(pos)
+        if statement is None:
+            return None
+        pos, result = statement
+        end = self._parse_eol(pos)
+        if end is not None:
+            return end, result
+        end = self._skip_space(pos)
+        if self.contents.startswith("}", end):
+            return end, result
+        return None
+
+    def _parse_statement_group(self, pos: int) -> Tuple[int, List[Any], bool]:
+        statements: List[Any] = []
+        matched = False
+        first = True
+        while True:
+            item_pos = pos if first else self._skip_ignorables(pos)
+            first = False
+
+            statement_line = self._parse_statement_line(item_pos)
+            if statement_line is not None:
+                pos = statement_line[0]
+                statements.append(statement_line[1])
+                matched = True
+                continue
+            scope = self._parse_scope(item_pos)
+            if scope is not None:
+                pos = scope[0]
+                statements.append(scope[1])
+                matched = True
+                continue
+            end = self._parse_eol(item_pos)
+            if end is not None:
+                pos = end
+                matched = True
+                continue
+            return pos, statements, matched
+
+    def _parse_block(self, pos: int) -> _Match:
+        pos = self._skip_space(pos)
+        if not self.contents.startswith("{", pos):
+            return None
+        pos = self._parse_optional_eol(pos + 1)
+        pos, statements, _ = self._parse_statement_group(pos)
+        pos = self._skip_space(self._parse_optional_eol(pos))
+        if not self.contents.startswith("}", pos):
+            return None
+        return self._parse_optional_eol(pos + 1), statements
+
+    def _parse_condition_part(self, pos: int) -> _Match:
+        contents = self.contents
+        if pos >= self.length:
+            return None
+
+        part1 = None
+        identifier_pos = pos + 1 if contents[pos] == "!" else pos
+        identifier = self._parse_identifier(identifier_pos)
+        if identifier is not None:
+            end, name = identifier
+            text = contents[pos:identifier_pos] + name
+            braced = self._parse_braced_value(end)
+            if braced is not None:
+                end = braced[0]
+                text += "".join(braced[1])
+            part1 = (end, text)
+
+        part2 = None
+        match = _condition_part_re.match(contents, pos)
+        if match:
+            part2 = (match.end(), match.group())
+
+        # Like pp.Or, the longest match wins.
+        if part1 is not None and (part2 is None or part1[0] >= part2[0]):
+            result = part1
+        elif part2 is not None:
+            result = part2
+        else:
+            return None
+
+        if result[0] > self.length or not _condition_end_re.match(contents, result[0]):
+            return None
+        return result
+
+    def _parse_condition(self, pos: int) -> _Match:
+        contents = self.contents
+        part = self._parse_condition_part(pos)
+        if part is None:
+            return None
+        pos, text = part
+        parts = [text]
+        while contents.startswith(("|", ":"), pos):
+            start = pos + 1
+            while contents.startswith(" ", start):
+                start += 1
+            part = self._parse_condition_part(start)
+            if part is None:
+                break
+            parts.append(contents[pos])
+            pos, text = part
+            parts.append(text)
+        condition = "".join(parts).strip().replace(":", " && ").strip(" && ")
+        return pos, condition
+
+    def _parse_else_branch(self, pos: int) -> _Match:
+        if not self._is_keyword(pos, "else"):
+            return None
+        pos += 4
+
+        colon = self._skip_space(pos)
+        if self.contents.startswith(":", colon):
+            scope = self._parse_scope(colon + 1)
+            if scope is not None:
+                return scope[0], [scope[1]]
+            block = self._parse_block(colon + 1)
+            if block is not None:
+                return block
+            statement = self._parse_statement(colon + 1)
+            if statement is not None:
+                return self._parse_optional_eol(statement[0]), [statement[1]]
+
+        return self._parse_block(pos)
+
+    def _parse_scope(self, pos: int) -> _Match:
+        contents = self.contents
+        pos = self._skip_space(pos)
+        condition = self._parse_condition(pos)
+        if condition is None:
+            return None
+        pos, condition_text = condition
+
+        statements = None
+        start = self._skip_space(pos)
+        if contents.startswith(":", start):
+            block = self._parse_block(start + 1)
+            if block is not None:
+                pos, statements = block
+            else:
+                statement = self._parse_statement(start + 1)
+                if statement is not None:
+                    end = self._parse_eol(statement[0])
+                    if end is not None:
+                        pos, statements = end, [statement[1]]
+
+        if statements is None:
+            block = self._parse_block(start)
+            if block is not None:
+                pos, statements = block
+
+        if statements is None and contents.startswith(("|", ":"), start):
+            end = self._parse_function_call(self._skip_space(start + 1))
+            if end is not None:
+                pos, statements = self._skip_space(end), []
+
+        if statements is None:
+            return None
+
+        scope: Dict[str, Any] = {}
+        if condition_text:
+            scope["condition"] = condition_text
+        scope["statements"] = statements
+        pos = self._skip_space(pos)
+        else_branch = self._parse_else_branch(pos)
+        if else_branch is not None:
+            pos, scope["else_statements"] = else_branch
+        return pos, scope
+
+    def parse(self) -> Dict[str, Any]:
+        pos, statements, matched = self._parse_statement_group(0)
+        end = self._skip_space(pos)
+        if end < self.length:
+            raise pp.ParseException(self.contents, end, "Expected end of text")
+        return {"statements": statements} if matched else {}
+
+
+def _flatten(items: List[Any]):
+    for item in items:
+        if isinstance(item, list):
+            yield from _flatten(item)
+        else:
+            yield item
+
+
+def _named_statement(keyword: str, name: str, value: str) -> Any:
+    # pyparsing does not assign empty strings to result names, the unnamed
+    # tokens end up in a list instead.
+    if not value:
+        return [keyword, value]
+    return {name: value}
+
+
+def _join_call_args(items: List[Any]) -> str:
+    # Same as parse_call_args() in the pyparsing grammar. The parse action is
+    # also applied to the nested parentheses, so they are dropped.
+    return "".join(_flatten(items))
+
+
+class QmakeFastParser:
+    """ Parser backend with the same interface as QmakeParser. """
+
+    def parseFile(self, file: str) -> Tuple[DictParseResults, str]:
+        print(f'Parsing "{file}"...')
+        contents = readProFile(file)
+        return self.parseContents(contents), contents
+
+    def parseContents(self, contents: str) -> DictParseResults:
+        try:
+            result = _Parser(contents).parse()
+        except pp.ParseException as pe:
+            print(pe.line)
+            print(f"{' ' * (pe.col-1)}^")
+            print(pe)
+            raise pe
+        return DictParseResults(result)
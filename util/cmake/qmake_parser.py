@@ -30,11 +30,13 @@
 import collections
 import os
 import re
+from functools import lru_cache
 from itertools import chain
-from typing import Tuple
+from typing import Any, Dict, List, Tuple, Union
 
 import pyparsing as pp  # type: ignore
 
+import qmake_parser_cache
 from helper import _set_up_py_parsing_nicer_debug_output
 
 _set_up_py_parsing_nicer_debug_output(pp)
@@ -80,7 +82,7 @@ def flatten_list(l):
             yield el
 
 
-def handle_function_value(group: pp.ParseResults):
+def handle_function_value(group: Union[pp.ParseResults, List[Any]]):
     function_name = group[0]
     function_args = group[1]
     if function_name == "qtLibraryTarget":
@@ -107,7 +109,8 @@ def handle_function_value(group: pp.ParseResults):
         return os.path.basename(str(function_args[0]))
 
     if isinstance(function_args, pp.ParseResults):
-        function_args = list(flatten_list(function_args.asList()))
+        function_args = function_args.asList()
+    function_args = list(flatten_list(function_args))
 
     # For other functions, return the whole expression as a string.
     return f"$${function_name}({' '.join(function_args)})"
@@ -367,22 +370,81 @@ class QmakeParser:
 
     def parseFile(self, file: str) -> Tuple[pp.ParseResults, str]:
         print(f'Parsing "{file}"...')
-        try:
-            with open(file, "r") as file_fd:
-                contents = file_fd.read()
+        contents = readProFile(file)
+        return self.parseContents(contents), contents
 
-            # old_contents = contents
-            contents = fixup_comments(contents)
-            contents = fixup_linecontinuation(contents)
+    def parseContents(self, contents: str) -> pp.ParseResults:
+        try:
             result = self._Grammar.parseString(contents, parseAll=True)
         except pp.ParseException as pe:
             print(pe.line)
             print(f"{' ' * (pe.col-1)}^")
             print(pe)
             raise pe
-        return result, contents
+        return result
+
+
+class DictParseResults:
+    """ Parse result backed by a plain statement dictionary.
+
+    Used for results restored from the parse tree cache and for results of
+    the fast parser backend. Provides the part of the pp.ParseResults
+    interface used by pro2cmake. """
+
+    def __init__(self, result_dict: Dict[str, Any]) -> None:
+        self._result_dict = result_dict
+
+    def asDict(self) -> Dict[str, Any]:
+        return self._result_dict
+
+    def __str__(self) -> str:
+        return str(self._result_dict)
+
+
+def readProFile(file: str) -> str:
+    with open(file, "r") as file_fd:
+        contents = file_fd.read()
+
+    contents = fixup_comments(contents)
+    contents = fixup_linecontinuation(contents)
+    return contents
+
+
+parser_backends = ["pyparsing", "fast"]
+parser_backend = "pyparsing"
+
+
+def set_parser_backend(value: str):
+    global parser_backend
+    if value not in parser_backends:
+        raise ValueError(f"Unknown qmake parser backend: {value}")
+    parser_backend = value
+
+
+@lru_cache(maxsize=None)
+def _get_parser(debug: bool, backend: str) -> Any:
+    # Building the grammar is expensive, so do it only once per process.
+    if backend == "fast":
+        # Imported here, because the fast parser reuses parts of this module.
+        from qmake_fast_parser import QmakeFastParser
+
+        return QmakeFastParser()
+    return QmakeParser(debug=debug)
+
 
+def parseProFile(file: str, *, debug=False) -> Tuple[Union[pp.ParseResults, DictParseResults], str]:
+    # The debug output of the grammar is only available with pyparsing.
+    backend = "pyparsing" if debug else parser_backend
+    parser = _get_parser(debug, backend)
+    if debug or not qmake_parser_cache.parse_tree_cache_enabled:
+        return parser.parseFile(file)
 
-def parseProFile(file: str, *, debug=False) -> Tuple[pp.ParseResults, str]:
-    parser = QmakeParser(debug=debug)
-    return parser.parseFile(file)
+    print(f'Parsing "{file}"...')
+    contents = readProFile(file)
+    # $$basename(_PRO_FILE_PWD_) is evaluated while parsing, which makes the
+    # parse tree depend on the current directory as well.
+    context = os.path.basename(os.getcwd()) if "_PRO_FILE_PWD_" in contents else ""
+    result_dict = qmake_parser_cache.get_parse_tree(
+        contents, lambda c: parser.parseContents(c).asDict(), context=f"{backend}:{context}"
+    )
+    return DictParseResults(result_dict), contents
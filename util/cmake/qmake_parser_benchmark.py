@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+#############################################################################
+##
+## Copyright (C) 2018 The Qt Company Ltd.
+## Contact: https://www.qt.io/licensing/
+##
+## This file is part of the plugins of the Qt Toolkit.
+##
+## $QT_BEGIN_LICENSE:GPL-EXCEPT$
+## Commercial License Usage
+## Licensees holding valid commercial Qt licenses may use this file in
+## accordance with the commercial license agreement provided with the
+## Software or, alternatively, in accordance with the terms contained in
+## a written agreement between you and The Qt Company. For licensing terms
+## and conditions see https://www.qt.io/terms-conditions. For further
+## information use the contact form at https://www.qt.io/contact-us.
+##
+## GNU General Public License Usage
+## Alternatively, this file may be used under the terms of the GNU
+## General Public License version 3 as published by the Free Software
+## Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+## included in the packaging of this file. Please review the following
+## information to ensure the GNU General Public License requirements will
+## be met: https://www.gnu.org/licenses/gpl-3.0.html.
+##
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+"""
+This utility script compares the speed of the qmake parser backends, and
+checks that they produce the same parse trees.
+
+To execute: python3 qmake_parser_benchmark.py <path> [<path> ...]
+where <path> is a .pro / .pri file or a directory which is searched
+recursively for such files.
+
+"""
+
+import contextlib
+import io
+import os
+import sys
+from argparse import ArgumentParser
+from timeit import default_timer
+from typing import Any, Dict, List
+
+from qmake_fast_parser import QmakeFastParser
+from qmake_parser import QmakeParser, readProFile
+
+
+def _parse_commandline():
+    parser = ArgumentParser(description="Benchmark the qmake parser backends.")
+    parser.add_argument(
+        "--repeat", dest="repeat", type=int, default=1, help="How often to parse every file."
+    )
+    parser.add_argument(
+        "paths", metavar="<path>", type=str, nargs="+", help="Project files or directories."
+    )
+    return parser.parse_args()
+
+
+def find_project_files(paths: List[str]) -> List[str]:
+    files = []
+    for path in paths:
+        if os.path.isfile(path):
+            files.append(path)
+            continue
+        for root, _, file_names in os.walk(path):
+            for file_name in file_names:
+                if file_name.endswith((".pro", ".pri")):
+                    files.append(os.path.join(root, file_name))
+    return sorted(files)
+
+
+def main() -> int:
+    args = _parse_commandline()
+    files = find_project_files(args.paths)
+    parsers: Dict[str, Any] = {"pyparsing": QmakeParser(), "fast": QmakeFastParser()}
+    timings: Dict[str, float] = {name: 0.0 for name in parsers}
+    mismatches = []
+
+    for file in files:
+        contents = readProFile(file)
+        results = {}
+        for name, parser in parsers.items():
+            start = default_timer()
+            for _ in range(args.repeat):
+                # Parse errors are printed by the parsers, silence them.
+                with contextlib.redirect_stdout(io.StringIO()):
+                    try:
+                        results[name] = parser.parseContents(contents).asDict()
+                    except Exception as e:
+                        results[name] = repr(e)
+            timings[name] += default_timer() - start
+        if results["pyparsing"] != results["fast"]:
+            mismatches.append(file)
+
+    print(f"Parsed {len(files)} files {args.repeat} time(s).")
+    for name, timing in timings.items():
+        print(f"{name:>10}: {timing:.3f}s")
+    if timings["fast"] > 0:
+        print(f"   speedup: {timings['pyparsing'] / timings['fast']:.1f}x")
+
+    for file in mismatches:
+        print(f"Different parse results for {file}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
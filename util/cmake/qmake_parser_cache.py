@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+#############################################################################
+##
+## Copyright (C) 2018 The Qt Company Ltd.
+## Contact: https://www.qt.io/licensing/
+##
+## This file is part of the plugins of the Qt Toolkit.
+##
+## $QT_BEGIN_LICENSE:GPL-EXCEPT$
+## Commercial License Usage
+## Licensees holding valid commercial Qt licenses may use this file in
+## accordance with the commercial license agreement provided with the
+## Software or, alternatively, in accordance with the terms contained in
+## a written agreement between you and The Qt Company. For licensing terms
+## and conditions see https://www.qt.io/terms-conditions. For further
+## information use the contact form at https://www.qt.io/contact-us.
+##
+## GNU General Public License Usage
+## Alternatively, this file may be used under the terms of the GNU
+## General Public License version 3 as published by the Free Software
+## Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+## included in the packaging of this file. Please review the following
+## information to ensure the GNU General Public License requirements will
+## be met: https://www.gnu.org/licenses/gpl-3.0.html.
+##
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+
+import collections
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+from functools import lru_cache
+from typing import Any, Callable, Dict
+
+import pyparsing as pp  # type: ignore
+
+# Bump when the layout of the cached parse trees changes.
+parse_tree_cache_schema_version = "1"
+
+# Number of serialized parse trees kept in memory per process.
+parse_tree_memory_cache_size = 512
+
+parse_tree_cache_enabled = True
+
+
+def set_parse_tree_cache_enabled(value: bool):
+    global parse_tree_cache_enabled
+    parse_tree_cache_enabled = value
+
+
+def get_current_file_path() -> str:
+    try:
+        this_file = __file__
+    except NameError:
+        this_file = sys.argv[0]
+    this_file = os.path.abspath(this_file)
+    return this_file
+
+
+def get_cache_root() -> str:
+    dir_path = os.path.dirname(get_current_file_path())
+    return os.path.join(dir_path, ".pro2cmake_cache", "parse_trees")
+
+
+@lru_cache(maxsize=None)
+def get_grammar_version() -> str:
+    """ Identifies the grammar that produced a cached parse tree.
+
+    Any change to the qmake parsers, the pyparsing version or the cache
+    schema invalidates all existing entries. """
+    hasher = hashlib.md5()
+    for parser_file_name in ("qmake_parser.py", "qmake_fast_parser.py"):
+        parser_path = os.path.join(os.path.dirname(get_current_file_path()), parser_file_name)
+        with open(parser_path, "rb") as parser_file:
+            hasher.update(parser_file.read())
+    hasher.update(pp.__version__.encode("utf-8"))
+    hasher.update(parse_tree_cache_schema_version.encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def get_cache_dir() -> str:
+    return os.path.join(get_cache_root(), get_grammar_version())
+
+
+def get_content_checksum(contents: str, context: str = "") -> str:
+    hasher = hashlib.md5(contents.encode("utf-8"))
+    if context:
+        hasher.update(b"\0")
+        hasher.update(context.encode("utf-8"))
+    return hasher.hexdigest()
+
+
+_memory_cache: "collections.OrderedDict[str, str]" = collections.OrderedDict()
+_stale_cache_dirs_removed = False
+
+
+def _remember(checksum: str, serialized_tree: str) -> None:
+    _memory_cache[checksum] = serialized_tree
+    _memory_cache.move_to_end(checksum)
+    while len(_memory_cache) > parse_tree_memory_cache_size:
+        _memory_cache.popitem(last=False)
+
+
+def _remove_stale_cache_dirs() -> None:
+    # Entries written by other grammar versions can never be hit again.
+    global _stale_cache_dirs_removed
+    if _stale_cache_dirs_removed:
+        return
+    _stale_cache_dirs_removed = True
+
+    cache_root = get_cache_root()
+    current_version = get_grammar_version()
+    for entry in os.listdir(cache_root):
+        if entry != current_version:
+            shutil.rmtree(os.path.join(cache_root, entry), ignore_errors=True)
+
+
+def _read_cache_file(checksum: str) -> str:
+    cache_file_path = os.path.join(get_cache_dir(), f"{checksum}.json")
+    try:
+        with open(cache_file_path, "r") as cache_file:
+            serialized_tree = cache_file.read()
+        # Make sure the file was not truncated or otherwise corrupted.
+        json.loads(serialized_tree)
+    except (IOError, ValueError):
+        return ""
+    return serialized_tree
+
+
+def _write_cache_file(checksum: str, serialized_tree: str) -> None:
+    cache_dir = get_cache_dir()
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        _remove_stale_cache_dirs()
+
+        # Write to a temporary file first and rename it, so that concurrent
+        # conversions never see a partially written entry.
+        fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as temp_file:
+            temp_file.write(serialized_tree)
+        os.replace(temp_path, os.path.join(cache_dir, f"{checksum}.json"))
+    except OSError as e:
+        print(f"Could not write parse tree cache entry: {e}")
+
+
+def get_parse_tree(
+    contents: str, parse: Callable[[str], Dict[str, Any]], context: str = ""
+) -> Dict[str, Any]:
+    """ Returns the parse tree dictionary of the given file contents.
+
+    Looks up the in-memory cache first, then the on-disk cache, and only
+    calls parse() if neither has an entry for the contents. The context
+    is any other input the parse tree depends on. Each call returns a
+    fresh copy which the caller is free to modify. """
+    if not parse_tree_cache_enabled:
+        return parse(contents)
+
+    checksum = get_content_checksum(contents, context)
+    serialized_tree = _memory_cache.get(checksum)
+    if serialized_tree is None:
+        serialized_tree = _read_cache_file(checksum)
+        if not serialized_tree:
+            serialized_tree = json.dumps(parse(contents))
+            _write_cache_file(checksum, serialized_tree)
+    _remember(checksum, serialized_tree)
+    return json.loads(serialized_tree)
@@ -27,14 +27,26 @@
 ##
 #############################################################################
 
+import collections
 import glob
+import hashlib
+import io
+import json
 import os
 import subprocess
+import tempfile
 import concurrent.futures
+import contextlib
+import functools
 import sys
+import traceback
 import typing
 import argparse
 from argparse import ArgumentParser
+from datetime import timedelta
+from timeit import default_timer
+
+from generated_file_writer import format_generated_file_counters, parse_generated_file_counters
 
 
 def parse_command_line() -> argparse.Namespace:
@@ -73,6 +85,43 @@ def parse_command_line() -> argparse.Namespace:
         action="store_true",
         help="Run pro2cmake with --is-example flag.",
     )
+    parser.add_argument(
+        "--in-process",
+        dest="in_process",
+        action="store_true",
+        help="Convert projects in a pool of worker processes that import pro2cmake once, "
+        "instead of starting a new pro2cmake.py process for each project.",
+    )
+    parser.add_argument(
+        "--incremental",
+        dest="incremental",
+        action="store_true",
+        help="Only convert projects for which the project file, the files it includes, "
+        "its resource files, its .qmake.conf or its CMakeLists.txt changed since their last "
+        "successful conversion. The state is kept in a manifest file.",
+    )
+    parser.add_argument(
+        "--manifest-file",
+        dest="manifest_file",
+        type=str,
+        help="Manifest file used by --incremental. "
+        "Defaults to .pro2cmake_manifest.json in the given path.",
+    )
+    parser.add_argument(
+        "--batch-git-add",
+        dest="batch_git_add",
+        action="store_true",
+        help="Let the conversions only record which .prev_CMakeLists.txt files they updated, "
+        "and git add all of them at once at the end, instead of each conversion running "
+        "git add itself.",
+    )
+    parser.add_argument(
+        "--result-log",
+        dest="result_log",
+        type=str,
+        help="Append a JSON line with the return code, wall time and output size of every "
+        "converted project to the given file, as soon as the project is done.",
+    )
     parser.add_argument(
         "--count", dest="count", help="How many projects should be converted.", type=int
     )
@@ -168,51 +217,335 @@ def find_all_pro_files(base_path: str, args: argparse.Namespace):
     return all_files
 
 
+def get_pro2cmake_args(
+    filename: str,
+    args: argparse.Namespace,
+    dependency_file: typing.Optional[str] = None,
+    prev_files_list: typing.Optional[str] = None,
+) -> typing.List[str]:
+    pro2cmake_args = []
+    if args.is_example:
+        pro2cmake_args.append("--is-example")
+    if args.skip_subdirs_projects:
+        pro2cmake_args.append("--skip-subdirs-project")
+    if dependency_file:
+        pro2cmake_args += ["--dependency-file", dependency_file]
+    if prev_files_list:
+        pro2cmake_args += ["--record-prev-files", prev_files_list]
+    pro2cmake_args.append(filename)
+
+    if args.pro2cmake_args:
+        pro2cmake_args += args.pro2cmake_args
+    return pro2cmake_args
+
+
+def get_dependency_file(args: argparse.Namespace, index: int) -> typing.Optional[str]:
+    """ Returns the file to which pro2cmake writes the dependencies of the
+    project with the given index, when running incrementally. """
+    if not args.dependency_dir:
+        return None
+    return os.path.join(args.dependency_dir, f"{index}.json")
+
+
+def get_conversion_times_path(script_path: str) -> str:
+    return os.path.join(script_path, ".pro2cmake_cache", "conversion_times.json")
+
+
+def load_conversion_times(path: str) -> typing.Dict[str, float]:
+    """ Returns the conversion time in seconds of the projects converted by
+    previous runs, by absolute project file path. """
+    try:
+        with open(path, "r") as times_file:
+            return json.load(times_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_conversion_times(path: str, conversion_times: typing.Dict[str, float]) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as temp_file:
+            json.dump(conversion_times, temp_file, indent=1, sort_keys=True)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def schedule_longest_first(
+    all_files: typing.List[str], conversion_times: typing.Dict[str, float]
+) -> typing.List[str]:
+    """ Orders the projects by their conversion time in previous runs, longest first,
+    so that no long conversion is left running alone at the end of a run.
+
+    Projects without a recorded time come first, their cost is unknown. """
+    if not conversion_times:
+        return list(all_files)
+    unknown_time = max(conversion_times.values()) + 1
+    return sorted(
+        all_files,
+        key=lambda f: conversion_times.get(os.path.abspath(f), unknown_time),
+        reverse=True,
+    )
+
+
+def format_progress(done: int, total: int, elapsed: float) -> str:
+    """ Returns a progress line with the throughput and the estimated remaining time. """
+    throughput = done / elapsed if elapsed > 0 else 0.0
+    if throughput > 0:
+        eta = str(timedelta(seconds=round((total - done) / throughput)))
+    else:
+        eta = "unknown"
+    return f"Progress: {done}/{total} projects, {throughput:.2f} projects/s, ETA {eta}"
+
+
+def convert_in_process(
+    data: typing.Tuple[str, int], args: argparse.Namespace
+) -> typing.Tuple[int, str, str, float, typing.Counter[str]]:
+    # Imported here, so that only the pool workers pay for loading
+    # pro2cmake and its dependencies.
+    import pro2cmake
+    from generated_file_writer import generated_file_counters
+
+    filename, index = data
+    start = default_timer()
+    # The workers convert many projects, only report the files of this one.
+    previous_counters = generated_file_counters.copy()
+    output = io.StringIO()
+    return_code = 0
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        try:
+            pro2cmake_args = pro2cmake._parse_commandline(
+                get_pro2cmake_args(
+                    filename, args, get_dependency_file(args, index), args.prev_files_list
+                )
+            )
+            pro2cmake.convert_projects(pro2cmake_args.files, pro2cmake_args)
+        except SystemExit as e:
+            return_code = e.code if isinstance(e.code, int) else 1
+        except Exception:
+            traceback.print_exc()
+            return_code = 1
+    return (
+        return_code,
+        filename,
+        output.getvalue(),
+        default_timer() - start,
+        generated_file_counters - previous_counters,
+    )
+
+
 def run(all_files: typing.List[str], pro2cmake: str, args: argparse.Namespace) -> typing.List[str]:
     failed_files = []
     files_count = len(all_files)
     workers = os.cpu_count() or 1
 
-    if args.only_qtbase_main_modules:
-        # qtbase main modules take longer than usual to process.
-        workers = 2
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=workers, initargs=(10,)) as pool:
-        print("Firing up thread pool executor.")
+    conversion_times_path = get_conversion_times_path(os.path.dirname(pro2cmake))
+    conversion_times = load_conversion_times(conversion_times_path)
+    # The indices keep referring to the path-sorted list of projects.
+    indices = {f: index for index, f in enumerate(all_files, 1)}
+    scheduled_files = schedule_longest_first(all_files, conversion_times)
+
+    def _process_a_file(
+        data: typing.Tuple[str, int],
+    ) -> typing.Tuple[int, str, str, float, typing.Counter[str]]:
+        filename, index = data
+        start = default_timer()
+        pro2cmake_args = []
+        if sys.platform == "win32":
+            pro2cmake_args.append(sys.executable)
+        pro2cmake_args.append(pro2cmake)
+        pro2cmake_args += get_pro2cmake_args(
+            os.path.basename(filename),
+            args,
+            get_dependency_file(args, index),
+            args.prev_files_list,
+        )
 
-        def _process_a_file(data: typing.Tuple[str, int, int]) -> typing.Tuple[int, str, str]:
-            filename, index, total = data
-            pro2cmake_args = []
-            if sys.platform == "win32":
-                pro2cmake_args.append(sys.executable)
-            pro2cmake_args.append(pro2cmake)
-            if args.is_example:
-                pro2cmake_args.append("--is-example")
-            if args.skip_subdirs_projects:
-                pro2cmake_args.append("--skip-subdirs-project")
-            pro2cmake_args.append(os.path.basename(filename))
-
-            if args.pro2cmake_args:
-                pro2cmake_args += args.pro2cmake_args
-
-            result = subprocess.run(
-                pro2cmake_args,
-                cwd=os.path.dirname(filename),
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-            )
-            stdout = f"Converted[{index}/{total}]: {filename}\n"
-            return result.returncode, filename, stdout + result.stdout.decode()
+        result = subprocess.run(
+            pro2cmake_args,
+            cwd=os.path.dirname(filename),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+        output = result.stdout.decode()
+        return (
+            result.returncode,
+            filename,
+            output,
+            default_timer() - start,
+            parse_generated_file_counters(output),
+        )
 
-        for return_code, filename, stdout in pool.map(
-            _process_a_file,
-            zip(all_files, range(1, files_count + 1), (files_count for _ in all_files)),
-        ):
+    pool: concurrent.futures.Executor
+    process_a_file: typing.Callable[
+        [typing.Tuple[str, int]], typing.Tuple[int, str, str, float, typing.Counter[str]]
+    ]
+    if args.in_process:
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+        print("Firing up process pool executor.")
+        process_a_file = functools.partial(convert_in_process, args=args)
+    else:
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers, initargs=(10,))
+        print("Firing up thread pool executor.")
+        process_a_file = _process_a_file
+
+    # On a terminal the progress line is rewritten in place, below the output
+    # of the finished projects.
+    live_progress = sys.stdout.isatty()
+    generated_file_counters: typing.Counter[str] = collections.Counter()
+    start = default_timer()
+    with pool, contextlib.ExitStack() as stack:
+        result_log = stack.enter_context(open(args.result_log, "a")) if args.result_log else None
+        futures = [pool.submit(process_a_file, (f, indices[f])) for f in scheduled_files]
+        for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            return_code, filename, output, conversion_time, counters = future.result()
+            conversion_times[os.path.abspath(filename)] = conversion_time
+            generated_file_counters.update(counters)
             if return_code:
                 failed_files.append(filename)
-            print(stdout)
 
-    return failed_files
+            if live_progress:
+                sys.stdout.write("\r\033[K")
+            print(f"Converted[{indices[filename]}/{files_count}]: {filename}\n{output}")
+            progress = format_progress(done, files_count, default_timer() - start)
+            if live_progress:
+                sys.stdout.write(progress if done < files_count else f"{progress}\n")
+            else:
+                print(progress)
+            sys.stdout.flush()
+
+            if result_log:
+                record = {
+                    "file": filename,
+                    "return_code": return_code,
+                    "wall_time": round(conversion_time, 3),
+                    "output_size": len(output.encode("utf-8")),
+                }
+                result_log.write(json.dumps(record) + "\n")
+                result_log.flush()
+
+    print(format_generated_file_counters(generated_file_counters))
+    if all_files:
+        save_conversion_times(conversion_times_path, conversion_times)
+    # Report the failures in the order of the projects.
+    return sorted(failed_files, key=lambda f: indices[f])
+
+
+def stage_prev_files(prev_files_list: str, base_path: str) -> None:
+    """ git adds the .prev_CMakeLists.txt files recorded by the conversions. """
+    if not os.path.isfile(prev_files_list):
+        return
+    print("Staging the updated .prev_CMakeLists.txt files.")
+    result = subprocess.run(
+        ["git", "add", f"--pathspec-from-file={prev_files_list}"],
+        cwd=base_path,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+    )
+    if result.returncode:
+        print(
+            f"git add failed:\n{result.stdout.decode()}Make sure to git add these files yourself:"
+        )
+        with open(prev_files_list, "r") as f:
+            for prev_file in f:
+                print(f"    {prev_file.rstrip()}")
+
+
+class ConversionManifest:
+    """ Remembers the files each successfully converted project depended on,
+    together with hashes of their contents. """
+
+    version = 1
+
+    def __init__(self, path: str, script_path: str, args: argparse.Namespace) -> None:
+        self.path = path
+        self.projects: typing.Dict[str, typing.Any] = {}
+        self._file_hashes: typing.Dict[str, typing.Optional[str]] = {}
+        # A change of the conversion scripts or of the options passed to them
+        # invalidates all projects.
+        self.converter_hash = hashlib.sha1(
+            "".join(
+                f"{self.file_hash(f)}\n"
+                for f in sorted(glob.glob(os.path.join(script_path, "*.py")))
+            ).encode("utf-8")
+        ).hexdigest()
+        self.converter_args = get_pro2cmake_args("", args)
+
+        try:
+            with open(path, "r") as manifest_file:
+                data = json.load(manifest_file)
+        except (OSError, ValueError):
+            return
+        if (
+            data.get("version") == self.version
+            and data.get("converter_hash") == self.converter_hash
+            and data.get("converter_args") == self.converter_args
+        ):
+            self.projects = data.get("projects", {})
+
+    def file_hash(self, path: str) -> typing.Optional[str]:
+        """ Returns the hash of the contents of a file, or None if it is missing. """
+        if path not in self._file_hashes:
+            try:
+                with open(path, "rb") as f:
+                    self._file_hashes[path] = hashlib.sha1(f.read()).hexdigest()
+            except OSError:
+                self._file_hashes[path] = None
+        return self._file_hashes[path]
+
+    @staticmethod
+    def cmake_lists_path(pro_file: str) -> str:
+        return os.path.join(os.path.dirname(os.path.abspath(pro_file)), "CMakeLists.txt")
+
+    def is_up_to_date(self, pro_file: str) -> bool:
+        entry = self.projects.get(os.path.abspath(pro_file))
+        if not entry:
+            return False
+        for path, digest in entry["dependencies"].items():
+            if self.file_hash(path) != digest:
+                return False
+        return self.file_hash(self.cmake_lists_path(pro_file)) == entry["cmake_lists"]
+
+    def update(self, pro_file: str, dependency_file: typing.Optional[str]) -> None:
+        """ Records a successful conversion, using the dependencies written by
+        pro2cmake. Without them, the project is converted again next time. """
+        key = os.path.abspath(pro_file)
+        try:
+            with open(dependency_file or "", "r") as f:
+                dependencies = json.load(f)
+        except (OSError, ValueError):
+            self.projects.pop(key, None)
+            return
+
+        # The files have just been read or written by the conversion.
+        for path in [*dependencies, self.cmake_lists_path(pro_file)]:
+            self._file_hashes.pop(path, None)
+        self.projects[key] = {
+            "dependencies": {path: self.file_hash(path) for path in dependencies},
+            "cmake_lists": self.file_hash(self.cmake_lists_path(pro_file)),
+        }
+
+    def remove(self, pro_file: str) -> None:
+        self.projects.pop(os.path.abspath(pro_file), None)
+
+    def save(self) -> None:
+        data = {
+            "version": self.version,
+            "converter_hash": self.converter_hash,
+            "converter_args": self.converter_args,
+            "projects": self.projects,
+        }
+        manifest_dir = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(dir=manifest_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as temp_file:
+                json.dump(data, temp_file, indent=1, sort_keys=True)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
 
 
 def main() -> None:
@@ -227,9 +560,37 @@ def main() -> None:
         all_files = all_files[args.offset :]
     if args.count:
         all_files = all_files[: args.count]
+
+    manifest: typing.Optional[ConversionManifest] = None
+    if args.incremental:
+        manifest_path = args.manifest_file or os.path.join(base_path, ".pro2cmake_manifest.json")
+        manifest = ConversionManifest(manifest_path, script_path, args)
+        found_files_count = len(all_files)
+        all_files = [f for f in all_files if not manifest.is_up_to_date(f)]
+        if found_files_count and not all_files:
+            print(f"All {found_files_count} projects are up to date.")
+            return
+        print(
+            f"{found_files_count - len(all_files)} of {found_files_count} projects are up to date."
+        )
     files_count = len(all_files)
 
-    failed_files = run(all_files, pro2cmake, args)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        args.dependency_dir = temp_dir if manifest else None
+        args.prev_files_list = (
+            os.path.join(temp_dir, "prev_files.txt") if args.batch_git_add else None
+        )
+        failed_files = run(all_files, pro2cmake, args)
+        if args.prev_files_list:
+            stage_prev_files(args.prev_files_list, base_path)
+        if manifest:
+            failed_files_set = set(failed_files)
+            for index, filename in enumerate(all_files, 1):
+                if filename in failed_files_set:
+                    manifest.remove(filename)
+                else:
+                    manifest.update(filename, get_dependency_file(args, index))
+            manifest.save()
     if len(all_files) == 0:
         print("No files found.")
 
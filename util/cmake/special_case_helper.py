@@ -39,7 +39,9 @@ It has two modes of operation:
    generated file which has no "special case" modifications.
 
 Both modes use a temporary git repository to compute and reapply
-"special case" diffs.
+"special case" diffs. Alternatively, the diffs can be reapplied with an
+in-memory three-way merge, which does not need git, but only
+approximates the git merge. It is also used when git is not in PATH.
 
 For the first mode to work, the developer has to mark changes
 with "# special case" markers on every line they want to keep. Or
@@ -86,6 +88,7 @@ with the "modified" file.
 import re
 import os
 import subprocess
+import difflib
 import filecmp
 import time
 import typing
@@ -124,14 +127,276 @@ def write_content_to_file(file_path: str, content: str) -> None:
         file_fd.write(content)
 
 
+def resolve_simple_conflicts(content: str) -> str:
+    # If the conflict represents the addition of a new content hunk,
+    # keep the content and remove the conflict markers. The merged branch
+    # is called "original", both by the git merge and merge_three_way().
+    return re.sub(
+        r"\n<<<<<<< HEAD\n=======(.+?)>>>>>>> (?:master|original)\n",
+        r"\1",
+        content,
+        0,
+        re.DOTALL,
+    )
+
+
 def resolve_simple_git_conflicts(file_path: str, debug=False) -> None:
     content = read_content_from_file(file_path)
-    # If the conflict represents the addition of a new content hunk,
-    # keep the content and remove the conflict markers.
     if debug:
         print("Resolving simple conflicts automatically.")
-    replaced = re.sub(r"\n<<<<<<< HEAD\n=======(.+?)>>>>>>> master\n", r"\1", content, 0, re.DOTALL)
-    write_content_to_file(file_path, replaced)
+    write_content_to_file(file_path, resolve_simple_conflicts(content))
+
+
+# A changed region between two lists of lines: the start and length in the
+# first list, followed by the start and length in the second list.
+DiffHunk = typing.Tuple[int, int, int, int]
+
+
+def diff_lines(a: typing.List[str], b: typing.List[str]) -> typing.List[DiffHunk]:
+    """
+    Returns the changed regions between two lists of lines.
+
+    Like git, insertions and deletions that could be placed at several
+    positions, e.g. a block ending with the same line that follows it,
+    are moved down as far as possible. The lines are matched with difflib
+    though, which does not always match the same lines as git's diff.
+    """
+    hunks: typing.List[typing.List[int]] = []
+    matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    for tag, a1, a2, b1, b2 in matcher.get_opcodes():
+        if tag != "equal":
+            hunks.append([a1, a2 - a1, b1, b2 - b1])
+
+    for index, hunk in enumerate(hunks):
+        a1, a_len, b1, b_len = hunk
+        next_a1, next_b1 = (
+            (hunks[index + 1][0], hunks[index + 1][2])
+            if index + 1 < len(hunks)
+            else (len(a), len(b))
+        )
+        if a_len == 0:
+            while b1 + b_len < next_b1 and b[b1] == b[b1 + b_len]:
+                a1 += 1
+                b1 += 1
+        elif b_len == 0:
+            while a1 + a_len < next_a1 and a[a1] == a[a1 + a_len]:
+                a1 += 1
+                b1 += 1
+        hunk[0], hunk[2] = a1, b1
+
+    # Moving a hunk down can make it touch the next one.
+    merged_hunks: typing.List[DiffHunk] = []
+    for a1, a_len, b1, b_len in hunks:
+        if merged_hunks:
+            prev_a1, prev_a_len, prev_b1, prev_b_len = merged_hunks[-1]
+            if prev_a1 + prev_a_len == a1 and prev_b1 + prev_b_len == b1:
+                merged_hunks[-1] = (prev_a1, prev_a_len + a_len, prev_b1, prev_b_len + b_len)
+                continue
+        merged_hunks.append((a1, a_len, b1, b_len))
+    return merged_hunks
+
+
+class MergeRegion:
+    """
+    A region of a three-way merge. mode is 1 or 2 if the region is taken
+    from the first or the second side, 0 for a conflict and 4 for a
+    conflict in which both sides turned out to be identical.
+    """
+
+    __slots__ = ("mode", "i0", "chg0", "i1", "chg1", "i2", "chg2")
+
+    def __init__(self, mode: int, i0: int, chg0: int, i1: int, chg1: int, i2: int, chg2: int):
+        self.mode = mode
+        self.i0, self.chg0 = i0, chg0
+        self.i1, self.chg1 = i1, chg1
+        self.i2, self.chg2 = i2, chg2
+
+
+def _append_merge_region(
+    regions: typing.List[MergeRegion],
+    mode: int,
+    i0: int,
+    chg0: int,
+    i1: int,
+    chg1: int,
+    i2: int,
+    chg2: int,
+) -> None:
+    if regions and (
+        i1 <= regions[-1].i1 + regions[-1].chg1 or i2 <= regions[-1].i2 + regions[-1].chg2
+    ):
+        # Overlaps or touches the previous region.
+        region = regions[-1]
+        if region.mode != mode:
+            region.mode = 0
+        region.chg0 = i0 + chg0 - region.i0
+        region.chg1 = i1 + chg1 - region.i1
+        region.chg2 = i2 + chg2 - region.i2
+    else:
+        regions.append(MergeRegion(mode, i0, chg0, i1, chg1, i2, chg2))
+
+
+def _merge_regions(
+    base: typing.List[str], side1: typing.List[str], side2: typing.List[str]
+) -> typing.List[MergeRegion]:
+    """
+    Finds the regions of the two sides that changed relative to the base,
+    following the algorithm of git's xdiff merge (xdl_do_merge).
+    """
+    hunks1 = diff_lines(base, side1)
+    hunks2 = diff_lines(base, side2)
+    regions: typing.List[MergeRegion] = []
+    index1 = index2 = 0
+    while index1 < len(hunks1) and index2 < len(hunks2):
+        base1, base_len1, start1, len1 = hunks1[index1]
+        base2, base_len2, start2, len2 = hunks2[index2]
+        if base1 + base_len1 < base2:
+            _append_merge_region(
+                regions, 1, base1, base_len1, start1, len1, start2 - base2 + base1, base_len1
+            )
+            index1 += 1
+            continue
+        if base2 + base_len2 < base1:
+            _append_merge_region(
+                regions, 2, base2, base_len2, start1 - base1 + base2, base_len2, start2, len2
+            )
+            index2 += 1
+            continue
+        if (
+            base1 != base2
+            or base_len1 != base_len2
+            or len1 != len2
+            or side1[start1 : start1 + len1] != side2[start2 : start2 + len2]
+        ):
+            # Both sides changed the same lines differently.
+            offset = base1 - base2
+            end_offset = offset + base_len1 - base_len2
+            i0, i1, i2 = base1, start1, start2
+            if offset > 0:
+                i0 -= offset
+                i1 -= offset
+            else:
+                i2 += offset
+            chg0 = base1 + base_len1 - i0
+            chg1 = start1 + len1 - i1
+            chg2 = start2 + len2 - i2
+            if end_offset < 0:
+                chg0 -= end_offset
+                chg1 -= end_offset
+            else:
+                chg2 += end_offset
+            _append_merge_region(regions, 0, i0, chg0, i1, chg1, i2, chg2)
+
+        end1 = base1 + base_len1
+        end2 = base2 + base_len2
+        if end1 >= end2:
+            index2 += 1
+        if end2 >= end1:
+            index1 += 1
+
+    for base1, base_len1, start1, len1 in hunks1[index1:]:
+        _append_merge_region(
+            regions, 1, base1, base_len1, start1, len1, base1 + len(side2) - len(base), base_len1
+        )
+    for base2, base_len2, start2, len2 in hunks2[index2:]:
+        _append_merge_region(
+            regions, 2, base2, base_len2, base2 + len(side1) - len(base), base_len2, start2, len2
+        )
+    return regions
+
+
+def _refine_conflicts(
+    regions: typing.List[MergeRegion], side1: typing.List[str], side2: typing.List[str]
+) -> typing.List[MergeRegion]:
+    """ Splits conflicts around the lines that are common to both sides. """
+    refined_regions: typing.List[MergeRegion] = []
+    for region in regions:
+        if region.mode != 0 or region.chg1 == 0 or region.chg2 == 0:
+            refined_regions.append(region)
+            continue
+        hunks = diff_lines(
+            side1[region.i1 : region.i1 + region.chg1], side2[region.i2 : region.i2 + region.chg2]
+        )
+        if not hunks:
+            region.mode = 4
+            refined_regions.append(region)
+            continue
+        for start1, len1, start2, len2 in hunks:
+            refined_regions.append(
+                MergeRegion(
+                    0,
+                    region.i0,
+                    region.chg0,
+                    region.i1 + start1,
+                    len1,
+                    region.i2 + start2,
+                    len2,
+                )
+            )
+    return refined_regions
+
+
+def _simplify_non_conflicts(regions: typing.List[MergeRegion]) -> typing.List[MergeRegion]:
+    """ Joins conflicts that are separated by at most three lines. """
+    simplified_regions: typing.List[MergeRegion] = []
+    for region in regions:
+        if simplified_regions:
+            prev = simplified_regions[-1]
+            if prev.mode == 0 and region.mode == 0 and region.i1 - (prev.i1 + prev.chg1) <= 3:
+                prev.chg0 = region.i0 + region.chg0 - prev.i0
+                prev.chg1 = region.i1 + region.chg1 - prev.i1
+                prev.chg2 = region.i2 + region.chg2 - prev.i2
+                continue
+        simplified_regions.append(region)
+    return simplified_regions
+
+
+def _with_newline(lines: typing.List[str]) -> typing.List[str]:
+    if lines and not lines[-1].endswith("\n"):
+        return lines[:-1] + [lines[-1] + "\n"]
+    return lines
+
+
+def merge_three_way(
+    base: str, side1: str, side2: str, name1: str = "HEAD", name2: str = "original"
+) -> str:
+    """
+    Merges the changes that two files made to a common base, similar to a
+    git merge of side2 into side1. Conflicting changes are enclosed in
+    git style conflict markers labeled with name1 and name2.
+
+    This is an approximation of the git merge: because diff_lines() can
+    match other lines than git, a few inputs merge cleanly where git
+    reports a conflict, or the other way around.
+    """
+    base_lines = base.splitlines(keepends=True)
+    lines1 = side1.splitlines(keepends=True)
+    lines2 = side2.splitlines(keepends=True)
+
+    regions = _merge_regions(base_lines, lines1, lines2)
+    regions = _simplify_non_conflicts(_refine_conflicts(regions, lines1, lines2))
+
+    result: typing.List[str] = []
+    position = 0
+    for region in regions:
+        if region.mode == 4:
+            continue
+        result += lines1[position : region.i1]
+        region_lines1 = lines1[region.i1 : region.i1 + region.chg1]
+        region_lines2 = lines2[region.i2 : region.i2 + region.chg2]
+        if region.mode == 0:
+            result.append(f"<<<<<<< {name1}\n")
+            result += _with_newline(region_lines1)
+            result.append("=======\n")
+            result += _with_newline(region_lines2)
+            result.append(f">>>>>>> {name2}\n")
+        elif region.mode == 1:
+            result += region_lines1
+        else:
+            result += region_lines2
+        position = region.i1 + region.chg1
+    result += lines1[position:]
+    return "".join(result)
 
 
 def copyfile_log(src: str, dst: str, debug=False):
@@ -221,13 +486,18 @@ class SpecialCaseHandler(object):
         generated_file_path: str,
         base_dir: str,
         keep_temporary_files=False,
+        use_git_merge=True,
+        prev_files_list_path: typing.Optional[str] = None,
         debug=False,
     ) -> None:
         self.base_dir = base_dir
         self.original_file_path = original_file_path
         self.generated_file_path = generated_file_path
         self.keep_temporary_files = keep_temporary_files
+        self.use_git_merge = use_git_merge
+        self.prev_files_list_path = prev_files_list_path
         self.use_heuristic = False
+        self.git_available = False
         self.debug = debug
 
     @property
@@ -242,6 +512,22 @@ class SpecialCaseHandler(object):
     def no_special_file_path(self) -> str:
         return os.path.join(self.base_dir, "CMakeLists.no-special.txt")
 
+    def apply_merge(self, no_special_cases_file_path: str) -> None:
+        """
+        Merges the special case modifications of the original file into
+        the newly generated file, with the "clean" file as the common base.
+        Does not need git, but the result can differ from the one of
+        apply_git_merge_magic(), see merge_three_way().
+        """
+        merged_content = merge_three_way(
+            read_content_from_file(no_special_cases_file_path),
+            read_content_from_file(self.generated_file_path),
+            read_content_from_file(self.original_file_path),
+        )
+        if self.debug:
+            print("Resolving simple conflicts automatically.")
+        write_content_to_file(self.post_merge_file_path, resolve_simple_conflicts(merged_content))
+
     def apply_git_merge_magic(self, no_special_cases_file_path: str) -> None:
         # Create new folder for temporary repo, and ch dir into it.
         repo = os.path.join(self.base_dir, "tmp_repo")
@@ -315,10 +601,27 @@ class SpecialCaseHandler(object):
         files_are_equivalent = filecmp.cmp(self.generated_file_path, self.post_merge_file_path)
 
         if not files_are_equivalent:
+            # Nothing to save and git add, if the generated file did not
+            # change since the previous conversion.
+            if os.path.isfile(self.prev_file_path) and filecmp.cmp(
+                self.generated_file_path, self.prev_file_path, shallow=False
+            ):
+                return
+
             # Before overriding the generated file with the post
             # merge result, save the new "clean" file for future
             # regenerations.
             copyfile_log(self.generated_file_path, self.prev_file_path, debug=self.debug)
+            if self.prev_files_list_path:
+                # The caller git adds all recorded files at once. Each line is
+                # appended with a single write, so parallel conversions can
+                # share the list.
+                with open(self.prev_files_list_path, "a") as prev_files_list:
+                    prev_files_list.write(f"{os.path.abspath(self.prev_file_path)}\n")
+                return
+            if not self.git_available:
+                print(f"git is not in PATH. Make sure to git add {self.prev_file_path} yourself.")
+                return
 
             # Attempt to git add until we succeed. It can fail when
             # run_pro2cmake executes pro2cmake in multiple threads, and git
@@ -344,8 +647,8 @@ class SpecialCaseHandler(object):
 
     def handle_special_cases_helper(self) -> bool:
         """
-        Uses git to reapply special case modifications to the "new"
-        generated CMakeLists.gen.txt file.
+        Reapplies special case modifications to the "new" generated
+        CMakeLists.gen.txt file, using a three-way merge.
 
         If use_heuristic is True, a new file is created from the
         original file, with special cases removed.
@@ -368,11 +671,15 @@ class SpecialCaseHandler(object):
 
             if self.debug:
                 print(
-                    f"Using git to reapply special case modifications to newly "
-                    f"generated {self.generated_file_path} file"
+                    f"Using {'git' if self.use_git_merge else 'a three-way merge'} to reapply "
+                    f"special case modifications to newly generated "
+                    f"{self.generated_file_path} file"
                 )
 
-            self.apply_git_merge_magic(no_special_cases_file_path)
+            if self.use_git_merge:
+                self.apply_git_merge_magic(no_special_cases_file_path)
+            else:
+                self.apply_merge(no_special_cases_file_path)
             self.save_next_clean_file()
 
             copyfile_log(self.post_merge_file_path, self.generated_file_path)
@@ -380,7 +687,7 @@ class SpecialCaseHandler(object):
                 os.remove(self.post_merge_file_path)
             if self.debug:
                 print(
-                    "Special case reapplication using git is complete. "
+                    "Special case reapplication is complete. "
                     "Make sure to fix remaining conflict markers."
                 )
 
@@ -398,14 +705,14 @@ class SpecialCaseHandler(object):
         prev_file_exists = os.path.isfile(self.prev_file_path)
         self.use_heuristic = not prev_file_exists
 
-        git_available = check_if_git_in_path()
-        keep_special_cases = original_file_exists and git_available
-
-        if not git_available:
+        self.git_available = check_if_git_in_path()
+        if not self.git_available and self.use_git_merge:
             print(
-                "You need to have git in PATH in order to reapply the special "
-                "case modifications."
+                "Warning: git is not in PATH, reapplying the special case modifications "
+                "with the built-in three-way merge, which only approximates the git merge."
             )
+            self.use_git_merge = False
+        keep_special_cases = original_file_exists
 
         copy_generated_file = True
 
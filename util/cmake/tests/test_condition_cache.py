@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+#############################################################################
+##
+## Copyright (C) 2018 The Qt Company Ltd.
+## Contact: https://www.qt.io/licensing/
+##
+## This file is part of the plugins of the Qt Toolkit.
+##
+## $QT_BEGIN_LICENSE:GPL-EXCEPT$
+## Commercial License Usage
+## Licensees holding valid commercial Qt licenses may use this file in
+## accordance with the commercial license agreement provided with the
+## Software or, alternatively, in accordance with the terms contained in
+## a written agreement between you and The Qt Company. For licensing terms
+## and conditions see https://www.qt.io/terms-conditions. For further
+## information use the contact form at https://www.qt.io/contact-us.
+##
+## GNU General Public License Usage
+## Alternatively, this file may be used under the terms of the GNU
+## General Public License version 3 as published by the Free Software
+## Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+## included in the packaging of this file. Please review the following
+## information to ensure the GNU General Public License requirements will
+## be met: https://www.gnu.org/licenses/gpl-3.0.html.
+##
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+import os
+import threading
+from condition_simplifier_cache import ShardedConditionCache, try_lock_file
+
+
+def test_entries_are_shared_between_writers(tmp_path):
+    first = ShardedConditionCache(str(tmp_path), shard_count=4)
+    second = ShardedConditionCache(str(tmp_path), shard_count=4)
+    first.append('A AND A', 'A')
+    second.append_many({'B OR B': 'B', 'A AND A': 'A'})
+    first.append('B OR B', 'B2')
+
+    assert ShardedConditionCache(str(tmp_path), shard_count=4).load() == {'A AND A': 'A', 'B OR B': 'B2'}
+
+
+def test_torn_records_are_skipped(tmp_path):
+    cache = ShardedConditionCache(str(tmp_path), shard_count=1)
+    cache.append('A', 'a')
+    with open(cache.get_segment_path(0), 'a') as segment_file:
+        segment_file.write('["B", "b')
+
+    assert cache.load() == {'A': 'a'}
+
+
+def test_compaction(tmp_path):
+    cache = ShardedConditionCache(str(tmp_path), shard_count=2)
+    for i in range(10):
+        cache.append('A', str(i))
+        cache.append('B', str(i))
+    cache.compact()
+
+    assert cache.load() == {'A': '9', 'B': '9'}
+    record_count = sum(cache.read_segment(shard)[1] for shard in range(2))
+    assert record_count == 2
+    assert not [f for f in os.listdir(str(tmp_path)) if f.endswith('.tmp')]
+
+
+def test_appends_wait_for_compaction(tmp_path):
+    cache = ShardedConditionCache(str(tmp_path), shard_count=1)
+    cache.append('A', 'a')
+    with try_lock_file(cache.get_compaction_lock_path()) as locked:
+        assert locked
+        # Stands in for another process compacting the segment.
+        appender = threading.Thread(target=cache.append, args=('B', 'b'))
+        appender.start()
+        appender.join(0.5)
+        assert appender.is_alive()
+        assert cache.read_segment(0)[0] == {'A': 'a'}
+    appender.join()
+
+    assert cache.load() == {'A': 'a', 'B': 'b'}
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+#############################################################################
+##
+## Copyright (C) 2018 The Qt Company Ltd.
+## Contact: https://www.qt.io/licensing/
+##
+## This file is part of the plugins of the Qt Toolkit.
+##
+## $QT_BEGIN_LICENSE:GPL-EXCEPT$
+## Commercial License Usage
+## Licensees holding valid commercial Qt licenses may use this file in
+## accordance with the commercial license agreement provided with the
+## Software or, alternatively, in accordance with the terms contained in
+## a written agreement between you and The Qt Company. For licensing terms
+## and conditions see https://www.qt.io/terms-conditions. For further
+## information use the contact form at https://www.qt.io/contact-us.
+##
+## GNU General Public License Usage
+## Alternatively, this file may be used under the terms of the GNU
+## General Public License version 3 as published by the Free Software
+## Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+## included in the packaging of this file. Please review the following
+## information to ensure the GNU General Public License requirements will
+## be met: https://www.gnu.org/licenses/gpl-3.0.html.
+##
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+from pro2cmake import map_condition
+
+import pytest
+
+
+@pytest.mark.parametrize('condition,expected', [
+    ('equals(QT_GCC_MAJOR_VERSION, 5)', '(QT_COMPILER_VERSION_MAJOR STREQUAL 5)'),
+    ('lessThan(WINDOWS_SDK_VERSION, 17763)', '(QT_WINDOWS_SDK_VERSION STRLESS 17763)'),
+    ('greaterThan(QT_CLANG_MAJOR_VERSION, 3)', '(QT_CLANG_MAJOR_VERSION GREATER 3)'),
+    ('!isEmpty(QMAKE_LIBS_FOO)', 'NOT QMAKE_LIBS_FOO_ISEMPTY'),
+    ('contains(QT_CONFIG, c++17)', 'cxx_std_17 IN_LIST CMAKE_CXX_COMPILE_FEATURES'),
+    ('CONFIG(debug,debug|release)', '(CMAKE_BUILD_TYPE STREQUAL Debug)'),
+    ('if(linux|macos)&&qtHaveModule(network)', '( LINUX OR APPLE_OSX ) AND TARGET Qt::Network'),
+    ('win32-*', 'WIN32'),
+    ('qtConfig(opengl.*)', 'QT_FEATURE_opengl'),
+])
+def test_map_condition(condition, expected):
+    assert map_condition(condition) == expected
+    # Memoized results are the same.
+    assert map_condition(condition) == expected
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+#############################################################################
+##
+## Copyright (C) 2018 The Qt Company Ltd.
+## Contact: https://www.qt.io/licensing/
+##
+## This file is part of the plugins of the Qt Toolkit.
+##
+## $QT_BEGIN_LICENSE:GPL-EXCEPT$
+## Commercial License Usage
+## Licensees holding valid commercial Qt licenses may use this file in
+## accordance with the commercial license agreement provided with the
+## Software or, alternatively, in accordance with the terms contained in
+## a written agreement between you and The Qt Company. For licensing terms
+## and conditions see https://www.qt.io/terms-conditions. For further
+## information use the contact form at https://www.qt.io/contact-us.
+##
+## GNU General Public License Usage
+## Alternatively, this file may be used under the terms of the GNU
+## General Public License version 3 as published by the Free Software
+## Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+## included in the packaging of this file. Please review the following
+## information to ensure the GNU General Public License requirements will
+## be met: https://www.gnu.org/licenses/gpl-3.0.html.
+##
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+import os
+import subprocess
+import sys
+
+import configurejson2cmake
+from configurejson2cmake import (
+    FeatureIndex, addKnownTest, findConfigureJsonDirs, map_condition, map_tests, processTree,
+    registerKnownTests
+)
+
+import pytest
+
+
+@pytest.fixture
+def known_tests(monkeypatch):
+    """ Runs the test with no known tests and a fresh condition cache. """
+    configurejson2cmake._map_condition.cache_clear()
+    monkeypatch.setattr(configurejson2cmake, 'knownTests', set())
+    yield
+    configurejson2cmake._map_condition.cache_clear()
+
+
+def _write_configure_json(path):
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, 'configure.json'), 'w') as f:
+        f.write('{}')
+
+
+def test_find_configure_json_dirs(tmp_path):
+    root = str(tmp_path)
+    _write_configure_json(root)
+    _write_configure_json(os.path.join(root, 'src', 'network'))
+    _write_configure_json(os.path.join(root, 'src', 'corelib'))
+    _write_configure_json(os.path.join(root, 'mkspecs', 'features', 'data'))
+    _write_configure_json(os.path.join(root, '.git', 'hooks'))
+    os.makedirs(os.path.join(root, 'src', 'gui'))
+
+    assert findConfigureJsonDirs(root) == [
+        root,
+        os.path.join(root, 'src', 'corelib'),
+        os.path.join(root, 'src', 'network'),
+    ]
+
+
+def test_register_known_tests(known_tests):
+    data = {
+        'tests': {
+            'openssl': {'type': 'compile'},
+            'fancysimd': {'type': 'x86Simd'},
+            'xlib': {'type': 'compile'},
+            'gnumake': {'type': 'compiler'},
+        }
+    }
+
+    assert map_tests('openssl') is None
+    registerKnownTests(data)
+
+    assert map_tests('openssl') == 'TEST_openssl'
+    assert map_tests('fancysimd') == 'TEST_fancysimd'
+    assert map_tests('gnumake') is None
+    assert 'xlib' not in configurejson2cmake.knownTests
+
+
+def test_feature_index_library_emit_if():
+    index = FeatureIndex({
+        'opengl': {'enable': 'libs.opengl'},
+        'opengl_desktop': {'condition': 'libs.opengl', 'emitIf': 'features.opengl'},
+        'opengl_es2': {'condition': 'libs.opengl', 'emitIf': 'config.win32'},
+        'egl': {'condition': 'libs.opengl', 'emitIf': 'config.unix'},
+    })
+
+    assert index.library_emit_if('opengl') == 'config.win32'
+    assert index.library_emit_if('egl') is None
+
+    index = FeatureIndex({
+        'xcb-xinput': {'condition': 'libs.xcb_xinput', 'emitIf': 'config.linux'},
+        'xcb': {'condition': ['features.thread', 'libs.xcb'], 'emitIf': 'config.unix'},
+    })
+    assert index.library_emit_if('xcb') == 'config.unix'
+    assert index.library_emit_if('xcb_xinput') == 'config.linux'
+
+
+def test_process_tree_shares_feature_index(tmp_path, known_tests):
+    # The library is declared by one module and used by a feature of another.
+    files = {
+        'src/gui': '{"module": "gui", "libraries": {"libudev": {}}}',
+        'src/platformsupport': '{"module": "platformsupport", "features": {"libudev": {'
+                               '"label": "udev", "condition": "libs.libudev", '
+                               '"emitIf": "config.linux", "output": ["privateFeature"]}}}',
+    }
+    for path, content in files.items():
+        os.makedirs(str(tmp_path / path))
+        with open(str(tmp_path / path / 'configure.json'), 'w') as f:
+            f.write(content)
+
+    processTree(str(tmp_path))
+
+    with open(str(tmp_path / 'src' / 'gui' / 'configure.cmake')) as f:
+        assert 'if((LINUX) OR QT_FIND_ALL_PACKAGES_ALWAYS)\n    qt_find_package(Libudev' in f.read()
+
+
+def test_map_condition():
+    assert map_condition('features.thread && !config.win32') == 'QT_FEATURE_thread AND NOT WIN32'
+    assert map_condition(['features.thread', 'config.unix']) == '( QT_FEATURE_thread ) AND ( UNIX )'
+    assert map_condition(True) == 'ON'
+    assert map_condition('') == ''
+
+
+def test_map_condition_unknown_reported_every_time(capsys):
+    for _ in range(2):
+        assert map_condition('foo.bar && features.thread') == 'foo.bar AND QT_FEATURE_thread OR FIXME'
+        assert 'Unknown condition "foo.bar"' in capsys.readouterr().out
+
+
+def test_map_condition_sees_new_tests(known_tests):
+    assert map_condition('tests.fancy_test') == 'tests.fancy_test OR FIXME'
+    assert map_condition('tests.other_test') == 'tests.other_test OR FIXME'
+
+    registerKnownTests({'tests': {'fancy_test': {'type': 'compile'}}})
+    assert map_condition('tests.fancy_test') == 'TEST_fancy_test'
+    assert map_condition('tests.other_test') == 'tests.other_test OR FIXME'
+
+    addKnownTest('other_test')
+    assert map_condition('tests.other_test') == 'TEST_other_test'
+
+
+def test_known_tests_generation(known_tests):
+    generation = configurejson2cmake.knownTestsGeneration
+    addKnownTest('fancy_test')
+    assert configurejson2cmake.knownTestsGeneration != generation
+
+    # Adding a test that is already known keeps the cached mappings.
+    generation = configurejson2cmake.knownTestsGeneration
+    addKnownTest('fancy_test')
+    assert configurejson2cmake.knownTestsGeneration == generation
+
+
+def test_condition_simplifier_is_loaded_on_demand():
+    # Loading the condition simplifier imports sympy and cleans up the
+    # condition cache, which conversions without --simplify-conditions
+    # do not need.
+    script = ('import sys, configurejson2cmake; '
+              'configurejson2cmake.map_condition("features.thread"); '
+              'assert "condition_simplifier" not in sys.modules; '
+              'assert "sympy" not in sys.modules')
+    cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, '-c', script], cwd=cwd, check=True)
+
+
+def test_map_condition_simplified(monkeypatch):
+    monkeypatch.setattr(configurejson2cmake, 'simplify_mapped_conditions', True)
+    assert map_condition('features.thread && features.thread') == 'QT_FEATURE_thread'
+    assert map_condition('') == ''
+    assert map_condition('foo.bar || foo.bar') == 'foo.bar OR foo.bar OR FIXME'
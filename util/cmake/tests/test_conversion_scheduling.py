@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+#############################################################################
+##
+## Copyright (C) 2018 The Qt Company Ltd.
+## Contact: https://www.qt.io/licensing/
+##
+## This file is part of the plugins of the Qt Toolkit.
+##
+## $QT_BEGIN_LICENSE:GPL-EXCEPT$
+## Commercial License Usage
+## Licensees holding valid commercial Qt licenses may use this file in
+## accordance with the commercial license agreement provided with the
+## Software or, alternatively, in accordance with the terms contained in
+## a written agreement between you and The Qt Company. For licensing terms
+## and conditions see https://www.qt.io/terms-conditions. For further
+## information use the contact form at https://www.qt.io/contact-us.
+##
+## GNU General Public License Usage
+## Alternatively, this file may be used under the terms of the GNU
+## General Public License version 3 as published by the Free Software
+## Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+## included in the packaging of this file. Please review the following
+## information to ensure the GNU General Public License requirements will
+## be met: https://www.gnu.org/licenses/gpl-3.0.html.
+##
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+import os
+
+from run_pro2cmake import (format_progress, load_conversion_times, save_conversion_times,
+                           schedule_longest_first)
+
+
+def test_schedule_longest_first():
+    files = ['a/a.pro', 'b/b.pro', 'c/c.pro', 'd/d.pro']
+    assert schedule_longest_first(files, {}) == files
+
+    conversion_times = {
+        os.path.abspath('a/a.pro'): 1.0,
+        os.path.abspath('b/b.pro'): 30.0,
+        os.path.abspath('d/d.pro'): 2.5,
+    }
+    assert schedule_longest_first(files, conversion_times) == [
+        'c/c.pro', 'b/b.pro', 'd/d.pro', 'a/a.pro']
+
+
+def test_conversion_times_round_trip(tmp_path):
+    path = str(tmp_path / 'cache' / 'conversion_times.json')
+    assert load_conversion_times(path) == {}
+
+    save_conversion_times(path, {'/src/gui/gui.pro': 42.0})
+    assert load_conversion_times(path) == {'/src/gui/gui.pro': 42.0}
+    assert os.listdir(str(tmp_path / 'cache')) == ['conversion_times.json']
+
+
+def test_format_progress():
+    assert format_progress(0, 10, 0.0) == 'Progress: 0/10 projects, 0.00 projects/s, ETA unknown'
+    assert format_progress(5, 100, 2.0) == 'Progress: 5/100 projects, 2.50 projects/s, ETA 0:00:38'
+    assert format_progress(100, 100, 50.0) == 'Progress: 100/100 projects, 2.00 projects/s, ETA 0:00:00'
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+#############################################################################
+##
+## Copyright (C) 2018 The Qt Company Ltd.
+## Contact: https://www.qt.io/licensing/
+##
+## This file is part of the plugins of the Qt Toolkit.
+##
+## $QT_BEGIN_LICENSE:GPL-EXCEPT$
+## Commercial License Usage
+## Licensees holding valid commercial Qt licenses may use this file in
+## accordance with the commercial license agreement provided with the
+## Software or, alternatively, in accordance with the terms contained in
+## a written agreement between you and The Qt Company. For licensing terms
+## and conditions see https://www.qt.io/terms-conditions. For further
+## information use the contact form at https://www.qt.io/contact-us.
+##
+## GNU General Public License Usage
+## Alternatively, this file may be used under the terms of the GNU
+## General Public License version 3 as published by the Free Software
+## Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+## included in the packaging of this file. Please review the following
+## information to ensure the GNU General Public License requirements will
+## be met: https://www.gnu.org/licenses/gpl-3.0.html.
+##
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+import glob
+import os
+import pyparsing as pp
+import pytest
+from qmake_parser import QmakeParser
+from qmake_fast_parser import QmakeFastParser
+
+
+_tests_path = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_with_both(contents):
+    expected = QmakeParser().parseContents(contents).asDict()
+    result = QmakeFastParser().parseContents(contents).asDict()
+    return expected, result
+
+
+@pytest.mark.parametrize('file', sorted(glob.glob(os.path.join(_tests_path, 'data', '*.pro'))))
+def test_same_result_as_pyparsing(file):
+    expected, expected_contents = QmakeParser().parseFile(file)
+    result, contents = QmakeFastParser().parseFile(file)
+    assert expected.asDict() == result.asDict()
+    assert expected_contents == contents
+
+
+@pytest.mark.parametrize('contents', [
+    '',
+    'A = 1 # comment\n',
+    'A = "a\\tb" $$quote(x y) $$files(*.cpp) $${B} $(C) ${D} $$[QT_INSTALL_LIBS]\n',
+    'A = $$join(B, "/", (, )) ($$C, "d") e(f)\n',
+    'include( )\nload()\nrequires(a:b)\noption(host_build)\n',
+    '!win32|linux:contains(A, b) { A = 1 } else: B = 2\n',
+    'a:b(c) | d {\n  A += x\n} else:c {\n  B -= y\n} else {\n}\n',
+    'write_file(a)|error()\n',
+    'for(a, b) {\n  message($$a)\n}\nfor(x, y): message($$x)\n',
+    'defineTest(foo) {\n  return(true)\n}\n',
+    'A = \\\\\n',
+])
+def test_same_result_as_pyparsing_for_snippet(contents):
+    expected, result = parse_with_both(contents)
+    assert expected == result
+
+
+def test_parse_error():
+    with pytest.raises(pp.ParseException):
+        QmakeParser().parseContents('A = {\n')
+    with pytest.raises(pp.ParseException):
+        QmakeFastParser().parseContents('A = {\n')
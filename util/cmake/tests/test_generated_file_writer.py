@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+#############################################################################
+##
+## Copyright (C) 2018 The Qt Company Ltd.
+## Contact: https://www.qt.io/licensing/
+##
+## This file is part of the plugins of the Qt Toolkit.
+##
+## $QT_BEGIN_LICENSE:GPL-EXCEPT$
+## Commercial License Usage
+## Licensees holding valid commercial Qt licenses may use this file in
+## accordance with the commercial license agreement provided with the
+## Software or, alternatively, in accordance with the terms contained in
+## a written agreement between you and The Qt Company. For licensing terms
+## and conditions see https://www.qt.io/terms-conditions. For further
+## information use the contact form at https://www.qt.io/contact-us.
+##
+## GNU General Public License Usage
+## Alternatively, this file may be used under the terms of the GNU
+## General Public License version 3 as published by the Free Software
+## Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+## included in the packaging of this file. Please review the following
+## information to ensure the GNU General Public License requirements will
+## be met: https://www.gnu.org/licenses/gpl-3.0.html.
+##
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+import os
+import stat
+
+import generated_file_writer
+from generated_file_writer import (
+    format_generated_file_counters, parse_generated_file_counters, write_generated_file
+)
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def counters(monkeypatch):
+    monkeypatch.setattr(generated_file_writer, 'generated_file_counters',
+                        generated_file_writer.collections.Counter())
+
+
+def test_write_new_file(tmp_path):
+    file_path = str(tmp_path / 'CMakeLists.txt')
+
+    assert write_generated_file(file_path, 'project(Foo)\n')
+    with open(file_path) as f:
+        assert f.read() == 'project(Foo)\n'
+    assert os.listdir(str(tmp_path)) == ['CMakeLists.txt']
+
+    umask = os.umask(0)
+    os.umask(umask)
+    assert stat.S_IMODE(os.stat(file_path).st_mode) == 0o666 & ~umask
+
+
+def test_unchanged_file_is_not_touched(tmp_path):
+    file_path = str(tmp_path / 'configure.cmake')
+    write_generated_file(file_path, 'qt_feature("foo")\n')
+    os.utime(file_path, (1000000000, 1000000000))
+
+    assert not write_generated_file(file_path, 'qt_feature("foo")\n')
+    assert os.stat(file_path).st_mtime == 1000000000
+    assert format_generated_file_counters() == 'Generated files: 1 written, 1 unchanged.'
+
+
+def test_changed_file_keeps_mode(tmp_path):
+    file_path = str(tmp_path / 'CMakeLists.txt')
+    with open(file_path, 'w') as f:
+        f.write('project(Foo)\n')
+    os.chmod(file_path, 0o640)
+
+    assert write_generated_file(file_path, 'project(Bar)\n')
+    with open(file_path) as f:
+        assert f.read() == 'project(Bar)\n'
+    assert stat.S_IMODE(os.stat(file_path).st_mode) == 0o640
+    assert sorted(os.listdir(str(tmp_path))) == ['CMakeLists.txt']
+
+
+def test_parse_generated_file_counters():
+    output = '\n'.join([
+        'Converted[1/2]: a.pro',
+        format_generated_file_counters(generated_file_writer.collections.Counter(written=2)),
+        'Converted[2/2]: b.pro',
+        'Generated files: 1 written, 3 unchanged.',
+    ])
+    counters = parse_generated_file_counters(output)
+    assert counters == {'written': 3, 'unchanged': 3}
+    assert format_generated_file_counters(counters) == 'Generated files: 3 written, 3 unchanged.'
+    assert parse_generated_file_counters('Skipping conversion') == {}
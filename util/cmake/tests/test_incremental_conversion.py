@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+#############################################################################
+##
+## Copyright (C) 2018 The Qt Company Ltd.
+## Contact: https://www.qt.io/licensing/
+##
+## This file is part of the plugins of the Qt Toolkit.
+##
+## $QT_BEGIN_LICENSE:GPL-EXCEPT$
+## Commercial License Usage
+## Licensees holding valid commercial Qt licenses may use this file in
+## accordance with the commercial license agreement provided with the
+## Software or, alternatively, in accordance with the terms contained in
+## a written agreement between you and The Qt Company. For licensing terms
+## and conditions see https://www.qt.io/terms-conditions. For further
+## information use the contact form at https://www.qt.io/contact-us.
+##
+## GNU General Public License Usage
+## Alternatively, this file may be used under the terms of the GNU
+## General Public License version 3 as published by the Free Software
+## Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+## included in the packaging of this file. Please review the following
+## information to ensure the GNU General Public License requirements will
+## be met: https://www.gnu.org/licenses/gpl-3.0.html.
+##
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+import argparse
+import json
+import os
+import sys
+
+import condition_simplifier_cache
+import pro2cmake
+import qmake_parser_cache
+import run_pro2cmake
+from run_pro2cmake import ConversionManifest
+
+
+def _args(**kwargs):
+    args = argparse.Namespace(is_example=False, skip_subdirs_projects=False, pro2cmake_args=[])
+    for name, value in kwargs.items():
+        setattr(args, name, value)
+    return args
+
+
+def _write(path, contents):
+    with open(path, 'w') as f:
+        f.write(contents)
+
+
+def _convert(tmp_path, manifest, pro_file, dependencies):
+    # Stands in for a successful pro2cmake run.
+    _write(str(tmp_path / 'CMakeLists.txt'), 'qt_add_executable(foo)\n')
+    dependency_file = str(tmp_path / 'dependencies.json')
+    _write(dependency_file, json.dumps(dependencies))
+    manifest.update(pro_file, dependency_file)
+    manifest.save()
+
+
+def test_conversion_manifest(tmp_path):
+    scripts_path = str(tmp_path)
+    manifest_path = str(tmp_path / 'manifest.json')
+    pro_file = str(tmp_path / 'foo.pro')
+    pri_file = str(tmp_path / 'foo.pri')
+    missing_pri_file = str(tmp_path / 'missing.pri')
+    _write(pro_file, 'include(foo.pri)\n')
+    _write(pri_file, 'SOURCES = foo.cpp\n')
+
+    manifest = ConversionManifest(manifest_path, scripts_path, _args())
+    assert not manifest.is_up_to_date(pro_file)
+    _convert(tmp_path, manifest, pro_file, [pro_file, pri_file, missing_pri_file])
+
+    assert ConversionManifest(manifest_path, scripts_path, _args()).is_up_to_date(pro_file)
+    assert not ConversionManifest(manifest_path, scripts_path,
+                                  _args(is_example=True)).is_up_to_date(pro_file)
+
+    _write(missing_pri_file, 'SOURCES += bar.cpp\n')
+    assert not ConversionManifest(manifest_path, scripts_path, _args()).is_up_to_date(pro_file)
+    os.remove(missing_pri_file)
+
+    _write(pri_file, 'SOURCES = bar.cpp\n')
+    manifest = ConversionManifest(manifest_path, scripts_path, _args())
+    assert not manifest.is_up_to_date(pro_file)
+    _convert(tmp_path, manifest, pro_file, [pro_file, pri_file])
+    assert ConversionManifest(manifest_path, scripts_path, _args()).is_up_to_date(pro_file)
+
+    _write(str(tmp_path / 'CMakeLists.txt'), 'qt_add_executable(bar)\n')
+    assert not ConversionManifest(manifest_path, scripts_path, _args()).is_up_to_date(pro_file)
+
+
+def test_conversion_manifest_scripts_change(tmp_path):
+    scripts_path = str(tmp_path / 'scripts')
+    os.mkdir(scripts_path)
+    manifest_path = str(tmp_path / 'manifest.json')
+    pro_file = str(tmp_path / 'foo.pro')
+    _write(pro_file, 'SOURCES = foo.cpp\n')
+    _write(os.path.join(scripts_path, 'pro2cmake.py'), 'pass\n')
+
+    manifest = ConversionManifest(manifest_path, scripts_path, _args())
+    _convert(tmp_path, manifest, pro_file, [pro_file])
+    assert ConversionManifest(manifest_path, scripts_path, _args()).is_up_to_date(pro_file)
+
+    _write(os.path.join(scripts_path, 'pro2cmake.py'), 'pass  # changed\n')
+    assert not ConversionManifest(manifest_path, scripts_path, _args()).is_up_to_date(pro_file)
+
+
+def test_nothing_to_convert(tmp_path, monkeypatch, capsys):
+    scripts_path = os.path.dirname(os.path.abspath(run_pro2cmake.__file__))
+    manifest_path = str(tmp_path / '.pro2cmake_manifest.json')
+    pro_file = str(tmp_path / 'foo.pro')
+    _write(pro_file, 'SOURCES = foo.cpp\n')
+    monkeypatch.setattr(sys, 'argv', ['run_pro2cmake.py', '--incremental', str(tmp_path)])
+
+    manifest = ConversionManifest(manifest_path, scripts_path, run_pro2cmake.parse_command_line())
+    _convert(tmp_path, manifest, pro_file, [pro_file])
+
+    def run(all_files, pro2cmake, args):
+        raise AssertionError('no project needs to be converted')
+
+    monkeypatch.setattr(run_pro2cmake, 'run', run)
+    run_pro2cmake.main()
+    assert capsys.readouterr().out.splitlines()[-1] == 'All 1 projects are up to date.'
+
+
+def test_dependency_file_of_several_projects(tmp_path, monkeypatch):
+    # The conversion switches the caches off for the whole process.
+    monkeypatch.setattr(condition_simplifier_cache, 'condition_simplifier_cache_enabled', True)
+    monkeypatch.setattr(qmake_parser_cache, 'parse_tree_cache_enabled', True)
+    dependency_file = str(tmp_path / 'dependencies.json')
+    files = {}
+    for name in ('foo', 'bar'):
+        os.mkdir(str(tmp_path / name))
+        files[name] = (str(tmp_path / name / (name + '.pro')), str(tmp_path / name / (name + '.pri')))
+        _write(files[name][0], 'TARGET = {}\nSOURCES = main.cpp\ninclude({}.pri)\n'.format(name, name))
+        _write(files[name][1], 'SOURCES += {}.cpp\n'.format(name))
+
+    args = pro2cmake._parse_commandline(['-s', '--skip-condition-cache', '--skip-parse-tree-cache',
+                                         '--dependency-file', dependency_file,
+                                         files['foo'][0], files['bar'][0]])
+    pro2cmake.convert_projects(args.files, args)
+
+    with open(dependency_file) as f:
+        dependencies = json.load(f)
+    for pro_file, pri_file in files.values():
+        assert pro_file in dependencies
+        assert pri_file in dependencies
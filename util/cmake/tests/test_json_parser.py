@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+#############################################################################
+##
+## Copyright (C) 2018 The Qt Company Ltd.
+## Contact: https://www.qt.io/licensing/
+##
+## This file is part of the plugins of the Qt Toolkit.
+##
+## $QT_BEGIN_LICENSE:GPL-EXCEPT$
+## Commercial License Usage
+## Licensees holding valid commercial Qt licenses may use this file in
+## accordance with the commercial license agreement provided with the
+## Software or, alternatively, in accordance with the terms contained in
+## a written agreement between you and The Qt Company. For licensing terms
+## and conditions see https://www.qt.io/terms-conditions. For further
+## information use the contact form at https://www.qt.io/contact-us.
+##
+## GNU General Public License Usage
+## Alternatively, this file may be used under the terms of the GNU
+## General Public License version 3 as published by the Free Software
+## Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+## included in the packaging of this file. Please review the following
+## information to ensure the GNU General Public License requirements will
+## be met: https://www.gnu.org/licenses/gpl-3.0.html.
+##
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+import pyparsing as pp
+
+from json_parser import QMakeSpecificJSONParser
+
+
+def test_remove_newlines_in_quoted_strings():
+    contents = '{\n    "label": "Foo\n             bar",\n    "test": "a \\"quoted\n  \\" value"\n}\n'
+    assert QMakeSpecificJSONParser.remove_newlines_in_quoted_strings(contents) == \
+        '{\n    "label": "Foo bar",\n    "test": "a \\"quoted \\" value"\n}\n'
+
+
+def test_parse(tmp_path):
+    whitespace_chars = pp.ParserElement.DEFAULT_WHITE_CHARS
+    path = tmp_path / 'configure.json'
+    path.write_text('{\n    "features": {\n        "foo": {\n            "label": "Foo\n'
+                    '                      and bar",\n            "condition": "config.unix"\n'
+                    '        }\n    }\n}\n')
+    data = QMakeSpecificJSONParser().parse(str(path))
+    assert data == {'features': {'foo': {'label': 'Foo and bar', 'condition': 'config.unix'}}}
+    assert pp.ParserElement.DEFAULT_WHITE_CHARS == whitespace_chars
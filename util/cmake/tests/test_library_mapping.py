@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+#############################################################################
+##
+## Copyright (C) 2018 The Qt Company Ltd.
+## Contact: https://www.qt.io/licensing/
+##
+## This file is part of the plugins of the Qt Toolkit.
+##
+## $QT_BEGIN_LICENSE:GPL-EXCEPT$
+## Commercial License Usage
+## Licensees holding valid commercial Qt licenses may use this file in
+## accordance with the commercial license agreement provided with the
+## Software or, alternatively, in accordance with the terms contained in
+## a written agreement between you and The Qt Company. For licensing terms
+## and conditions see https://www.qt.io/terms-conditions. For further
+## information use the contact form at https://www.qt.io/contact-us.
+##
+## GNU General Public License Usage
+## Alternatively, this file may be used under the terms of the GNU
+## General Public License version 3 as published by the Free Software
+## Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+## included in the packaging of this file. Please review the following
+## information to ensure the GNU General Public License requirements will
+## be met: https://www.gnu.org/licenses/gpl-3.0.html.
+##
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+import helper
+from helper import (
+    LibraryMapping,
+    find_3rd_party_library_mapping,
+    find_library_info_for_target,
+    find_qt_library_mapping,
+    register_library_mapping,
+    register_qt_library_mapping,
+)
+import configurejson2cmake
+import pro2cmake
+
+import pytest
+
+
+@pytest.fixture
+def library_maps(monkeypatch):
+    for name in ('_library_map', '_qt_library_map', '_library_map_by_so_name',
+                 '_library_map_by_target_name', '_qt_library_map_by_so_name',
+                 '_qt_library_map_by_target_name'):
+        monkeypatch.setattr(helper, name, getattr(helper, name).copy())
+    yield
+    # Drop results that were computed with the mappings of the test.
+    helper._notify_library_map_changed()
+
+
+def test_lookups():
+    assert find_3rd_party_library_mapping('zlib').targetName == 'ZLIB::ZLIB'
+    assert find_qt_library_mapping('core').targetName == 'Qt::Core'
+    assert find_library_info_for_target('Qt::CorePrivate').soName == 'core'
+    assert find_library_info_for_target('ZLIB::ZLIB').soName == 'zlib'
+    assert find_3rd_party_library_mapping('no_such_library') is None
+
+
+def test_register_library_mapping(library_maps):
+    register_library_mapping(LibraryMapping('foo', 'Foo', 'Foo::Foo'))
+    register_library_mapping(LibraryMapping('xcb_foo', 'XCB', 'XCB::FOO'))
+    register_qt_library_mapping(LibraryMapping('bar', 'Qt6', 'Qt::Bar'))
+
+    assert find_3rd_party_library_mapping('foo').targetName == 'Foo::Foo'
+    assert find_library_info_for_target('Foo::Foo').soName == 'foo'
+    assert find_3rd_party_library_mapping('xcb_foo').emit_if == 'config.linux'
+    assert find_qt_library_mapping('bar').targetName == 'Qt::Bar'
+    assert find_library_info_for_target('Qt::BarPrivate').soName == 'bar'
+
+
+def test_register_known_library_mapping(library_maps):
+    register_library_mapping(LibraryMapping('zlib', 'MyZlib', 'MyZlib::MyZlib'))
+    assert find_3rd_party_library_mapping('zlib').targetName == 'ZLIB::ZLIB'
+    assert find_library_info_for_target('MyZlib::MyZlib').soName == 'zlib'
+
+
+def test_register_library_mapping_after_lookup(library_maps):
+    assert pro2cmake.map_condition('qtHaveModule(bar)') == 'TARGET bar'
+    assert pro2cmake.map_condition('qtConfig(system-foo)') == 'QT_FEATURE_system_foo'
+    assert configurejson2cmake.map_condition('libs.foo') == 'libs.foo OR FIXME'
+
+    register_qt_library_mapping(LibraryMapping('bar', 'Qt6', 'Qt::Bar'))
+    register_library_mapping(LibraryMapping('foo', 'Foo', 'Foo::Foo'))
+
+    assert pro2cmake.map_condition('qtHaveModule(bar)') == 'TARGET Qt::Bar'
+    assert pro2cmake.map_condition('qtConfig(system-foo)') == 'ON'
+    assert configurejson2cmake.map_condition('libs.foo') == 'Foo_FOUND'
@@ -27,6 +27,13 @@
 ##
 #############################################################################
 
+import os
+import subprocess
+import sys
+
+import condition_simplifier
+import condition_simplifier_cache
+import pytest
 from condition_simplifier import simplify_condition
 
 
@@ -184,3 +191,85 @@ def test_simplify_complex_false():
 def test_simplify_android_not_apple():
     validate_simplify('ANDROID AND NOT ANDROID_EMBEDDED AND NOT APPLE_OSX',
                       'ANDROID AND NOT ANDROID_EMBEDDED')
+
+
+@pytest.mark.parametrize('condition', [
+    'FOO',
+    'NOT FOO',
+    'NOT ON',
+    'NOT UNIX',
+    'NOT WIN32',
+    'b AND A AND NOT C AND NOT a',
+    'TARGET Qt::Core OR NOT QT_FEATURE_foo OR foo-bar',
+    'NOT UNIX AND QT_FEATURE_foo',
+])
+def test_simplify_fast_path_matches_sympy(condition, monkeypatch):
+    monkeypatch.setattr(condition_simplifier_cache, 'condition_simplifier_cache_enabled', False)
+    counters = condition_simplifier.simplify_condition_counters
+    fast_path_count = counters['fast_path']
+    result = simplify_condition(condition)
+    assert counters['fast_path'] == fast_path_count + 1
+
+    monkeypatch.setattr(condition_simplifier, '_simplify_trivial_condition', lambda condition: None)
+    assert simplify_condition(condition) == result
+
+
+def test_simplify_fast_path_skips_os_families(monkeypatch):
+    monkeypatch.setattr(condition_simplifier_cache, 'condition_simplifier_cache_enabled', False)
+    counters = condition_simplifier.simplify_condition_counters
+    sympy_count = counters['sympy']
+    validate_simplify('APPLE AND APPLE_OSX', 'APPLE_OSX')
+    validate_simplify('FOO AND (BAR OR FOO)', 'FOO')
+    assert counters['sympy'] == sympy_count + 2
+
+
+def test_simplify_os_family_rule_order(monkeypatch):
+    # QNX OR UNIX becomes UNIX first, which makes UNIX OR FOO redundant,
+    # before UNIX AND APPLE becomes APPLE.
+    monkeypatch.setattr(condition_simplifier_cache, 'condition_simplifier_cache_enabled', False)
+    validate_simplify('APPLE AND (UNIX OR FOO) AND (UNIX OR QNX)', 'APPLE')
+    validate_simplify('APPLE AND (ANDROID OR APPLE) AND (UNIX OR (FOO AND QNX)) AND '
+                      '(APPLE_UIKIT OR LINUX OR NOT FOO OR NOT QNX OR NOT UNIX)',
+                      'APPLE AND (APPLE_UIKIT OR LINUX OR WIN32 OR NOT FOO OR NOT QNX)')
+
+
+def test_os_family_rules_are_built_on_demand():
+    # Conversions whose conditions are all cached never need the rules.
+    script = ('import condition_simplifier; '
+              'assert condition_simplifier._build_os_family_rewrites.cache_info().currsize == 0')
+    cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, '-c', script], cwd=cwd, check=True)
+
+
+def test_simplify_budget_exceeded(monkeypatch):
+    monkeypatch.setattr(condition_simplifier_cache, 'condition_simplifier_cache_enabled', False)
+    condition_simplifier.set_condition_simplifier_step_budget(10)
+    try:
+        validate_simplify_unchanged('APPLE AND (APPLE_OSX OR FOO)')
+        validate_simplify('NOT WIN32', 'UNIX')
+    finally:
+        condition_simplifier.set_condition_simplifier_step_budget(None)
+
+
+def test_simplify_many_symbols_by_parts(monkeypatch):
+    monkeypatch.setattr(condition_simplifier_cache, 'condition_simplifier_cache_enabled', False)
+    symbols = [f'C{i}' for i in range(9)]
+    condition = ' AND '.join(['(A OR (A AND B))', *symbols])
+    condition_simplifier.set_condition_simplifier_step_budget(100000)
+    try:
+        validate_simplify(condition, ' AND '.join(['A', *symbols]))
+    finally:
+        condition_simplifier.set_condition_simplifier_step_budget(None)
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_simplify_conditions(jobs, monkeypatch):
+    monkeypatch.setattr(condition_simplifier_cache, 'condition_simplifier_cache_enabled', False)
+    monkeypatch.setattr(condition_simplifier, 'condition_simplification_jobs', jobs)
+    conditions = ['APPLE AND APPLE_OSX', 'NOT WIN32', 'FOO AND (BAR OR FOO)', 'NOT WIN32']
+    result = condition_simplifier.simplify_conditions(conditions)
+    assert result == {
+        'APPLE AND APPLE_OSX': 'APPLE_OSX',
+        'NOT WIN32': 'UNIX',
+        'FOO AND (BAR OR FOO)': 'FOO',
+    }
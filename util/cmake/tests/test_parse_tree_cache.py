@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+#############################################################################
+##
+## Copyright (C) 2018 The Qt Company Ltd.
+## Contact: https://www.qt.io/licensing/
+##
+## This file is part of the plugins of the Qt Toolkit.
+##
+## $QT_BEGIN_LICENSE:GPL-EXCEPT$
+## Commercial License Usage
+## Licensees holding valid commercial Qt licenses may use this file in
+## accordance with the commercial license agreement provided with the
+## Software or, alternatively, in accordance with the terms contained in
+## a written agreement between you and The Qt Company. For licensing terms
+## and conditions see https://www.qt.io/terms-conditions. For further
+## information use the contact form at https://www.qt.io/contact-us.
+##
+## GNU General Public License Usage
+## Alternatively, this file may be used under the terms of the GNU
+## General Public License version 3 as published by the Free Software
+## Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+## included in the packaging of this file. Please review the following
+## information to ensure the GNU General Public License requirements will
+## be met: https://www.gnu.org/licenses/gpl-3.0.html.
+##
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+import os
+import qmake_parser_cache
+from qmake_parser import QmakeParser, parseProFile
+
+
+_tests_path = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_cached_parse_tree_matches_parser(tmp_path, monkeypatch):
+    monkeypatch.setattr(qmake_parser_cache, 'get_cache_root', lambda: str(tmp_path))
+    monkeypatch.setattr(qmake_parser_cache, '_memory_cache', qmake_parser_cache.collections.OrderedDict())
+    path = os.path.join(_tests_path, 'data', 'complex_values.pro')
+
+    expected, expected_contents = QmakeParser().parseFile(path)
+    result, contents = parseProFile(path)
+    assert expected.asDict() == result.asDict()
+    assert expected_contents == contents
+    assert len(os.listdir(os.path.join(str(tmp_path), qmake_parser_cache.get_grammar_version()))) == 1
+
+
+def test_cached_parse_tree_skips_parser(tmp_path, monkeypatch):
+    monkeypatch.setattr(qmake_parser_cache, 'get_cache_root', lambda: str(tmp_path))
+    monkeypatch.setattr(qmake_parser_cache, '_memory_cache', qmake_parser_cache.collections.OrderedDict())
+    calls = []
+
+    def parse(contents):
+        calls.append(contents)
+        return {'statements': [{'key': 'A', 'operation': '=', 'value': [contents]}]}
+
+    first = qmake_parser_cache.get_parse_tree('foo', parse)
+    first['statements'].clear()
+    assert qmake_parser_cache.get_parse_tree('foo', parse)['statements'][0]['value'] == ['foo']
+
+    # Entries are also found on disk by new processes.
+    qmake_parser_cache._memory_cache.clear()
+    assert qmake_parser_cache.get_parse_tree('foo', parse)['statements'][0]['value'] == ['foo']
+    assert calls == ['foo']
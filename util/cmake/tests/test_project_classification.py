@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+#############################################################################
+##
+## Copyright (C) 2018 The Qt Company Ltd.
+## Contact: https://www.qt.io/licensing/
+##
+## This file is part of the plugins of the Qt Toolkit.
+##
+## $QT_BEGIN_LICENSE:GPL-EXCEPT$
+## Commercial License Usage
+## Licensees holding valid commercial Qt licenses may use this file in
+## accordance with the commercial license agreement provided with the
+## Software or, alternatively, in accordance with the terms contained in
+## a written agreement between you and The Qt Company. For licensing terms
+## and conditions see https://www.qt.io/terms-conditions. For further
+## information use the contact form at https://www.qt.io/contact-us.
+##
+## GNU General Public License Usage
+## Alternatively, this file may be used under the terms of the GNU
+## General Public License version 3 as published by the Free Software
+## Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+## included in the packaging of this file. Please review the following
+## information to ensure the GNU General Public License requirements will
+## be met: https://www.gnu.org/licenses/gpl-3.0.html.
+##
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+import os
+
+from pro2cmake import find_qmake_conf, get_project_classification
+
+
+def _make_repo(root):
+    for path in ('examples/foo', 'examples/3rdparty/bar', 'tests/benchmarks/baz',
+                 'tests/manual/qux', 'config.tests/quux', 'src/corelib'):
+        os.makedirs(os.path.join(root, path))
+    with open(os.path.join(root, '.qmake.conf'), 'w') as f:
+        f.write('load(qt_build_config)\n')
+
+
+def test_find_qmake_conf(tmp_path):
+    root = str(tmp_path)
+    _make_repo(root)
+    qmake_conf = os.path.join(root, '.qmake.conf')
+    assert find_qmake_conf(os.path.join(root, 'src/corelib/corelib.pro')) == qmake_conf
+    assert find_qmake_conf(os.path.join(root, 'src/src.pro')) == qmake_conf
+    assert find_qmake_conf(os.path.join(root, 'project.pro')) == qmake_conf
+    assert find_qmake_conf('relative/project.pro') == ''
+
+
+def test_project_classification(tmp_path):
+    root = str(tmp_path)
+    _make_repo(root)
+
+    def classify(path):
+        return get_project_classification(os.path.join(root, path))
+
+    assert classify('qtbase.pro').is_top_level_repo
+    assert classify('tests/tests.pro').is_top_level_repo_tests
+    assert classify('examples/examples.pro').is_top_level_repo_examples
+    assert classify('examples/foo/foo.pro').is_example
+    assert not classify('examples/3rdparty/bar/bar.pro').is_example
+    assert classify('tests/benchmarks/baz/baz.pro').is_benchmark
+    assert classify('tests/manual/qux/qux.pro').is_manual_test
+    assert classify('config.tests/quux/quux.pro').is_config_test
+
+    corelib = classify('src/corelib/corelib.pro')
+    assert not corelib.is_top_level_repo
+    assert not corelib.is_example
+    assert not corelib.is_benchmark
+    assert not corelib.is_config_test
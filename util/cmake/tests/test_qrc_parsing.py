@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+#############################################################################
+##
+## Copyright (C) 2018 The Qt Company Ltd.
+## Contact: https://www.qt.io/licensing/
+##
+## This file is part of the plugins of the Qt Toolkit.
+##
+## $QT_BEGIN_LICENSE:GPL-EXCEPT$
+## Commercial License Usage
+## Licensees holding valid commercial Qt licenses may use this file in
+## accordance with the commercial license agreement provided with the
+## Software or, alternatively, in accordance with the terms contained in
+## a written agreement between you and The Qt Company. For licensing terms
+## and conditions see https://www.qt.io/terms-conditions. For further
+## information use the contact form at https://www.qt.io/contact-us.
+##
+## GNU General Public License Usage
+## Alternatively, this file may be used under the terms of the GNU
+## General Public License version 3 as published by the Free Software
+## Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+## included in the packaging of this file. Please review the following
+## information to ensure the GNU General Public License requirements will
+## be met: https://www.gnu.org/licenses/gpl-3.0.html.
+##
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+import io
+import os
+
+import pro2cmake
+from pro2cmake import parse_qrc_file, process_qrc_file
+
+
+_qrc_contents = '''<!DOCTYPE RCC><RCC version="1.0">
+<qresource prefix="icons">
+    <file alias="app.png">images/app.png</file>
+    <file>images/open.png</file>
+</qresource>
+<qresource lang="de">
+    <file>texts/hello.txt</file>
+</qresource>
+</RCC>
+'''
+
+
+def _write_qrc(path, contents, mtime):
+    with open(path, 'w') as f:
+        f.write(contents)
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_parse_qrc_file(tmp_path):
+    path = str(tmp_path / 'resources.qrc')
+    _write_qrc(path, _qrc_contents, 1000000000)
+
+    resources = parse_qrc_file(path)
+    assert [(r.lang, r.prefix, r.files) for r in resources] == [
+        ('', '/icons', {'images/app.png': 'app.png', 'images/open.png': ''}),
+        ('de', '/', {'texts/hello.txt': ''}),
+    ]
+
+
+def test_parse_qrc_file_cache(tmp_path):
+    path = str(tmp_path / 'resources.qrc')
+    _write_qrc(path, _qrc_contents, 1000000000)
+    resources = parse_qrc_file(path)
+    assert parse_qrc_file(path) is resources
+
+    # Touching the file without changing its contents keeps the parse result.
+    _write_qrc(path, _qrc_contents, 2000000000)
+    assert parse_qrc_file(path) is resources
+
+    _write_qrc(path, _qrc_contents.replace('open.png', 'save.png'), 3000000000)
+    changed_resources = parse_qrc_file(path)
+    assert changed_resources is not resources
+    assert 'images/save.png' in changed_resources[0].files
+
+
+def test_process_qrc_file(tmp_path, monkeypatch):
+    _write_qrc(str(tmp_path / 'resources.qrc'), _qrc_contents, 1000000000)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(pro2cmake, 'cmake_api_version', 2)
+
+    output = io.StringIO()
+    process_qrc_file(output, 'app', 'resources.qrc')
+    assert output.getvalue() == '''set_source_files_properties("images/app.png"
+    PROPERTIES QT_RESOURCE_ALIAS "app.png"
+)
+set(resources_resource_files
+    "images/app.png"
+    "images/open.png"
+)
+
+qt_add_resource(app "resources"
+    PREFIX
+        "/icons"
+    FILES
+        ${resources_resource_files}
+)
+set(resources1_resource_files
+    "texts/hello.txt"
+)
+
+qt_add_resource(app "resources1"
+    LANG
+        "de"
+    PREFIX
+        "/"
+    FILES
+        ${resources1_resource_files}
+)
+'''
@@ -27,7 +27,7 @@
 ##
 #############################################################################
 
-from pro2cmake import Scope, SetOperation, merge_scopes, recursive_evaluate_scope
+from pro2cmake import AddOperation, Scope, SetOperation, merge_scopes, recursive_evaluate_scope
 
 import pytest
 import typing
@@ -344,3 +344,47 @@ def test_recursive_expansion():
     assert scope._expand_value('$$B/Source.cpp') == ['Foo/Bar/Source.cpp']
     assert scope._expand_value('$$B') == ['Foo/Bar']
 
+
+def test_evaluation_cache_invalidation():
+    scope = _new_scope(A='Foo')
+    assert scope.get('A') == ['Foo']
+    scope._append_operation('A', AddOperation(['Bar']))
+    assert scope.get('A') == ['Foo', 'Bar']
+
+    child = _new_scope(parent_scope=scope)
+    assert child.get('A', inherit=True) == ['Foo', 'Bar']
+    scope.merge(_new_scope(A='Baz'))
+    assert child.get('A', inherit=True) == ['Baz']
+
+def test_evaluation_cache_returns_copies():
+    scope = _new_scope(A='Foo')
+    scope.get('A').append('Bar')
+    assert scope.get('A') == ['Foo']
+
+def test_evaluation_cache_marks_visited_keys():
+    scope = _new_scope(A='Foo', SOURCES='$$A/Bar.cpp')
+    assert scope.get_files('SOURCES') == ['Foo/Bar.cpp']
+    scope.reset_visited_keys()
+    assert scope.get_files('SOURCES') == ['Foo/Bar.cpp']
+    assert scope.visited_keys == {'A', 'SOURCES'}
+
+def test_expansion_of_self_references():
+    scope = _new_scope(A='$$A/Foo', B='x$$B')
+    assert scope._expand_value('$$A/Foo') == ['/Foo']
+    assert scope._expand_value('$$B') == ['x$$B']
+    assert scope._expand_value('y$$A') == ['y$$A/Foo']
+
+def test_expansion_of_cyclic_references():
+    scope = _new_scope(A='a$$B', B='b$$A')
+    assert scope._expand_value('$$A') == ['ab$$A']
+    assert scope._expand_value('$$B/c') == ['ba$$B/c']
+
+def test_expansion_of_list_values():
+    scope = _new_scope(B='$$A/Bar')
+    scope._append_operation('A', AddOperation(['Foo', '$$A']))
+    assert scope._expand_value('$$A') == ['Foo', '$$A']
+    assert scope._expand_value('$$B') == ['Foo/Bar']
+
+def test_expansion_of_environment_variables():
+    scope = _new_scope(A='$$(HOME)/Foo')
+    assert scope._expand_value('$${A}/Bar') == ['$ENV{HOME}/Foo/Bar']
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+#############################################################################
+##
+## Copyright (C) 2018 The Qt Company Ltd.
+## Contact: https://www.qt.io/licensing/
+##
+## This file is part of the plugins of the Qt Toolkit.
+##
+## $QT_BEGIN_LICENSE:GPL-EXCEPT$
+## Commercial License Usage
+## Licensees holding valid commercial Qt licenses may use this file in
+## accordance with the commercial license agreement provided with the
+## Software or, alternatively, in accordance with the terms contained in
+## a written agreement between you and The Qt Company. For licensing terms
+## and conditions see https://www.qt.io/terms-conditions. For further
+## information use the contact form at https://www.qt.io/contact-us.
+##
+## GNU General Public License Usage
+## Alternatively, this file may be used under the terms of the GNU
+## General Public License version 3 as published by the Free Software
+## Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+## included in the packaging of this file. Please review the following
+## information to ensure the GNU General Public License requirements will
+## be met: https://www.gnu.org/licenses/gpl-3.0.html.
+##
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+import os
+
+import special_case_helper
+from special_case_helper import SpecialCaseHandler, merge_three_way, resolve_simple_conflicts
+
+
+def _lines(*lines):
+    return ''.join(f'{line}\n' for line in lines)
+
+
+def test_merge_without_conflicts():
+    base = _lines('set(SOURCES', '    a.cpp', '    b.cpp', ')', '', 'add_library(foo)')
+    side1 = _lines('set(SOURCES', '    a.cpp', '    b.cpp', '    c.cpp', ')', '', 'add_library(foo)')
+    side2 = _lines('set(SOURCES', '    a.cpp', '    b.cpp', ')', '',
+                   'add_library(foo) # special case')
+    assert merge_three_way(base, side1, side2) == _lines(
+        'set(SOURCES', '    a.cpp', '    b.cpp', '    c.cpp', ')', '',
+        'add_library(foo) # special case')
+
+
+def test_merge_identical_changes():
+    base = _lines('a', 'b', 'c')
+    side = _lines('a', 'x', 'c')
+    assert merge_three_way(base, side, side) == side
+    assert merge_three_way(base, base, side) == side
+    assert merge_three_way(base, side, base) == side
+
+
+def test_merge_conflict():
+    base = _lines('a', 'b', 'c', 'd')
+    side1 = _lines('a', 'b', 'X', 'c', 'd')
+    side2 = _lines('a', 'b', 'Y', 'c', 'd')
+    assert merge_three_way(base, side1, side2) == _lines(
+        'a', 'b', '<<<<<<< HEAD', 'X', '=======', 'Y', '>>>>>>> original', 'c', 'd')
+
+
+def test_merge_conflict_is_refined():
+    # Lines common to both sides of a conflict are moved out of it.
+    base = _lines('a', 'b', 'c', 'd', 'e', 'f', 'g', 'h')
+    side1 = _lines('a', 'X1', 'c', 'd', 'e', 'f', 'X2', 'h')
+    side2 = _lines('a', 'Y1', 'c', 'd', 'e', 'f', 'Y2', 'h')
+    assert merge_three_way(base, side1, side2) == _lines(
+        'a', '<<<<<<< HEAD', 'X1', '=======', 'Y1', '>>>>>>> original', 'c', 'd', 'e', 'f',
+        '<<<<<<< HEAD', 'X2', '=======', 'Y2', '>>>>>>> original', 'h')
+
+    # Conflicts separated by at most three lines are joined.
+    base = _lines('a', 'b', 'c', 'd', 'e', 'f')
+    side1 = _lines('a', 'X1', 'c', 'd', 'X2', 'f')
+    side2 = _lines('a', 'Y1', 'c', 'd', 'Y2', 'f')
+    assert merge_three_way(base, side1, side2) == _lines(
+        'a', '<<<<<<< HEAD', 'X1', 'c', 'd', 'X2', '=======', 'Y1', 'c', 'd', 'Y2',
+        '>>>>>>> original', 'f')
+
+
+def test_merge_missing_final_newline():
+    assert merge_three_way('a\nb', 'a\nX', 'a\nY') == _lines(
+        'a', '<<<<<<< HEAD', 'X', '=======', 'Y', '>>>>>>> original')
+
+
+def test_resolve_simple_conflicts():
+    content = _lines('a', '<<<<<<< HEAD', '=======', 'b', '>>>>>>> master', 'c')
+    assert resolve_simple_conflicts(content) == _lines('a', 'b', 'c')
+
+
+def test_resolve_simple_conflicts_of_merge():
+    # The generated file dropped a line that the original file modified.
+    merged = merge_three_way(_lines('a', 'b', 'c'), _lines('a', 'c'), _lines('a', 'B', 'c'))
+    assert merged == _lines('a', '<<<<<<< HEAD', '=======', 'B', '>>>>>>> original', 'c')
+    assert resolve_simple_conflicts(merged) == _lines('a', 'B', 'c')
+
+    # Conflicts with content on both sides are kept.
+    merged = merge_three_way(_lines('a', 'b', 'c'), _lines('a', 'X', 'c'), _lines('a', 'Y', 'c'))
+    assert resolve_simple_conflicts(merged) == merged
+
+
+def test_special_case_handler(tmp_path, monkeypatch):
+    monkeypatch.setattr(special_case_helper, 'check_if_git_in_path', lambda: False)
+    clean = _lines('add_library(foo', '    SOURCES', '        a.cpp', ')')
+    original = _lines('add_library(foo', '    SOURCES', '        a.cpp', ')',
+                      'set(extra ON) # special case')
+    generated = _lines('add_library(foo', '    SOURCES', '        a.cpp', '        b.cpp', ')')
+    for name, content in (('.prev_CMakeLists.txt', clean), ('CMakeLists.txt', original),
+                          ('CMakeLists.gen.txt', generated)):
+        with open(str(tmp_path / name), 'w') as f:
+            f.write(content)
+
+    handler = SpecialCaseHandler(str(tmp_path / 'CMakeLists.txt'),
+                                 str(tmp_path / 'CMakeLists.gen.txt'), str(tmp_path),
+                                 use_git_merge=False)
+    assert handler.handle_special_cases()
+
+    with open(str(tmp_path / 'CMakeLists.gen.txt')) as f:
+        assert f.read() == _lines('add_library(foo', '    SOURCES', '        a.cpp',
+                                  '        b.cpp', ')', 'set(extra ON) # special case')
+    with open(str(tmp_path / '.prev_CMakeLists.txt')) as f:
+        assert f.read() == generated
+    assert not os.path.exists(str(tmp_path / 'tmp_repo'))
+
+
+def test_special_case_handler_records_prev_files(tmp_path, monkeypatch):
+    def fail_git_add(*args, **kwargs):
+        raise AssertionError('git add must not run')
+
+    monkeypatch.setattr(special_case_helper, 'run_process_quiet', fail_git_add)
+    clean = _lines('add_library(foo', ')')
+    original = _lines('add_library(foo', ')', 'set(extra ON) # special case')
+    generated = _lines('add_library(foo', '    SOURCES a.cpp', ')')
+    for name, content in (('.prev_CMakeLists.txt', clean), ('CMakeLists.txt', original),
+                          ('CMakeLists.gen.txt', generated)):
+        with open(str(tmp_path / name), 'w') as f:
+            f.write(content)
+
+    prev_files_list = str(tmp_path / 'prev_files.txt')
+    handler = SpecialCaseHandler(str(tmp_path / 'CMakeLists.txt'),
+                                 str(tmp_path / 'CMakeLists.gen.txt'), str(tmp_path),
+                                 use_git_merge=False, prev_files_list_path=prev_files_list)
+    assert handler.handle_special_cases()
+    with open(prev_files_list) as f:
+        assert f.read() == str(tmp_path / '.prev_CMakeLists.txt') + '\n'
+
+
+def test_special_case_handler_uses_git_merge_by_default(tmp_path, monkeypatch):
+    merges = []
+    monkeypatch.setattr(special_case_helper, 'check_if_git_in_path', lambda: True)
+    monkeypatch.setattr(SpecialCaseHandler, 'apply_merge',
+                        lambda self, path: merges.append('native'))
+    monkeypatch.setattr(SpecialCaseHandler, 'apply_git_merge_magic',
+                        lambda self, path: merges.append('git'))
+    for name in ('.prev_CMakeLists.txt', 'CMakeLists.txt', 'CMakeLists.gen.txt',
+                 'CMakeLists-post-merge.txt'):
+        with open(str(tmp_path / name), 'w') as f:
+            f.write(_lines('add_library(foo', ')'))
+
+    handler = SpecialCaseHandler(str(tmp_path / 'CMakeLists.txt'),
+                                 str(tmp_path / 'CMakeLists.gen.txt'), str(tmp_path))
+    assert handler.handle_special_cases()
+    assert merges == ['git']
+
+
+def test_special_case_handler_without_git(tmp_path, monkeypatch, capsys):
+    merges = []
+    monkeypatch.setattr(special_case_helper, 'check_if_git_in_path', lambda: False)
+    monkeypatch.setattr(SpecialCaseHandler, 'apply_merge',
+                        lambda self, path: merges.append('native'))
+    monkeypatch.setattr(SpecialCaseHandler, 'apply_git_merge_magic',
+                        lambda self, path: merges.append('git'))
+    for name in ('.prev_CMakeLists.txt', 'CMakeLists.txt', 'CMakeLists.gen.txt',
+                 'CMakeLists-post-merge.txt'):
+        with open(str(tmp_path / name), 'w') as f:
+            f.write(_lines('add_library(foo', ')'))
+
+    handler = SpecialCaseHandler(str(tmp_path / 'CMakeLists.txt'),
+                                 str(tmp_path / 'CMakeLists.gen.txt'), str(tmp_path))
+    assert handler.handle_special_cases()
+    assert merges == ['native']
+    assert 'Warning: git is not in PATH' in capsys.readouterr().out